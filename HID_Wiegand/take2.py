@@ -1,88 +1,40 @@
 from gpiozero import Button
-import time
+import logging
+import os
+import sys
 
-# Set the GPIO pins for Data 0 and Data 1
-DATA0_PIN = 27  # Change to GPIO27
-DATA1_PIN = 17  # Change to GPIO17
-
-# Variables to hold Wiegand data
-wiegand_data = []
-
-def data0_callback():
-    global wiegand_data
-    wiegand_data.append(0)
-
-def data1_callback():
-    global wiegand_data
-    wiegand_data.append(1)
-
-# Use gpiozero Button for edge detection
-data0_button = Button(DATA0_PIN, pull_up=True)
-data1_button = Button(DATA1_PIN, pull_up=True)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import logs
+from common.wiegand import WiegandCapture, frame_bits
 
-data0_button.when_pressed = data0_callback
-data1_button.when_pressed = data1_callback
-
-def process_wiegand_data():
-    global wiegand_data
-    if len(wiegand_data) >= 26:  # Assuming 26-bit Wiegand
-        print("\nCard Read Detected:")
-        card_bits = ''.join(map(str, wiegand_data))
-        card_number = int(card_bits, 2)  # Convert bits to a number
-        print(f"Binary Data: {card_bits}")
-        print(f"Card Number: {card_number}")
-        print("Reader Type: Indala Wiegand")
-        print("")  # Blank line to separate readings
-        wiegand_data = []  # Clear for next read
-
-try:
-    while True:
-        time.sleep(0.1)
-        process_wiegand_data()
-
-except KeyboardInterrupt:
-    print("Exiting program")
-from gpiozero import Button
-import time
+# One JSON line per card on the console, written from a background thread
+logs.setup()
 
 # Set the GPIO pins for Data 0 and Data 1
 DATA0_PIN = 27  # Change to GPIO27
 DATA1_PIN = 17  # Change to GPIO17
 
-# Variables to hold Wiegand data
-wiegand_data = []
-
-def data0_callback():
-    global wiegand_data
-    wiegand_data.append(0)
-
-def data1_callback():
-    global wiegand_data
-    wiegand_data.append(1)
+# Edges from both buttons' callback threads go onto a preallocated ring and are
+# assembled on the capture thread; a frame ends after 8 ms without a bit
+capture = WiegandCapture(DATA0_PIN, DATA1_PIN)
 
 # Use gpiozero Button for edge detection
 data0_button = Button(DATA0_PIN, pull_up=True)
 data1_button = Button(DATA1_PIN, pull_up=True)
 
-data0_button.when_pressed = data0_callback
-data1_button.when_pressed = data1_callback
+data0_button.when_pressed = capture.data0
+data1_button.when_pressed = capture.data1
 
-def process_wiegand_data():
-    global wiegand_data
-    if len(wiegand_data) >= 26:  # Assuming 26-bit Wiegand
-        print("\nCard Read Detected:")
-        card_bits = ''.join(map(str, wiegand_data))
-        card_number = int(card_bits, 2)  # Convert bits to a number
-        print(f"Binary Data: {card_bits}")
-        print(f"Card Number: {card_number}")
-        print("Reader Type: Indala Wiegand")
-        print("")  # Blank line to separate readings
-        wiegand_data = []  # Clear for next read
+def process_wiegand_data(frame):
+    if frame.bit_count >= 26:  # Assuming 26-bit Wiegand
+        logs.log_event("card_read", reader="Indala Wiegand", bits=frame_bits(frame), card_number=frame.value)
 
+capture.start()
 try:
     while True:
-        time.sleep(0.1)
-        process_wiegand_data()
+        process_wiegand_data(capture.frames.get())
 
 except KeyboardInterrupt:
-    print("Exiting program")
+    logging.info("Exiting program")
+finally:
+    capture.stop()
@@ -1,63 +1,73 @@
+import logging
+import os
+import queue
+import sys
+
 import pigpio
-import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import logs
+from common.wiegand import WiegandCapture, frame_bits
 
 class WiegandReader:
     def __init__(self, pi, gpio_0, gpio_1):
         self.pi = pi
         self.gpio_0 = gpio_0
         self.gpio_1 = gpio_1
-        self._data = []
+
+        # Edges are stored on a preallocated ring and assembled into frames
+        # by pigpio tick on the capture thread
+        self._capture = WiegandCapture(gpio_0, gpio_1, clock=None)
+        self._capture.start()
         
         # Set the GPIO pins to input mode
         self.pi.set_mode(self.gpio_0, pigpio.INPUT)
         self.pi.set_mode(self.gpio_1, pigpio.INPUT)
 
-        # Add callbacks for data lines D0 and D1
-        self._cb_0 = self.pi.callback(self.gpio_0, pigpio.FALLING_EDGE, self._data_received)
-        self._cb_1 = self.pi.callback(self.gpio_1, pigpio.FALLING_EDGE, self._data_received)
+        # Add callbacks for data lines D0 and D1; the watchdogs close the last frame
+        self._cb_0 = self.pi.callback(self.gpio_0, pigpio.FALLING_EDGE, self._capture.edge)
+        self._cb_1 = self.pi.callback(self.gpio_1, pigpio.FALLING_EDGE, self._capture.edge)
+        self.pi.set_watchdog(self.gpio_0, self._capture.watchdog_ms)
+        self.pi.set_watchdog(self.gpio_1, self._capture.watchdog_ms)
 
-    def _data_received(self, gpio, level, tick):
-        # Wiegand sends bits in a sequence via D0 and D1
-        if gpio == self.gpio_0:
-            self._data.append(0)
-        elif gpio == self.gpio_1:
-            self._data.append(1)
+    def get_card_data(self, timeout=None):
+        """
+        Return the next complete frame (a WiegandFrame), or None if none
+        arrives within timeout seconds.
+        """
+        try:
+            return self._capture.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
 
-    def get_card_data(self):
-        if self._data:
-            return self._data
-        return None
-
-    def clear(self):
-        self._data = []
+    def cancel(self):
+        self.pi.set_watchdog(self.gpio_0, 0)
+        self.pi.set_watchdog(self.gpio_1, 0)
+        self._cb_0.cancel()
+        self._cb_1.cancel()
+        self._capture.stop()
 
 if __name__ == "__main__":
+    # One JSON line per card on the console, written from a background thread
+    logs.setup()
+
     # Initialize the pigpio library
     pi = pigpio.pi()
     
     # Wiegand reader on GPIO 17 (D0) and GPIO 27 (D1)
     reader = WiegandReader(pi, 17, 27)
 
-    print("Waiting for card...")
+    logging.info("Waiting for card...")
     
-    while True:
-        card_data = reader.get_card_data()
-        
-        if card_data:
-            # Convert the binary list to a string of bits
-            card_data_str = ''.join(map(str, card_data))
-
-            # Convert binary string to integer, then to hex
-            card_data_hex = hex(int(card_data_str, 2)).upper()
+    try:
+        while True:
+            frame = reader.get_card_data()
 
-            print(f"Card Data (Binary): {card_data_str}")
-            print(f"Card Data (Hex): {card_data_hex}")
-            
-            # Print a blank line to separate outputs
-            print("\n")
-
-            # Clear the data buffer for the next read
-            reader.clear()
-        
-        # Sleep for 3 seconds between loops
-        time.sleep(3)
+            # The frame's bits as a string, and its value in hex
+            logs.log_event("card_read", reader="HID Wiegand", bits=frame_bits(frame),
+                           hex=hex(frame.value).upper())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.cancel()
+        pi.stop()
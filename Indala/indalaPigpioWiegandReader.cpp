@@ -1,13 +1,48 @@
-// wiegand_pigpio_reader.cpp
+// indalaPigpioWiegandReader.cpp
+//
+// Wiegand capture daemon for the Indala reader. The pigpio alert callback
+// shifts each bit into a uint64_t and closes the frame on the tick gap after
+// its last bit, or when the watchdog reports the line idle; the finished frame
+// goes onto a lock-free ring. A publisher thread streams frames as 32-byte
+// binary records to every client of a Unix domain socket (read them with
+// common/wiegand_socket.py) and logs them, so the callback never allocates,
+// formats or blocks.
+//
+// On the Pi:
+//     g++ -O2 -std=c++17 -Wall -o indalaPigPioWiegandReader indalaPigpioWiegandReader.cpp -lpigpio -lrt -pthread
+//     sudo ./indalaPigPioWiegandReader [/run/indala_wiegand.sock]
+// Anywhere, with edges from a simulated reader instead of pigpio (see bench/bench_wiegand_socket.py):
+//     g++ -O2 -std=c++17 -Wall -DSIMULATED_EDGES -o wiegand_sim indalaPigpioWiegandReader.cpp -pthread
+//     ./wiegand_sim <socket> <frames> <bits per frame> <frames per second, 0 for flat out>
+
+#ifndef SIMULATED_EDGES
 #include <pigpio.h>
-#include <iostream>
-#include <vector>
-#include <string>
+#endif
+#include <sys/eventfd.h>
+#include <sys/socket.h>
+#include <sys/stat.h>
+#include <sys/un.h>
+#include <poll.h>
+#include <time.h>
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <csignal>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <ctime>
+#include <deque>
 #include <fstream>
-#include <sstream>
 #include <iomanip>
-#include <ctime>
-#include <csignal>
+#include <iostream>
+#include <mutex>
+#include <sstream>
+#include <string>
+#include <thread>
+#include <vector>
 #include <unistd.h>
 
 // --------------------- Configuration ---------------------
@@ -17,200 +52,657 @@ const int DATA0_PIN = 23; // Green wire (Data 0) - BCM GPIO23
 const int DATA1_PIN = 18; // White wire (Data 1) - BCM GPIO18
 
 // Wiegand configuration
-const int EXPECTED_BITS = 26;      // Change to 34 if your reader uses 34-bit Wiegand
-const double BIT_TIMEOUT = 0.5;    // Time (in seconds) to wait before processing data
-const unsigned int DEBOUNCE_TIME_MS = 50; // Debounce time in milliseconds
+const int EXPECTED_BITS = 26;             // Shorter frames are logged as incomplete (clients get every frame)
+const uint32_t FRAME_GAP_US = 8000;       // A gap this long between bits (by pigpio tick) ends a frame
+const int WATCHDOG_MS = FRAME_GAP_US / 2000; // Idle-line reports, so the last frame is closed on time
+
+// Unix domain socket the frames are published on; clients need write permission on it
+const char* SOCKET_PATH = "/run/indala_wiegand.sock";
+const mode_t SOCKET_MODE = 0660;
+const size_t MAX_BACKLOG = 64 * 1024;     // Bytes queued for a client before frames wait on the ring
+const auto STALL_TIMEOUT = std::chrono::seconds(2); // A client that stays full this long is dropped
 
-// Logging configuration
+// Logging configuration: one JSON line per event, rotated at LOG_MAX_BYTES
 const std::string LOG_FILENAME = "wiegand_reader.log";
+const std::streamoff LOG_MAX_BYTES = 1024 * 1024;
+const int LOG_BACKUPS = 5;
+#ifdef SIMULATED_EDGES
+const bool LOG_FRAMES = false;            // The injector knows what it sent
+const int PI_TIMEOUT = 2;                 // pigpio's level for a watchdog report
+#else
+const bool LOG_FRAMES = true;             // One card_read record per frame, from the publisher thread
+#endif
 
 // Reader information
 const std::string READER_TYPE = "Indala Wiegand";
 
-// --------------------- Global Variables ---------------------
+// --------------------- Frame Records ---------------------
+
+// What clients read: an 8-byte header once, then one record per frame, little-endian
+struct StreamHeader {
+    char magic[4];
+    uint16_t version;
+    uint16_t record_size;
+};
+
+const uint16_t FLAG_OVERFLOW = 0x1;       // More than 64 bits: value holds the first 64
 
-std::vector<int> wiegand_data;
-double last_bit_time = 0.0;
+struct FrameRecord {
+    uint64_t value;         // The bits, first received most significant
+    uint32_t first_tick;    // pigpio ticks of the first and last bit
+    uint32_t last_tick;
+    uint64_t completed_ns;  // CLOCK_MONOTONIC when the frame was closed
+    uint16_t bit_count;
+    uint16_t flags;
+    uint32_t seq;           // Frame number; a gap means frames were dropped
+};
 
-// Log file stream
-std::ofstream log_file;
+static_assert(sizeof(StreamHeader) == 8, "header layout");
+static_assert(sizeof(FrameRecord) == 32, "record layout");
 
-// --------------------- Utility Functions ---------------------
+const StreamHeader STREAM_HEADER = {{'W', 'G', 'F', 'R'}, 1, sizeof(FrameRecord)};
 
-std::string get_current_timestamp() {
-    std::time_t now = std::time(nullptr);
-    std::tm* now_tm = std::localtime(&now);
-    char buffer[20];
-    std::strftime(buffer, sizeof(buffer), "%Y-%m-%d %H:%M:%S", now_tm);
-    return std::string(buffer);
+uint64_t monotonic_ns() {
+    timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return uint64_t(now.tv_sec) * 1000000000u + uint64_t(now.tv_nsec);
 }
 
-void log_message(const std::string& level, const std::string& message) {
-    std::string timestamp = get_current_timestamp();
-    std::string log_entry = timestamp + " [" + level + "] " + message;
-    // Write to log file
-    if (log_file.is_open()) {
-        log_file << log_entry << std::endl;
+// Microseconds from start to end, allowing for the 32-bit tick wrapping roughly every 72 minutes
+uint32_t tick_diff(uint32_t start, uint32_t end) {
+    return end - start;
+}
+
+// Single-producer, single-consumer: the pigpio callback thread pushes, the publisher pops
+template <size_t N>
+class FrameRing {
+public:
+    bool push(const FrameRecord& record) {
+        size_t head = head_.load(std::memory_order_relaxed);
+        if (head - tail_.load(std::memory_order_acquire) == N) {
+            return false;
+        }
+        slots_[head % N] = record;
+        head_.store(head + 1, std::memory_order_release);
+        return true;
+    }
+
+    bool pop(FrameRecord& record) {
+        size_t tail = tail_.load(std::memory_order_relaxed);
+        if (tail == head_.load(std::memory_order_acquire)) {
+            return false;
+        }
+        record = slots_[tail % N];
+        tail_.store(tail + 1, std::memory_order_release);
+        return true;
     }
-    // Also print to console
-    if (level == "INFO" || level == "WARNING" || level == "ERROR") {
-        std::cout << log_entry << std::endl;
+
+    bool empty() const {
+        return tail_.load(std::memory_order_acquire) == head_.load(std::memory_order_acquire);
     }
-}
 
-// --------------------- Callback Functions ---------------------
+private:
+    std::array<FrameRecord, N> slots_;
+    alignas(64) std::atomic<size_t> head_{0};
+    alignas(64) std::atomic<size_t> tail_{0};
+};
+
+FrameRing<1024> frames;
+int wake_fd = -1; // eventfd: the callback bumps it once per frame to wake the publisher
+
+// --------------------- Logging ---------------------
+
+// Records are queued by the publisher and written by a background thread,
+// so nothing waits on the SD card or the terminal. Each record is one JSON
+// line; the file is rotated when it reaches LOG_MAX_BYTES.
+class AsyncLog {
+public:
+    bool open(const std::string& filename) {
+        filename_ = filename;
+        file_.open(filename_, std::ios::out | std::ios::app);
+        if (!file_.is_open()) {
+            return false;
+        }
+        writer_ = std::thread(&AsyncLog::run, this);
+        return true;
+    }
 
-// Forward declaration
-void process_wiegand_data();
+    // fields is a JSON fragment such as "\"gpio\":23,\"bit\":1", or empty
+    void log(const char* level, const std::string& event, const std::string& fields = "") {
+        Record record{std::chrono::system_clock::now(), level, event, fields};
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            queue_.push_back(std::move(record));
+        }
+        ready_.notify_one();
+    }
 
-// Callback for Data0 (appends 0)
-void data0_callback(int gpio, int level, uint32_t tick) {
-    if (level == 0) { // Falling edge
-        wiegand_data.push_back(0);
-        last_bit_time = gpioTick() / 1e6; // Convert microseconds to seconds
-        log_message("DEBUG", "Data0 pulse detected on GPIO" + std::to_string(gpio) + ". Bit appended: 0");
-        std::cout << "Data0 pulse detected" << std::endl;
+    // Writes out what is queued and stops the writer thread
+    void close() {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            stopping_ = true;
+        }
+        ready_.notify_one();
+        if (writer_.joinable()) {
+            writer_.join();
+        }
+        file_.close();
+    }
 
-        // Check if expected bits reached
-        if (wiegand_data.size() >= EXPECTED_BITS) {
-            process_wiegand_data();
+private:
+    struct Record {
+        std::chrono::system_clock::time_point time;
+        const char* level;
+        std::string event;
+        std::string fields;
+    };
+
+    void run() {
+        std::deque<Record> batch;
+        while (true) {
+            {
+                std::unique_lock<std::mutex> lock(mutex_);
+                ready_.wait(lock, [this] { return stopping_ || !queue_.empty(); });
+                if (queue_.empty() && stopping_) {
+                    return;
+                }
+                batch.swap(queue_);
+            }
+            bool to_console = false;
+            for (const Record& record : batch) {
+                std::string line = format(record);
+                file_ << line << '\n';
+                if (std::string(record.level) != "DEBUG") {
+                    std::cout << line << '\n';
+                    to_console = true;
+                }
+            }
+            batch.clear();
+            // One flush per batch instead of one per line
+            file_.flush();
+            if (to_console) {
+                std::cout.flush();
+            }
+            if (file_.tellp() >= LOG_MAX_BYTES) {
+                rotate();
+            }
         }
     }
-}
 
-// Callback for Data1 (appends 1)
-void data1_callback(int gpio, int level, uint32_t tick) {
-    if (level == 0) { // Falling edge
-        wiegand_data.push_back(1);
-        last_bit_time = gpioTick() / 1e6; // Convert microseconds to seconds
-        log_message("DEBUG", "Data1 pulse detected on GPIO" + std::to_string(gpio) + ". Bit appended: 1");
-        std::cout << "Data1 pulse detected" << std::endl;
-
-        // Check if expected bits reached
-        if (wiegand_data.size() >= EXPECTED_BITS) {
-            process_wiegand_data();
+    std::string format(const Record& record) {
+        auto since_epoch = record.time.time_since_epoch();
+        std::time_t seconds = std::chrono::duration_cast<std::chrono::seconds>(since_epoch).count();
+        int millis = std::chrono::duration_cast<std::chrono::milliseconds>(since_epoch).count() % 1000;
+        std::tm utc;
+        gmtime_r(&seconds, &utc);
+        char timestamp[32];
+        std::strftime(timestamp, sizeof(timestamp), "%Y-%m-%dT%H:%M:%S", &utc);
+        std::ostringstream line;
+        line << "{\"ts\": \"" << timestamp << '.' << std::setw(3) << std::setfill('0') << millis
+             << "+00:00\", \"level\": \"" << record.level << "\", \"logger\": \"indala\", \"msg\": \""
+             << record.event << '"';
+        if (!record.fields.empty()) {
+            line << ", " << record.fields;
         }
+        line << '}';
+        return line.str();
     }
+
+    // wiegand_reader.log -> .1 -> .2 ... like Python's RotatingFileHandler
+    void rotate() {
+        file_.close();
+        for (int n = LOG_BACKUPS - 1; n >= 1; --n) {
+            std::rename((filename_ + "." + std::to_string(n)).c_str(),
+                        (filename_ + "." + std::to_string(n + 1)).c_str());
+        }
+        std::rename(filename_.c_str(), (filename_ + ".1").c_str());
+        file_.open(filename_, std::ios::out | std::ios::trunc);
+    }
+
+    std::string filename_;
+    std::ofstream file_;
+    std::thread writer_;
+    std::mutex mutex_;
+    std::condition_variable ready_;
+    std::deque<Record> queue_;
+    bool stopping_ = false;
+};
+
+AsyncLog event_log;
+
+std::string json_string(const std::string& value) {
+    // Field values here are bit strings and names; only quotes and backslashes need escaping
+    std::string out = "\"";
+    for (char c : value) {
+        if (c == '"' || c == '\\') {
+            out += '\\';
+        }
+        out += c;
+    }
+    return out + "\"";
 }
 
-// --------------------- Data Processing Function ---------------------
+// The card_read (or wiegand_incomplete) record for a frame, built on the publisher thread
+void log_frame(const FrameRecord& frame) {
+    int stored = std::min<int>(frame.bit_count, 64);
+    std::string bits;
+    for (int i = stored - 1; i >= 0; --i) {
+        bits += char('0' + ((frame.value >> i) & 1));
+    }
+    std::string fields = "\"bit_count\": " + std::to_string(frame.bit_count) + ", \"bits\": " + json_string(bits);
+    if (frame.flags & FLAG_OVERFLOW) {
+        event_log.log("WARNING", "wiegand_overflow", fields);
+        return;
+    }
+    if (frame.bit_count < EXPECTED_BITS) {
+        event_log.log("WARNING", "wiegand_incomplete", fields);
+        return;
+    }
+    std::ostringstream hex;
+    hex << std::uppercase << std::hex << std::setw((frame.bit_count + 3) / 4) << std::setfill('0') << frame.value;
+    fields = "\"reader\": " + json_string(READER_TYPE) + ", " + fields + ", \"hex\": " + json_string(hex.str());
+    if (frame.bit_count == 26) {
+        // 1 parity bit, 8 facility code bits, 16 card number bits, 1 parity bit
+        fields += ", \"facility_code\": " + std::to_string((frame.value >> 17) & 0xFF) +
+                  ", \"card_number\": " + std::to_string((frame.value >> 1) & 0xFFFF);
+    }
+    event_log.log("INFO", "card_read", fields);
+}
 
-void process_wiegand_data() {
-    if (wiegand_data.size() >= EXPECTED_BITS) {
-        // Convert bits to binary string
-        std::string card_bits = "";
-        for (int bit : wiegand_data) {
-            card_bits += std::to_string(bit);
+// --------------------- Frame Assembly ---------------------
+
+// Runs on pigpio's alert thread only: a few shifts per edge, and per frame a
+// ring push and one eventfd write
+class FrameAssembler {
+public:
+    void edge(int gpio, int level, uint32_t tick) {
+        if (level == 0) {
+            bit(gpio == DATA1_PIN, tick);
+        } else if (level == PI_TIMEOUT) {
+            idle(tick);
         }
+    }
+
+    uint64_t dropped() const {
+        return dropped_.load(std::memory_order_relaxed);
+    }
 
-        // Convert binary string to integer
-        unsigned long card_value = std::stoul(card_bits, nullptr, 2);
-
-        // Calculate required hex digits
-        int required_hex_digits = (EXPECTED_BITS + 3) / 4; // 4 bits per hex digit
-
-        // Convert to hex string with leading zeros
-        std::stringstream ss;
-        ss << std::uppercase << std::hex << std::setw(required_hex_digits) << std::setfill('0') << card_value;
-        std::string card_hex = ss.str();
-
-        // Parsing based on Wiegand 26-bit format
-        unsigned long facility_code = 0;
-        unsigned long card_number = 0;
-
-        if (EXPECTED_BITS == 26) {
-            // 1 start bit, 8 facility code bits, 16 card number bits, 1 parity bit
-            std::string facility_code_bits = card_bits.substr(1, 8);
-            std::string card_number_bits = card_bits.substr(9, 16);
-            facility_code = std::stoul(facility_code_bits, nullptr, 2);
-            card_number = std::stoul(card_number_bits, nullptr, 2);
-        } else if (EXPECTED_BITS == 34) {
-            // Example parsing for 34-bit Wiegand
-            // Adjust based on your reader's specification
-            std::string facility_code_bits = card_bits.substr(1, 8);
-            std::string card_number_bits = card_bits.substr(9, 24);
-            facility_code = std::stoul(facility_code_bits, nullptr, 2);
-            card_number = std::stoul(card_number_bits, nullptr, 2);
+private:
+    void bit(bool bit, uint32_t tick) {
+        if (count_ && tick_diff(last_tick_, tick) > FRAME_GAP_US) {
+            emit();
+        }
+        if (!count_) {
+            first_tick_ = tick;
+        }
+        if (count_ < 64) {
+            value_ = (value_ << 1) | uint64_t(bit);
         } else {
-            // Handle other bit lengths if necessary
+            flags_ |= FLAG_OVERFLOW;
         }
-
-        // Logging
-        log_message("INFO", "--------------------------------------------------");
-        log_message("INFO", "Card Read Detected:");
-        log_message("INFO", "Reader Type    : " + READER_TYPE);
-        log_message("INFO", "Binary Data    : " + card_bits);
-        log_message("INFO", "Hex Data       : " + card_hex);
-        if (EXPECTED_BITS == 26 || EXPECTED_BITS == 34) {
-            log_message("INFO", "Facility Code  : " + std::to_string(facility_code));
+        if (count_ < UINT16_MAX) {
+            ++count_;
         }
-        log_message("INFO", "Card Number    : " + std::to_string(card_number));
-        log_message("INFO", "--------------------------------------------------");
-
-        // Console Output
-        std::cout << "\nCard Read Detected:" << std::endl;
-        std::cout << "Reader Type   : " << READER_TYPE << std::endl;
-        std::cout << "Binary Data   : " << card_bits << std::endl;
-        std::cout << "Hex Data      : " << card_hex << std::endl;
-        if (EXPECTED_BITS == 26 || EXPECTED_BITS == 34) {
-            std::cout << "Facility Code : " << facility_code << std::endl;
+        last_tick_ = tick;
+    }
+
+    // Close the current frame if no bit has arrived for FRAME_GAP_US by tick
+    void idle(uint32_t tick) {
+        if (count_ && tick_diff(last_tick_, tick) >= FRAME_GAP_US) {
+            emit();
         }
-        std::cout << "Card Number   : " << card_number << std::endl;
-        std::cout << "--------------------------------------------------\n" << std::endl;
+    }
 
-        // Clear the data for the next read
-        wiegand_data.clear();
+    void emit() {
+        FrameRecord record{value_, first_tick_, last_tick_, monotonic_ns(), count_, flags_, seq_++};
+        value_ = 0;
+        count_ = 0;
+        flags_ = 0;
+#ifdef SIMULATED_EDGES
+        // The injector waits for room, so a benchmark measures the whole pipeline
+        while (!frames.push(record)) {
+            std::this_thread::sleep_for(std::chrono::microseconds(50));
+        }
+#else
+        if (!frames.push(record)) {
+            dropped_.fetch_add(1, std::memory_order_relaxed);
+            return;
+        }
+#endif
+        uint64_t one = 1;
+        ssize_t written = write(wake_fd, &one, sizeof(one));
+        (void)written; // Only fails if the counter is saturated, which wakes the publisher anyway
     }
+
+    uint64_t value_ = 0;
+    uint16_t count_ = 0;
+    uint16_t flags_ = 0;
+    uint32_t first_tick_ = 0;
+    uint32_t last_tick_ = 0;
+    uint32_t seq_ = 0;
+    std::atomic<uint64_t> dropped_{0};
+};
+
+FrameAssembler assembler;
+
+// pigpio alert callback for both data lines (and their watchdogs)
+void edge_callback(int gpio, int level, uint32_t tick) {
+    assembler.edge(gpio, level, tick);
 }
 
-// --------------------- Timeout Handling Function ---------------------
-
-void check_timeout() {
-    if (!wiegand_data.empty()) {
-        double current_time = gpioTick() / 1e6; // Current time in seconds
-        if ((current_time - last_bit_time) > BIT_TIMEOUT) {
-            if (wiegand_data.size() >= EXPECTED_BITS) {
-                process_wiegand_data();
-            } else {
-                // Log incomplete data
-                std::stringstream ss;
-                ss << "Incomplete Wiegand data received (" << wiegand_data.size() << " bits): ";
-                for (int bit : wiegand_data) {
-                    ss << bit;
+// --------------------- Publishing ---------------------
+
+// Accepts clients on the socket and sends every frame to each of them.
+// Sends never block: what a client has not taken yet waits in its backlog,
+// and while any backlog is full, frames wait on the ring instead.
+class Publisher {
+public:
+    bool open(const std::string& path) {
+        path_ = path;
+        if (path.size() >= sizeof(sockaddr_un::sun_path)) {
+            return false;
+        }
+        listen_fd_ = socket(AF_UNIX, SOCK_STREAM | SOCK_NONBLOCK | SOCK_CLOEXEC, 0);
+        if (listen_fd_ < 0) {
+            return false;
+        }
+        sockaddr_un address{};
+        address.sun_family = AF_UNIX;
+        std::strncpy(address.sun_path, path.c_str(), sizeof(address.sun_path) - 1);
+        unlink(path.c_str()); // Left behind by an earlier run
+        if (bind(listen_fd_, reinterpret_cast<sockaddr*>(&address), sizeof(address)) < 0 ||
+            chmod(path.c_str(), SOCKET_MODE) < 0 || listen(listen_fd_, 8) < 0) {
+            close(listen_fd_);
+            return false;
+        }
+        thread_ = std::thread(&Publisher::run, this);
+        return true;
+    }
+
+    int clients() const {
+        return client_count_.load();
+    }
+
+    // Stop now, or with drain, once every frame on the ring has been sent
+    void stop(bool drain = false) {
+        draining_ = drain;
+        stopping_ = true;
+        uint64_t one = 1;
+        ssize_t written = write(wake_fd, &one, sizeof(one));
+        (void)written;
+        if (thread_.joinable()) {
+            thread_.join();
+        }
+        for (Client& client : clients_) {
+            close(client.fd);
+        }
+        clients_.clear();
+        close(listen_fd_);
+        unlink(path_.c_str());
+    }
+
+private:
+    struct Client {
+        int fd;
+        std::string backlog;
+        size_t sent = 0;
+        std::chrono::steady_clock::time_point full_since{};
+    };
+
+    void run() {
+        std::vector<pollfd> fds;
+        uint64_t dropped_logged = 0;
+        while (true) {
+            fds.assign({{listen_fd_, POLLIN, 0}, {wake_fd, POLLIN, 0}});
+            for (const Client& client : clients_) {
+                fds.push_back({client.fd, short(POLLIN | (pending(client) ? POLLOUT : 0)), 0});
+            }
+            poll(fds.data(), fds.size(), 1000);
+
+            if (fds[1].revents & POLLIN) {
+                uint64_t count;
+                ssize_t got = read(wake_fd, &count, sizeof(count));
+                (void)got;
+            }
+            // Hangups first, while fds still lines up with clients_
+            for (size_t i = clients_.size(); i-- > 0;) {
+                short events = fds[i + 2].revents;
+                if ((events & (POLLHUP | POLLERR)) || ((events & POLLIN) && !client_open(clients_[i]))) {
+                    disconnect(i, "closed");
+                }
+            }
+            if (fds[0].revents & POLLIN) {
+                accept_clients();
+            }
+
+            // Take frames off the ring while every client has room for them. A
+            // flush can make room with frames still waiting, and nothing else
+            // would wake this thread for them, so go round until either runs out.
+            FrameRecord record;
+            do {
+                while (has_room() && frames.pop(record)) {
+                    for (Client& client : clients_) {
+                        client.backlog.append(reinterpret_cast<const char*>(&record), sizeof(record));
+                    }
+                    if (LOG_FRAMES) {
+                        log_frame(record);
+                    }
                 }
-                log_message("WARNING", ss.str());
-                std::cout << "Warning: Incomplete Wiegand data received." << std::endl;
-                wiegand_data.clear();
+                flush_all();
+            } while (!frames.empty() && has_room());
+
+            uint64_t dropped = assembler.dropped();
+            if (dropped != dropped_logged) {
+                event_log.log("WARNING", "wiegand_frames_dropped",
+                              "\"dropped\": " + std::to_string(dropped) + ", \"clients\": " +
+                              std::to_string(clients_.size()));
+                dropped_logged = dropped;
+            }
+            if (stopping_ && (!draining_ || ((frames.empty() || clients_.empty()) && !any_pending()))) {
+                return;
             }
         }
     }
-}
+
+    static bool pending(const Client& client) {
+        return client.sent < client.backlog.size();
+    }
+
+    bool any_pending() const {
+        return std::any_of(clients_.begin(), clients_.end(), pending);
+    }
+
+    bool has_room() {
+        auto now = std::chrono::steady_clock::now();
+        bool room = true;
+        for (size_t i = clients_.size(); i-- > 0;) {
+            Client& client = clients_[i];
+            if (client.backlog.size() - client.sent < MAX_BACKLOG) {
+                client.full_since = {};
+                continue;
+            }
+            if (client.full_since == std::chrono::steady_clock::time_point{}) {
+                client.full_since = now;
+            } else if (now - client.full_since > STALL_TIMEOUT) {
+                disconnect(i, "not reading");
+                continue;
+            }
+            room = false;
+        }
+        return room;
+    }
+
+    // False once the client has closed its end; anything it sends is ignored
+    static bool client_open(const Client& client) {
+        char buffer[256];
+        ssize_t got = recv(client.fd, buffer, sizeof(buffer), MSG_DONTWAIT);
+        return got > 0 || (got < 0 && (errno == EAGAIN || errno == EWOULDBLOCK));
+    }
+
+    void accept_clients() {
+        while (true) {
+            int fd = accept4(listen_fd_, nullptr, nullptr, SOCK_NONBLOCK | SOCK_CLOEXEC);
+            if (fd < 0) {
+                return;
+            }
+            Client client{fd, std::string(reinterpret_cast<const char*>(&STREAM_HEADER), sizeof(STREAM_HEADER))};
+            clients_.push_back(std::move(client));
+            client_count_ = clients_.size();
+            event_log.log("INFO", "client_connected", "\"clients\": " + std::to_string(clients_.size()));
+        }
+    }
+
+    void flush_all() {
+        for (size_t i = clients_.size(); i-- > 0;) {
+            Client& client = clients_[i];
+            while (pending(client)) {
+                ssize_t sent = send(client.fd, client.backlog.data() + client.sent, client.backlog.size() - client.sent,
+                                    MSG_DONTWAIT | MSG_NOSIGNAL);
+                if (sent < 0) {
+                    if (errno != EAGAIN && errno != EWOULDBLOCK) {
+                        disconnect(i, std::strerror(errno));
+                    }
+                    break;
+                }
+                client.sent += sent;
+            }
+            if (i < clients_.size() && !pending(clients_[i])) {
+                clients_[i].backlog.clear();
+                clients_[i].sent = 0;
+            }
+        }
+    }
+
+    void disconnect(size_t i, const std::string& reason) {
+        close(clients_[i].fd);
+        clients_.erase(clients_.begin() + i);
+        client_count_ = clients_.size();
+        event_log.log("INFO", "client_disconnected",
+                      "\"reason\": " + json_string(reason) + ", \"clients\": " + std::to_string(clients_.size()));
+    }
+
+    std::string path_;
+    int listen_fd_ = -1;
+    std::vector<Client> clients_;
+    std::atomic<int> client_count_{0};
+    std::atomic<bool> stopping_{false};
+    std::atomic<bool> draining_{false};
+    std::thread thread_;
+};
+
+Publisher publisher;
 
 // --------------------- Signal Handler ---------------------
 
-volatile bool keep_running = true;
+volatile sig_atomic_t keep_running = true;
 
-void signal_handler(int signum) {
+void signal_handler(int /*signum*/) {
     keep_running = false;
 }
 
-// --------------------- Main Function ---------------------
+bool open_publisher(const std::string& path) {
+    wake_fd = eventfd(0, EFD_NONBLOCK | EFD_CLOEXEC);
+    if (wake_fd < 0 || !publisher.open(path)) {
+        event_log.log("ERROR", "Failed to listen on " + path + ": " + std::strerror(errno));
+        return false;
+    }
+    event_log.log("INFO", "Publishing Wiegand frames on " + path);
+    return true;
+}
+
+#ifdef SIMULATED_EDGES
+
+// --------------------- Simulated Reader ---------------------
 
-int main() {
-    // Open log file
-    log_file.open(LOG_FILENAME, std::ios::out | std::ios::app);
-    if (!log_file.is_open()) {
+const uint32_t BIT_INTERVAL_US = 2000; // Readers send a bit every 1-2.5 ms
+
+// The bits of frame i, first bit most significant, repeating after 64 (SplitMix64)
+uint64_t frame_pattern(uint64_t i) {
+    uint64_t z = i + 0x9E3779B97F4A7C15ull;
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ull;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBull;
+    return z ^ (z >> 31);
+}
+
+// Calls the edge callback as pigpio would: falling and rising edges on the
+// line of each bit, then a watchdog report once the line has been idle. Ticks
+// are simulated, starting just before the 32-bit wrap; frames start at rate
+// per second of real time (or back to back with rate 0).
+void inject(uint64_t count, int bits, double rate) {
+    uint32_t tick = UINT32_MAX - 1000000;
+    auto start = std::chrono::steady_clock::now();
+    for (uint64_t i = 0; i < count && keep_running; ++i) {
+        if (rate > 0) {
+            std::this_thread::sleep_until(start + std::chrono::duration<double>(i / rate));
+        }
+        uint64_t pattern = frame_pattern(i);
+        for (int j = 0; j < bits; ++j) {
+            int gpio = (pattern >> (63 - j % 64)) & 1 ? DATA1_PIN : DATA0_PIN;
+            edge_callback(gpio, 0, tick);
+            edge_callback(gpio, 1, tick + 50);
+            tick += BIT_INTERVAL_US;
+        }
+        edge_callback(DATA0_PIN, PI_TIMEOUT, tick - BIT_INTERVAL_US + FRAME_GAP_US);
+        tick += 2 * FRAME_GAP_US;
+    }
+}
+
+int main(int argc, char* argv[]) {
+    if (argc != 5) {
+        std::cerr << "Usage: " << argv[0] << " <socket> <frames> <bits per frame> <frames per second, 0 for flat out>"
+                  << std::endl;
+        return 1;
+    }
+    if (!event_log.open(LOG_FILENAME)) {
         std::cerr << "Error: Unable to open log file: " << LOG_FILENAME << std::endl;
         return 1;
     }
-
-    // Register signal handler for graceful shutdown
     std::signal(SIGINT, signal_handler);
     std::signal(SIGTERM, signal_handler);
+    if (!open_publisher(argv[1])) {
+        event_log.close();
+        return 1;
+    }
+
+    // Nothing is sent until a client is there to receive it
+    while (keep_running && publisher.clients() == 0) {
+        std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    }
+    inject(std::stoull(argv[2]), std::stoi(argv[3]), std::stod(argv[4]));
+    publisher.stop(true);
+    event_log.log("INFO", "Simulated reader finished.");
+    event_log.close();
+    return 0;
+}
+
+#else
+
+// --------------------- Main Function ---------------------
+
+int main(int argc, char* argv[]) {
+    std::string socket_path = argc > 1 ? argv[1] : SOCKET_PATH;
+
+    // Open log file and start its writer thread
+    if (!event_log.open(LOG_FILENAME)) {
+        std::cerr << "Error: Unable to open log file: " << LOG_FILENAME << std::endl;
+        return 1;
+    }
 
     // Initialize pigpio
     if (gpioInitialise() < 0) {
-        log_message("ERROR", "pigpio initialization failed.");
+        event_log.log("ERROR", "pigpio initialization failed.");
+        event_log.close();
+        return 1;
+    }
+
+    // pigpio installs its own signal handlers; replace them for a graceful shutdown
+    gpioSetSignalFunc(SIGINT, signal_handler);
+    gpioSetSignalFunc(SIGTERM, signal_handler);
+
+    if (!open_publisher(socket_path)) {
+        gpioTerminate();
+        event_log.close();
         return 1;
     }
 
@@ -222,48 +714,42 @@ int main() {
     gpioSetPullUpDown(DATA0_PIN, PI_PUD_UP);
     gpioSetPullUpDown(DATA1_PIN, PI_PUD_UP);
 
-    // Register callbacks
-    int cb0 = gpioSetAlertFunc(DATA0_PIN, data0_callback);
-    if (cb0 < 0) {
-        log_message("ERROR", "Failed to set callback for DATA0_PIN.");
+    // Register the callback on both lines; the watchdogs report idle lines so the last frame is closed on time
+    if (gpioSetAlertFunc(DATA0_PIN, edge_callback) < 0 || gpioSetAlertFunc(DATA1_PIN, edge_callback) < 0) {
+        event_log.log("ERROR", "Failed to set callbacks for the data lines.");
+        gpioSetAlertFunc(DATA0_PIN, nullptr);
+        publisher.stop();
         gpioTerminate();
+        event_log.close();
         return 1;
     }
+    gpioSetWatchdog(DATA0_PIN, WATCHDOG_MS);
+    gpioSetWatchdog(DATA1_PIN, WATCHDOG_MS);
 
-    int cb1 = gpioSetAlertFunc(DATA1_PIN, data1_callback);
-    if (cb1 < 0) {
-        log_message("ERROR", "Failed to set callback for DATA1_PIN.");
-        gpioSetAlertFunc(DATA0_PIN, nullptr); // Remove previous callback
-        gpioTerminate();
-        return 1;
-    }
+    event_log.log("INFO", "Starting Wiegand Reader. Press Ctrl+C to exit.");
 
-    log_message("INFO", "Starting Wiegand Reader. Press Ctrl+C to exit.");
-    std::cout << "Starting Wiegand Reader. Press Ctrl+C to exit." << std::endl;
-
-    // Main loop
+    // Main loop: everything happens on pigpio's alert thread and the publisher
     while (keep_running) {
-        check_timeout();
-        time_sleep(0.05); // Sleep for 50 milliseconds
+        time_sleep(0.1);
     }
 
-    log_message("INFO", "Exiting program due to interrupt.");
-    std::cout << "\nExiting program." << std::endl;
+    event_log.log("INFO", "Exiting program due to interrupt.");
 
-    // Clean up callbacks
+    // Clean up watchdogs and callbacks
+    gpioSetWatchdog(DATA0_PIN, 0);
+    gpioSetWatchdog(DATA1_PIN, 0);
     gpioSetAlertFunc(DATA0_PIN, nullptr);
     gpioSetAlertFunc(DATA1_PIN, nullptr);
 
-    // Close log file
-    if (log_file.is_open()) {
-        log_file.close();
-    }
-
-    // Terminate pigpio
+    // Terminate pigpio, then stop publishing
     gpioTerminate();
+    publisher.stop();
 
-    log_message("INFO", "Cleaned up GPIO and stopped pigpio.");
-    std::cout << "Cleaned up GPIO and stopped pigpio." << std::endl;
+    // Write out the remaining records and close the log file
+    event_log.log("INFO", "Cleaned up GPIO and stopped pigpio.");
+    event_log.close();
 
     return 0;
 }
+
+#endif
@@ -1,8 +1,18 @@
 #!/usr/bin/env python3
-import pigpio
-import time
 import logging
+import os
+import queue
 import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import event_journal, hardware, logs, metrics
+from common.edge_capture import EdgeRecorder
+from common.event_journal import EventJournal
+from common.repeat_filter import RepeatFilter
+from common.server_client import EventUploader
+from common import wiegand_formats
+from common.wiegand import WiegandCapture, frame_bits
 
 # --------------------- Configuration ---------------------
 
@@ -11,141 +21,145 @@ DATA0_PIN = 23  # Green wire (Data 0)
 DATA1_PIN = 18  # White wire (Data 1)
 
 # Wiegand configuration
-EXPECTED_BITS = 26          # Change to 34 if your reader uses 34-bit Wiegand
-BIT_TIMEOUT = 0.5           # Time (in seconds) to wait before processing data
+EXPECTED_BITS = 26          # Shorter frames are reported as incomplete; longer ones are auto-detected
+FRAME_GAP_MS = 8            # A gap this long between bits (by pigpio tick) ends a frame
 BOUNCE_TIME_MS = 50         # Debounce time in milliseconds
+REPEAT_WINDOW = 2.0         # Seconds a held card is ignored after its last read (it reads every ~0.9 s)
 
-# Logging configuration
+# Logging configuration: one JSON line per event, rotated at LOG_MAX_BYTES
 LOG_FILENAME = 'wiegand_reader.log'
 LOG_LEVEL = logging.INFO    # Set to DEBUG for more detailed logs
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 5
+
+# Raw edge capture for offline diagnosis and replay (see common/edge_capture.py);
+# e.g. "edges.wgec" records every (gpio, level, tick) the callbacks see
+CAPTURE_FILE = None
 
 # Reader information
 READER_TYPE = "Indala Wiegand"
 
+# Access event journal; events are uploaded in batches when SERVER_URL is set
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events")
+SERVER_URL = None  # e.g. "https://example.com", which must accept POST /events
+EVENT_BATCH_SIZE = 100
+
+# Counters and per-stage latency histograms (see common/metrics.py), served in
+# Prometheus text at http://127.0.0.1:METRICS_PORT/metrics; None to turn off
+METRICS_PORT = 9110
+
 # --------------------- Logging Setup ---------------------
 
-# Configure logging to file and console
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILENAME),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Log to file and console from a background thread, so the pigpio callback
+# never waits on the disk or the terminal
+logs.setup(LOG_FILENAME, level=LOG_LEVEL, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS)
 
 # --------------------- Global Variables ---------------------
 
-wiegand_data = []
-last_bit_time = time.time()
+# Edges go onto a preallocated ring; frames are assembled from their pigpio
+# ticks on the capture thread and queued on capture.frames
+capture = WiegandCapture(DATA0_PIN, DATA1_PIN, frame_gap_us=FRAME_GAP_MS * 1000, clock=None)
+repeats = RepeatFilter(REPEAT_WINDOW)
+journal = None
+recorder = None
 
 # --------------------- Callback Functions ---------------------
 
-def data0_callback(gpio, level, tick):
-    global wiegand_data, last_bit_time
-    if level == 0:
-        wiegand_data.append(0)
-        last_bit_time = time.time()
-        logging.debug(f"Data0 pulse detected on GPIO{gpio}. Bit appended: 0")
-#        print("Data0 pulse detected")
-
-def data1_callback(gpio, level, tick):
-    global wiegand_data, last_bit_time
+def wiegand_callback(gpio, level, tick):
     if level == 0:
-        wiegand_data.append(1)
-        last_bit_time = time.time()
-        logging.debug(f"Data1 pulse detected on GPIO{gpio}. Bit appended: 1")
- #       print("Data1 pulse detected")
+        logs.log_event("wiegand_bit", logging.DEBUG, gpio=gpio, tick=tick, bit=int(gpio == DATA1_PIN))
+    if recorder is not None:
+        recorder.edge(gpio, level, tick)
+    capture.edge(gpio, level, tick)
 
 # --------------------- Data Processing Function ---------------------
 
-def process_wiegand_data():
-    global wiegand_data
-    if len(wiegand_data) >= EXPECTED_BITS:
-        card_bits = ''.join(map(str, wiegand_data[:EXPECTED_BITS]))
-        card_number = int(card_bits, 2)
-
-        # Parsing based on Wiegand 26-bit format
-        if EXPECTED_BITS == 26:
-            # Typically: 1 start bit, 8 facility code bits, 16 card number bits, 1 parity bit
-            facility_code = int(card_bits[1:9], 2)
-            card_number = int(card_bits[9:25], 2)
-        elif EXPECTED_BITS == 34:
-            # Implement parsing for 34-bit Wiegand if needed
-            # This is an example and should be adjusted based on your reader's specification
-            facility_code = int(card_bits[1:9], 2)
-            card_number = int(card_bits[9:33], 2)
-        else:
-            facility_code = None  # Not parsed
-            # For non-standard bit lengths, adjust parsing accordingly
-
-        # Log the information
-        logging.info("--------------------------------------------------")
-        logging.info("Card Read Detected:")
-        logging.info(f"Reader Type    : {READER_TYPE}")
-        logging.info(f"Binary Data    : {card_bits}")
-        if facility_code is not None:
-            logging.info(f"Facility Code  : {facility_code}")
-        logging.info(f"Card Number    : {card_number}")
-        logging.info("--------------------------------------------------")
-
-        # Print to console
-        print("\nCard Read Detected:")
-        print(f"Reader Type   : {READER_TYPE}")
-        print(f"Binary Data   : {card_bits}")
-        if facility_code is not None:
-            print(f"Facility Code : {facility_code}")
-        print(f"Card Number   : {card_number}")
-        print("--------------------------------------------------\n")
-
-        # Clear the data for the next read
-        wiegand_data = []
+def process_wiegand_data(frame):
+    start = time.perf_counter_ns()
+    card_bits = frame_bits(frame)
+    credential = wiegand_formats.decode(frame.value, frame.bit_count)
+    if credential is None:
+        if wiegand_formats.formats_for(frame.bit_count):
+            # A known length with bad parity is a misread, not a card
+            metrics.WIEGAND_PARITY_ERRORS.inc()
+            logs.log_event("wiegand_parity_error", logging.WARNING, bit_count=frame.bit_count, bits=card_bits)
+            return
+        # Unknown format: report the whole frame as the card number
+        credential = wiegand_formats.WiegandCredential(f"{frame.bit_count}-bit", None, frame.value)
+    metrics.WIEGAND_DECODE.record(time.perf_counter_ns() - start)
+    if repeats.is_repeat((frame.bit_count, frame.value)):
+        logs.log_event("repeat_read", logging.DEBUG, bits=card_bits)
+        return
+    facility_code = credential.facility_code
+    card_number = credential.card_number
+
+    metrics.READS.inc()
+    logs.log_event("card_read", reader=READER_TYPE, bits=card_bits, format=credential.format,
+                   facility_code=facility_code, card_number=card_number)
+    journal.append(event_journal.CARD_READ, reader=READER_TYPE, bits=card_bits,
+                   format=credential.format, facility_code=facility_code, card_number=card_number)
 
 # --------------------- Main Function ---------------------
 
 def main():
-    global wiegand_data, last_bit_time
+    global journal, recorder
+
+    journal = EventJournal(JOURNAL_DIR)
+    if CAPTURE_FILE is not None:
+        recorder = EdgeRecorder(CAPTURE_FILE)
+        logging.info(f"Recording raw edges to {CAPTURE_FILE}")
+    uploader = EventUploader(journal, SERVER_URL, batch_size=EVENT_BATCH_SIZE) if SERVER_URL else None
+    metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT is not None else None
 
-    # Initialize pigpio
-    pi = pigpio.pi()
+    # Initialize pigpio (a fake with ACCESS_CONTROL_FAKE_HARDWARE=1)
+    pi = hardware.pigpio_pi()
     if not pi.connected:
         logging.error("Failed to connect to pigpio daemon. Ensure that pigpiod is running.")
         sys.exit(1)
 
     # Set pull-up resistors for Data0 and Data1
-    pi.set_pull_up_down(DATA0_PIN, pigpio.PUD_UP)
-    pi.set_pull_up_down(DATA1_PIN, pigpio.PUD_UP)
+    pi.set_pull_up_down(DATA0_PIN, hardware.PUD_UP)
+    pi.set_pull_up_down(DATA1_PIN, hardware.PUD_UP)
 
-    # Register callbacks
-    cb0 = pi.callback(DATA0_PIN, pigpio.FALLING_EDGE, data0_callback)
-    cb1 = pi.callback(DATA1_PIN, pigpio.FALLING_EDGE, data1_callback)
+    # Register callbacks; the watchdogs report idle lines so the last frame is closed on time
+    cb0 = pi.callback(DATA0_PIN, hardware.FALLING_EDGE, wiegand_callback)
+    cb1 = pi.callback(DATA1_PIN, hardware.FALLING_EDGE, wiegand_callback)
+    pi.set_watchdog(DATA0_PIN, capture.watchdog_ms)
+    pi.set_watchdog(DATA1_PIN, capture.watchdog_ms)
+    capture.start()
 
     logging.info("Starting Wiegand Reader. Press Ctrl+C to exit.")
-    print("Starting Wiegand Reader. Press Ctrl+C to exit.")
 
     try:
         while True:
-            current_time = time.time()
-            if wiegand_data and (current_time - last_bit_time) > BIT_TIMEOUT:
-                if len(wiegand_data) >= EXPECTED_BITS:
-                    process_wiegand_data()
-                else:
-                    logging.warning(f"Incomplete Wiegand data received: {wiegand_data}")
-                    print("Warning: Incomplete Wiegand data received.")
-                    wiegand_data = []
-            elif len(wiegand_data) >= EXPECTED_BITS:
-                process_wiegand_data()
-            time.sleep(0.05)  # Sleep briefly to reduce CPU usage
+            try:
+                frame = capture.frames.get(timeout=1)
+            except queue.Empty:
+                continue
+            if frame.bit_count >= EXPECTED_BITS:
+                process_wiegand_data(frame)
+            else:
+                metrics.WIEGAND_INCOMPLETE.inc()
+                logs.log_event("wiegand_incomplete", logging.WARNING, bit_count=frame.bit_count,
+                               bits=frame_bits(frame))
     except KeyboardInterrupt:
         logging.info("Exiting program due to keyboard interrupt.")
-        print("\nExiting program.")
     finally:
-        # Clean up callbacks and pigpio
+        # Clean up watchdogs, callbacks and pigpio
+        pi.set_watchdog(DATA0_PIN, 0)
+        pi.set_watchdog(DATA1_PIN, 0)
         cb0.cancel()
         cb1.cancel()
+        capture.stop()
+        if recorder is not None:
+            recorder.close()
         pi.stop()
+        if uploader is not None:
+            uploader.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        journal.close()
         logging.info("Cleaned up GPIO and stopped pigpio.")
-        print("Cleaned up GPIO and stopped pigpio.")
 
 # --------------------- Entry Point ---------------------
 
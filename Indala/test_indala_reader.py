@@ -1,10 +1,20 @@
+import os
 import pigpio
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.edge_capture import EdgeRecorder
+
 # Define GPIO pins
 DATA0_PIN = 23
 DATA1_PIN = 18
 
+# Optionally record the raw edges for offline replay:
+#   python3 test_indala_reader.py edges.wgec
+#   python3 -m common.edge_capture decode edges.wgec 23 18
+recorder = EdgeRecorder(sys.argv[1]) if len(sys.argv) > 1 else None
+
 # Initialize pigpio
 pi = pigpio.pi()
 if not pi.connected:
@@ -12,12 +22,16 @@ if not pi.connected:
 
 # Define callback functions
 def data0_callback(gpio, level, tick):
+    if recorder is not None:
+        recorder.edge(gpio, level, tick)
     if level == 0:
-        print("Data0 pulse detected")
+        print(f"Data0 pulse detected at tick {tick}")
 
 def data1_callback(gpio, level, tick):
+    if recorder is not None:
+        recorder.edge(gpio, level, tick)
     if level == 0:
-        print("Data1 pulse detected")
+        print(f"Data1 pulse detected at tick {tick}")
 
 # Set up edge detection
 pi.set_pull_up_down(DATA0_PIN, pigpio.PUD_UP)
@@ -37,3 +51,5 @@ finally:
     cb0.cancel()
     cb1.cancel()
     pi.stop()
+    if recorder is not None:
+        recorder.close()
@@ -1,129 +1,142 @@
-import board
-import busio
-from digitalio import DigitalInOut, Direction
-from adafruit_pn532.i2c import PN532_I2C
 import logging
+import os
+import signal
+import sys
 import time
-import RPi.GPIO as GPIO
-from authorized_uids import AUTHORIZED_UIDS  # Import the authorized UIDs list
-
-# Configure logging to also output to a file
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("access_control.log"),
-        logging.StreamHandler()
-    ]
-)
+from authorized_uids import AUTHORIZED_UIDS  # Used until a credential file is installed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import event_journal, hardware, logs, metrics
+from common.access_policy import PolicyStore
+from common.credential_store import CredentialStore
+from common.door import DoorRegistry, UNLOCKED
+from common.event_journal import EventJournal
+from common.pn532_session import open_session
+from common.repeat_filter import RepeatFilter
+from common.server_client import EventUploader
+
+# Log to the console and access_control.log (rotated at 1 MiB, 5 kept), one
+# JSON line per record; a background thread does the writing, so the read loop
+# and door never wait on the disk
+logs.setup("access_control.log")
 
 # Define GPIO pins for relay
 RELAY_SET_PIN = 27    # GPIO27 connected to relay's SET pin (Unlock)
 RELAY_UNSET_PIN = 17  # GPIO17 connected to relay's UNSET pin (Lock)
 
-# Initialize GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(RELAY_SET_PIN, GPIO.OUT)
-GPIO.setup(RELAY_UNSET_PIN, GPIO.OUT)
+# PN532 IRQ output (see ReadMe.txt); cards are detected on its edge instead of
+# polling the PN532 over I2C. Set to None to poll, with GPIO12 as P32/H_Request.
+PN532_IRQ_PIN = 12
 
-# Ensure relay pins are low initially
-GPIO.output(RELAY_SET_PIN, GPIO.LOW)
-GPIO.output(RELAY_UNSET_PIN, GPIO.LOW)
+# Door timing
+UNLOCK_TIME = 5     # seconds the door stays unlocked after the last authorized card
+PULSE_TIME = 0.1    # 100 ms SET/UNSET coil pulse
+COOLDOWN_TIME = 0   # seconds after relocking before another card can unlock the door
+REPEAT_WINDOW = 2.0 # seconds a card held at the reader is ignored after its last read
 
-# Cooldown parameters to prevent multiple rapid activations
-COOLDOWN_TIME = 5  # seconds
-last_activation_time = 0
+# Credential store (build with: python3 -m common.credential_store build uids.txt credentials.bin)
+CREDENTIALS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "credentials.bin")
+CREDENTIALS_CHECK_INTERVAL = 1.0  # seconds between checks for a changed credential file
 
-def initialize_pn532():
-    """
-    Initialize the PN532 NFC/RFID module over I2C.
-    Returns the PN532 object if successful, else None.
-    """
-    try:
-        # Define reset and request pins
-        reset_pin = DigitalInOut(board.D6)
-        req_pin = DigitalInOut(board.D12)
+# Badge groups with weekly schedules, holidays and expiry (see common/access_policy.py).
+# When set, the policy decides every tap at this door instead of the credential store.
+POLICY_FILE = None  # e.g. os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy.json")
 
-        # Initialize I2C bus
-        i2c = busio.I2C(board.SCL, board.SDA)
+# Access event journal; events are uploaded in batches when SERVER_URL is set
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events")
+SERVER_URL = None  # e.g. "https://example.com", which must accept POST /events
+EVENT_BATCH_SIZE = 100
 
-        # Initialize PN532 with I2C connection
-        pn532 = PN532_I2C(i2c, reset=reset_pin, req=req_pin)
+# Counters and per-stage latency histograms (see common/metrics.py), served in
+# Prometheus text at http://127.0.0.1:METRICS_PORT/metrics; None to turn off
+METRICS_PORT = 9108
 
-        # Get firmware version
-        ic, ver, rev, support = pn532.firmware_version
-        logging.info(f'Found PN532 with firmware version: {ver}.{rev}')
+journal = EventJournal(JOURNAL_DIR)
 
-        # Configure PN532 to communicate with MiFare cards
-        pn532.SAM_configuration()
+# The door this reader opens (see DoorRegistry in common/door.py)
+DOORS = {
+    "front": {"relay": "latching", "set_pin": RELAY_SET_PIN, "unset_pin": RELAY_UNSET_PIN,
+              "hold_time": UNLOCK_TIME, "pulse_time": PULSE_TIME, "cooldown": COOLDOWN_TIME},
+}
 
-        return pn532
-    except Exception as e:
-        logging.error(f"Error initializing PN532: {e}")
-        return None
+def record_door_state(name, state):
+    journal.append(event_journal.DOOR_OPENED if state == UNLOCKED else event_journal.DOOR_LOCKED)
+
+# Initialize GPIO (RPi.GPIO, or a fake with ACCESS_CONTROL_FAKE_HARDWARE=1)
+GPIO = hardware.gpio()
+GPIO.setmode(GPIO.BCM)
+
+# The door relocks on a background timer, so the read loop keeps polling while it is open.
+# The PN532's RSTPD_N and IRQ/H_Request pins are reserved, so a relay cannot be put on them.
+doors = DoorRegistry(GPIO, DOORS, reserved={6: "PN532 RSTPD_N", 12: "PN532 IRQ"}, on_change=record_door_state)
+door = doors["front"]
+
+# Ensure relay pins are low initially
+doors.setup()
 
 def activate_relay():
     """
-    Activates the relay to unlock the door for 5 seconds, then locks it again.
+    Unlocks the door for UNLOCK_TIME seconds without blocking the caller.
+    Another authorized card while the door is open extends the relock deadline.
     """
-    global last_activation_time
     try:
-        # Update the last activation time
-        last_activation_time = time.time()
-
-        logging.info("Activating relay to unlock the door...")
-        # Pulse the SET pin to unlock
-        GPIO.output(RELAY_SET_PIN, GPIO.HIGH)
-        time.sleep(0.1)  # 100 ms pulse
-        GPIO.output(RELAY_SET_PIN, GPIO.LOW)
-
-        # Keep the door unlocked for 5 seconds
-        logging.info("Door unlocked. Keeping it unlocked for 5 seconds...")
-        time.sleep(5)
-
-        # Pulse the UNSET pin to lock
-        logging.info("Deactivating relay to lock the door...")
-        GPIO.output(RELAY_UNSET_PIN, GPIO.HIGH)
-        time.sleep(0.1)  # 100 ms pulse
-        GPIO.output(RELAY_UNSET_PIN, GPIO.LOW)
-
-        logging.info("Door locked successfully.")
+        door.grant()
     except Exception as e:
         logging.error(f"Error activating relay: {e}")
 
+def authorize(uid, credentials):
+    """
+    Decides one card, grants or denies it and records the decision.
+    """
+    logs.log_event("card_read", uid=uid.hex().upper())
+    journal.append(event_journal.CARD_READ, uid=uid.hex())
+    metrics.READS.inc()
+
+    start = time.perf_counter_ns()
+    granted = uid in credentials
+    metrics.CREDENTIAL_CHECK.record(time.perf_counter_ns() - start)
+    if granted:
+        metrics.GRANTS.inc()
+        logs.log_event("access_granted", uid=uid.hex().upper())
+        journal.append(event_journal.GRANT, uid=uid.hex())
+        activate_relay()
+    else:
+        metrics.DENIES.inc()
+        logs.log_event("access_denied", logging.WARNING, uid=uid.hex().upper())
+        journal.append(event_journal.DENY, uid=uid.hex())
+
 def main():
-    pn532 = initialize_pn532()
-    if pn532 is None:
+    # PN532 over I2C with RSTPD_N on GPIO6 and IRQ (or P32/H_Request) on GPIO12.
+    # After a bus error the session resynchronizes or resets it on the next read.
+    pn532 = open_session(reset_pin=6, req_pin=12, irq_pin=PN532_IRQ_PIN)
+    if not pn532.connect():
         logging.error("Failed to initialize PN532. Exiting program.")
         return
 
+    # Reload credentials (or the policy) when the file changes or on SIGHUP, without stopping the read loop
+    if POLICY_FILE:
+        credentials = PolicyStore(POLICY_FILE, door="front", fallback=AUTHORIZED_UIDS)
+    else:
+        credentials = CredentialStore(CREDENTIALS_FILE, fallback=AUTHORIZED_UIDS)
+    credentials.start_watching(CREDENTIALS_CHECK_INTERVAL)
+    signal.signal(signal.SIGHUP, lambda signum, frame: credentials.request_reload())
+
+    uploader = EventUploader(journal, SERVER_URL, batch_size=EVENT_BATCH_SIZE) if SERVER_URL else None
+    metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT is not None else None
+
+    # A card left on the reader is handled once; other cards are not held up
+    repeats = RepeatFilter(REPEAT_WINDOW)
+
     logging.info("Access Control System is active. Waiting for RFID/NFC cards...")
 
     while True:
         try:
-            current_time = time.time()
-            # Implement cooldown to prevent multiple activations
-            if current_time - last_activation_time < COOLDOWN_TIME:
-                time.sleep(0.1)
-                continue
-
-            # Read a passive target (card) for 0.5 seconds
-            uid = pn532.read_passive_target(timeout=0.5)
-            if uid is None:
-                continue  # No card detected, continue waiting
-
-            # Format UID for logging and comparison
-            uid_str = ' '.join([f'{byte:02X}' for byte in uid])
-            logging.info(f"Detected card with UID: {uid_str}")
-
-            if uid in AUTHORIZED_UIDS:
-                logging.info("Access granted. Authorized card detected.")
-                activate_relay()
-            else:
-                logging.warning("Access denied. Unauthorized card detected.")
-
-            # Small delay to prevent multiple scans in quick succession
-            time.sleep(1)
+            # Wait up to 0.5 seconds for cards; two tapped together (or two
+            # badges in one wallet) come back from the same read
+            for card in pn532.read_targets(timeout=0.5):
+                if repeats.is_repeat(card.uid):
+                    continue  # Same card still on the reader
+                authorize(card.uid, credentials)
 
         except KeyboardInterrupt:
             logging.info("Program interrupted by user. Exiting...")
@@ -131,7 +144,14 @@ def main():
         except Exception as e:
             logging.error(f"An unexpected error occurred: {e}")
 
-    # Clean up GPIO settings before exiting
+    # Lock the door and clean up GPIO settings before exiting
+    credentials.stop_watching()
+    doors.close()
+    if uploader is not None:
+        uploader.close()
+    if metrics_server is not None:
+        metrics_server.close()
+    journal.close()
     GPIO.cleanup()
 
 if __name__ == "__main__":
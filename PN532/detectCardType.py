@@ -1,73 +1,43 @@
-import board
-import busio
-from digitalio import DigitalInOut
-from adafruit_pn532.i2c import PN532_I2C
 import logging
+import os
+import sys
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import card_info, logs
+from common.card_info import CardTypes
+from common.pn532_session import open_session
 
-# Initialize I2C and PN532
-reset_pin = DigitalInOut(board.D6)
-req_pin = DigitalInOut(board.D12)
-i2c = busio.I2C(board.SCL, board.SDA)
-pn532 = PN532_I2C(i2c, reset=reset_pin, req=req_pin)
+# Configure logging: one JSON line per record, written from a background thread
+logs.setup()
 
-# Get firmware version
-try:
-    ic, ver, rev, support = pn532.firmware_version
-    logging.info(f'Found PN532 with firmware version: {ver}.{rev}')
-except Exception as e:
-    logging.error(f"Failed to get firmware version: {e}")
+# Initialize the PN532 over I2C with RSTPD_N on GPIO6 and P32/H_Request on GPIO12
+session = open_session(reset_pin=6, req_pin=12)
+if not session.connect():
+    logging.error("Failed to initialize PN532.")
     exit()
 
-# Configure PN532 to communicate with MiFare cards
-try:
-    pn532.SAM_configuration()
-except Exception as e:
-    logging.error(f"Failed to configure SAM: {e}")
-    exit()
-
-# Wait for a card
+# Wait for a card; InListPassiveTarget answers with its ATQA and SAK along with the UID
 logging.info("Waiting for RFID/NFC card...")
-uid = pn532.read_passive_target(timeout=10)
+info = session.read_card_info(timeout=10)
 
-if uid is None:
+if info is None:
     logging.error("No card detected.")
     exit()
 
-uid_str = ' '.join([f'{byte:02X}' for byte in uid])
+uid_str = ' '.join([f'{byte:02X}' for byte in info.uid])
 logging.info(f"Found card with UID: {uid_str}")
+logging.info(f"ATQA: {info.atqa:04X}, SAK: {info.sak:02X}" + (f", ATS: {info.ats.hex().upper()}" if info.ats else ""))
 
-# Define known SAK mappings (extend as needed)
-sak_card_mapping = {
-    0x08: "MiFare Ultralight",
-    0x18: "MiFare Classic 1K",
-    0x20: "NTAG213",
-    0x28: "NTAG215",
-    0x30: "NTAG216",
-    0x40: "MiFare Plus (Configured)",
-    0x60: "MiFare DESFire EV1",
-    # Add more mappings as needed
-}
-
-# Since we cannot retrieve SAK and ATQA directly, infer based on UID
-# Example assumption: UID starting with 0x33 is NTAG213
-first_byte = uid[0]
-
-if first_byte == 0x33:
-    card_type = "NTAG213"
-elif first_byte == 0x04:
-    card_type = "MiFare Classic 1K"
-else:
-    card_type = "Unknown or unsupported"
+# SAK 0x00 is the whole Ultralight/NTAG family; GET_VERSION tells which one it is
+with session as pn532:
+    card_type = CardTypes().resolve(pn532, info).card_type
 
-logging.info(f"Assumed Card Type: {card_type}")
+logging.info(f"Card Type: {card_type}")
 
-# Proceed based on assumed card type
-if "NTAG" in card_type:
-    logging.info("This is an NTAG card. You can perform NDEF operations.")
-elif "MiFare Classic" in card_type:
+# Proceed based on card type
+if card_type in card_info.NTAG_TYPES:
+    logging.info("This is an NTAG/Ultralight card. You can perform NDEF operations.")
+elif card_type in card_info.MIFARE_CLASSIC_TYPES:
     logging.info("This is a MiFare Classic card. You can perform sector-based operations.")
 else:
     logging.warning("Card type is unknown or unsupported for standard operations.")
@@ -1,62 +1,39 @@
-import board
-import busio
-from digitalio import DigitalInOut
-from adafruit_pn532.i2c import PN532_I2C
 import logging
-import time
+import os
+import sys
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import logs
+from common.pn532_session import open_session
+from common.repeat_filter import RepeatFilter
 
-def initialize_pn532():
-    """
-    Initialize the PN532 NFC/RFID module over I2C.
-    Returns the PN532 object if successful, else None.
-    """
-    try:
-        # Define reset and request pins
-        reset_pin = DigitalInOut(board.D6)
-        req_pin = DigitalInOut(board.D12)
-
-        # Initialize I2C bus
-        i2c = busio.I2C(board.SCL, board.SDA)
-
-        # Initialize PN532 with I2C connection
-        pn532 = PN532_I2C(i2c, reset=reset_pin, req=req_pin)
-
-        # Get firmware version
-        ic, ver, rev, support = pn532.firmware_version
-        logging.info(f'Found PN532 with firmware version: {ver}.{rev}')
+# PN532 IRQ output (see ReadMe.txt); None to poll, with GPIO12 as P32/H_Request
+PN532_IRQ_PIN = 12
 
-        # Configure PN532 to communicate with MiFare cards
-        pn532.SAM_configuration()
-
-        return pn532
-    except Exception as e:
-        logging.error(f"Error initializing PN532: {e}")
-        return None
+# Configure logging: one JSON line per record, written from a background thread
+logs.setup()
 
 def main():
-    pn532 = initialize_pn532()
-    if pn532 is None:
+    # PN532 over I2C with RSTPD_N on GPIO6 and IRQ (or P32/H_Request) on GPIO12;
+    # with the IRQ pin it sleeps on the IRQ line between cards instead of polling
+    pn532 = open_session(reset_pin=6, req_pin=12, irq_pin=PN532_IRQ_PIN)
+    if not pn532.connect():
         logging.error("Failed to initialize PN532. Exiting.")
         return
 
+    # Log each card once while it stays on the reader
+    repeats = RepeatFilter()
+
     logging.info("UID Detection Script is active. Waiting for RFID/NFC cards...")
 
     try:
         while True:
-            # Read a passive target (card) for 0.5 seconds
-            uid = pn532.read_passive_target(timeout=0.5)
-            if uid is None:
-                continue  # No card detected, continue waiting
-
-            # Format UID for logging and comparison
-            uid_str = ' '.join([f'{byte:02X}' for byte in uid])
-            logging.info(f"Detected card with UID: {uid_str}")
+            # Wait up to 0.5 seconds for cards, up to two at a time
+            for card in pn532.read_targets(timeout=0.5):
+                if repeats.is_repeat(card.uid):
+                    continue  # Same card still on the reader
 
-            # Wait a short period before next scan
-            time.sleep(1)
+                logs.log_event("card_read", uid=card.uid.hex().upper())
 
     except KeyboardInterrupt:
         logging.info("Program interrupted by user. Exiting...")
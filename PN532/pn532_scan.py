@@ -1,118 +1,117 @@
-import time
-import board
-import busio
-from digitalio import DigitalInOut
-from adafruit_pn532.i2c import PN532_I2C
 import logging
+import os
 import sys
 
-# Configure logging to output to the command line
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import card_info, logs, mifare_classic, ntag
+from common.card_info import CardTypes
+from common.mifare_keys import KeyDictionary, card_family
+from common.pn532_session import PN532Unavailable, open_session
+from common.repeat_filter import RepeatFilter
 
-def initialize_pn532():
-    """
-    Initialize the PN532 NFC/RFID module over I2C.
-    Returns the PN532 object if successful, else None.
-    """
-    try:
-        # Define the reset and request pins
-        reset_pin = DigitalInOut(board.D6)
-        req_pin = DigitalInOut(board.D12)
+# PN532 IRQ output (see ReadMe.txt); None to poll, with GPIO12 as P32/H_Request
+PN532_IRQ_PIN = 12
 
-        # Initialize I2C bus
-        i2c = busio.I2C(board.SCL, board.SDA)
+# MiFare Classic key dictionary (one hex key per line); the key that opened each
+# sector is remembered per card family, so known cards need one try per sector
+KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mifare_keys.txt")
+KEY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mifare_key_cache.json")
 
-        # Initialize PN532 with I2C connection
-        pn532 = PN532_I2C(i2c, debug=False, reset=reset_pin, req=req_pin)
+# The family is the card type unless the UID starts with one of these hex
+# prefixes, e.g. {"04A2": "site_badges"} to keep badges apart from blank cards
+KEY_FAMILY_PREFIXES = {}
 
-        # Get firmware version
-        ic, ver, rev, support = pn532.firmware_version
-        logging.info(f'Found PN532 with firmware version: {ver}.{rev}')
+# Define blocks to read (e.g., blocks 4 to 7); sector trailers such as 7 are skipped
+BLOCK_NUMBERS = [4, 5, 6, 7]
 
-        # Configure PN532 to communicate with MiFare cards
-        pn532.SAM_configuration()
+# Log to the command line, one JSON line per record, from a background thread
+logs.setup()
 
-        return pn532
+def read_mifare_classic(session, info, keys):
+    """
+    Read BLOCK_NUMBERS from a MiFare Classic card, one authentication per sector.
+    A bus error here sends the session through recovery before the next read.
+    """
+    family = card_family(info.card_type, info.uid, KEY_FAMILY_PREFIXES)
+    try:
+        with session as pn532:
+            blocks = mifare_classic.read_blocks(pn532, info.uid, BLOCK_NUMBERS, keys=keys.for_card(family))
+        keys.save()
+        for block_number, block_data in blocks.items():
+            block_str = ' '.join([f'{byte:02X}' for byte in block_data])
+            logging.info(f'Block {block_number} Data: {block_str}')
+    except PN532Unavailable as e:
+        logging.warning(f'Skipping MiFare Classic blocks: {e}')
+    except mifare_classic.MifareError as e:
+        logging.info(f'Card uses keys not in {KEYS_FILE}: {e}')
+    except Exception as e:
+        logging.error(f'Error handling MiFare Classic card: {e}')
 
+def read_ndef(session, uid):
+    """
+    Read the NDEF message of an NTAG/Ultralight card: the capability container,
+    then only as many 4-page READs as the NDEF TLV needs.
+    """
+    try:
+        with session as pn532:
+            message = ntag.read_ndef(pn532)
+        if message is None:
+            logging.info('No NDEF message found.')
+            return
+        for record in message:
+            value = record.text or record.uri or bytes(record.payload).hex().upper()
+            logging.info(f'NDEF Record ({record.type.decode(errors="replace")}): {value}')
+    except PN532Unavailable as e:
+        logging.warning(f'Skipping NDEF message: {e}')
+    except ntag.NdefError as e:
+        logging.info(f'Card does not support NDEF: {e}')
     except Exception as e:
-        logging.error(f"Error initializing PN532: {e}")
-        return None
+        logging.error(f'Error reading NDEF message: {e}')
 
-def read_card(pn532):
+def read_card(session, keys):
     """
-    Continuously scan for NFC/RFID cards and display their UIDs.
-    If the card is MiFare Classic, attempt to read multiple memory blocks.
+    Continuously scan for NFC/RFID cards and display their UIDs and types.
+    MiFare Classic cards have their blocks read, NTAG/Ultralight cards their
+    NDEF message; the type comes from the card's ATQA/SAK, so nothing is
+    tried on a card that cannot answer it.
     """
     logging.info("Waiting for RFID/NFC card...")
 
+    # Scan each card once while it stays on the reader
+    repeats = RepeatFilter()
+    # Card types resolved so far, so GET_VERSION is only sent on a card's first tap
+    types = CardTypes()
+
     try:
         while True:
             # Check if a card is available to read
-            uid = pn532.read_passive_target(timeout=0.5)
+            info = session.read_card_info(timeout=0.5)
 
             # Try again if no card is available
-            if uid is None:
+            if info is None:
                 continue
+            uid = info.uid
+            if repeats.is_repeat(uid):
+                continue  # Same card still on the reader
 
-            # Format UID for display
-            uid_str = ' '.join([f'{byte:02X}' for byte in uid])
-            logging.info(f'Found card with UID: {uid_str}')
-
-            # Attempt to read MiFare Classic blocks
             try:
-                # Access the MiFare class
-                mifare = pn532.mifare
-
-                # Select the card
-                if not mifare.select(uid):
-                    logging.warning("Failed to select the card.")
-                    continue
-
-                # Default key for MiFare Classic
-                DEFAULT_KEY = b'\xFF\xFF\xFF\xFF\xFF\xFF'
-
-                # Define blocks to read (e.g., blocks 4 to 7)
-                BLOCK_NUMBERS = [4, 5, 6, 7]
-
-                for block_number in BLOCK_NUMBERS:
-                    # Authenticate block with key A
-                    if mifare.authenticate(block_number, DEFAULT_KEY, PN532_I2C.MIFARE_CMD_AUTH_A):
-                        logging.info(f'Authenticated block {block_number} successfully.')
-                        # Read block data
-                        block_data = mifare.read_block(block_number)
-                        if block_data:
-                            block_str = ' '.join([f'{byte:02X}' for byte in block_data])
-                            logging.info(f'Block {block_number} Data: {block_str}')
-                        else:
-                            logging.warning(f'Failed to read block {block_number}')
-                    else:
-                        logging.warning(f'Authentication failed for block {block_number}')
-            except AttributeError:
-                logging.info('Card is not a MiFare Classic card or does not support authentication.')
+                with session as pn532:
+                    info = types.resolve(pn532, info)
             except Exception as e:
-                logging.error(f'Error handling MiFare Classic card: {e}')
+                logging.warning(f'Could not identify card: {e}')
+                continue
 
-            # Attempt to read NDEF message if supported
-            try:
-                # Access the NDEF class
-                ndef = pn532.ndef
-
-                # Check if the card supports NDEF
-                if ndef:
-                    # Read the NDEF message
-                    message = ndef.message
-                    if message:
-                        logging.info(f'NDEF Message: {message}')
-                    else:
-                        logging.info('No NDEF message found.')
-                else:
-                    logging.info('Card does not support NDEF.')
-            except AttributeError:
-                logging.info('Card does not support NDEF.')
-            except Exception as e:
-                logging.error(f'Error reading NDEF message: {e}')
+            # Format UID for display
+            uid_str = ' '.join([f'{byte:02X}' for byte in uid])
+            logging.info(f'Found {info.card_type} card with UID: {uid_str} '
+                         f'(ATQA {info.atqa:04X}, SAK {info.sak:02X})')
 
-            time.sleep(1)  # Prevent multiple detections of the same card
+            if info.card_type in card_info.MIFARE_CLASSIC_TYPES:
+                read_mifare_classic(session, info, keys)
+            elif info.card_type in card_info.NTAG_TYPES:
+                read_ndef(session, uid)
+            else:
+                logging.info('No MiFare Classic or NDEF data to read on this card type.')
 
     except KeyboardInterrupt:
         logging.info("NFC scanning interrupted by user.")
@@ -121,12 +120,13 @@ def read_card(pn532):
         logging.error(f"An error occurred during card reading: {e}")
 
 def main():
-    pn532 = initialize_pn532()
-    if pn532 is None:
+    # PN532 over I2C with RSTPD_N on GPIO6 and IRQ (or P32/H_Request) on GPIO12
+    session = open_session(reset_pin=6, req_pin=12, irq_pin=PN532_IRQ_PIN)
+    if not session.connect():
         logging.error("Failed to initialize PN532. Exiting program.")
         sys.exit(1)
 
-    read_card(pn532)
+    read_card(session, KeyDictionary.from_file(KEYS_FILE, KEY_CACHE_FILE))
 
 if __name__ == "__main__":
     main()
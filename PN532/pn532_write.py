@@ -1,47 +1,28 @@
-import time
-import board
-import busio
-from digitalio import DigitalInOut
-from adafruit_pn532.i2c import PN532_I2C
 import logging
+import os
 import sys
 
-# Define the MIFARE authentication command for Key A
-MIFARE_CMD_AUTH_A = 0x60
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import logs
+from common.mifare_classic import sector_of
+from common.mifare_keys import KeyDictionary, card_family
+from common.pn532_session import PN532Unavailable, open_session
+from common.provisioning import Provisioner, load_manifest
 
-# Configure logging to output to the command line
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# MiFare Classic key dictionary and the per-sector key cache shared with pn532_scan.py
+KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mifare_keys.txt")
+KEY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mifare_key_cache.json")
 
-def initialize_pn532():
-    """
-    Initialize the PN532 NFC/RFID module over I2C.
-    Returns the PN532 object if successful, else None.
-    """
-    try:
-        # Define the reset and request pins
-        reset_pin = DigitalInOut(board.D6)
-        req_pin = DigitalInOut(board.D12)
-
-        # Initialize I2C bus
-        i2c = busio.I2C(board.SCL, board.SDA)
-
-        # Initialize PN532 with I2C connection
-        pn532 = PN532_I2C(i2c, debug=False, reset=reset_pin, req=req_pin)
+# Key cache families by hex UID prefix, as in pn532_scan.py; other cards use their card type
+KEY_FAMILY_PREFIXES = {}
 
-        # Get firmware version
-        ic, ver, rev, support = pn532.firmware_version
-        logging.info(f'Found PN532 with firmware version: {ver}.{rev}')
+# Credential store that provisioned cards are added to (the one access_control.py reads)
+CREDENTIALS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "credentials.bin")
 
-        # Configure PN532 to communicate with MiFare cards
-        pn532.SAM_configuration()
+# Log to the command line, one JSON line per record, from a background thread
+logs.setup()
 
-        return pn532
-
-    except Exception as e:
-        logging.error(f"Error initializing PN532: {e}")
-        return None
-
-def write_to_card(pn532, block_number, data, key=b'\xFF\xFF\xFF\xFF\xFF\xFF'):
+def write_to_card(session, block_number, data, keys):
     """
     Authenticate and write data to a specified block on a MiFare Classic card.
     """
@@ -50,34 +31,72 @@ def write_to_card(pn532, block_number, data, key=b'\xFF\xFF\xFF\xFF\xFF\xFF'):
     try:
         # Wait for a card
         logging.info("Waiting for RFID/NFC card to write...")
-        uid = pn532.read_passive_target(timeout=10)
+        info = session.read_card_info(timeout=10)
 
-        if uid is None:
+        if info is None:
             logging.error("No card detected. Please place a MiFare Classic 1K card near the reader.")
             return
+        uid = info.uid
 
         # Format UID for display
         uid_str = ' '.join([f'{byte:02X}' for byte in uid])
-        logging.info(f'Found card with UID: {uid_str}')
-
-        # Authenticate the block with Key A
-        if pn532.mifare_classic_authenticate_block(block_number, MIFARE_CMD_AUTH_A, key):
-            logging.info(f'Authenticated block {block_number} successfully.')
-            # Write data to the block
-            success = pn532.mifare_classic_write_block(block_number, data)
-            if success:
-                logging.info(f'Data written to block {block_number}: {data.hex()}')
+        logging.info(f'Found {info.card_type} card with UID: {uid_str}')
+
+        with session as pn532:
+            # Authenticate the block's sector with the first key that opens it
+            card_keys = keys.for_card(card_family(info.card_type, uid, KEY_FAMILY_PREFIXES))
+            if card_keys.authenticate(pn532, uid, sector_of(block_number)):
+                keys.save()
+                logging.info(f'Authenticated block {block_number} successfully.')
+                # Write data to the block
+                success = pn532.mifare_classic_write_block(block_number, data)
+                if success:
+                    logging.info(f'Data written to block {block_number}: {data.hex()}')
+                else:
+                    logging.error(f'Failed to write data to block {block_number}.')
             else:
-                logging.error(f'Failed to write data to block {block_number}.')
-        else:
-            logging.error(f'Authentication failed for block {block_number}.')
+                logging.error(f'Authentication failed for block {block_number}.')
 
+    except PN532Unavailable as e:
+        logging.error(f"PN532 is not responding: {e}")
     except Exception as e:
         logging.error(f"An error occurred during writing: {e}")
 
+def provision(manifest_path, credentials_path):
+    """
+    Write every card in the manifest as it is presented, verify it, and add
+    it to the credential store, with one PN532 session for the whole batch.
+    """
+    try:
+        manifest = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        logging.error(f"Invalid manifest: {e}")
+        sys.exit(1)
+
+    # PN532 over I2C with RSTPD_N on GPIO6 and P32/H_Request on GPIO12
+    session = open_session(reset_pin=6, req_pin=12)
+    if not session.connect():
+        logging.error("Failed to initialize PN532. Exiting program.")
+        sys.exit(1)
+
+    provisioner = Provisioner(session, manifest, credentials_path,
+                              keys=KeyDictionary.from_file(KEYS_FILE, KEY_CACHE_FILE),
+                              prefixes=KEY_FAMILY_PREFIXES)
+    try:
+        written = provisioner.run()
+    except KeyboardInterrupt:
+        written = len(provisioner.written)
+        logging.info("Provisioning interrupted by user.")
+    logging.info(f"Provisioned {written} of {len(manifest)} cards ({provisioner.failures} failed attempts).")
+
 def main():
+    if len(sys.argv) in (3, 4) and sys.argv[1] == '--manifest':
+        provision(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else CREDENTIALS_FILE)
+        return
+
     if len(sys.argv) != 3:
         print("Usage: python pn532_write.py <block_number> <data_hex>")
+        print("       python pn532_write.py --manifest <cards.csv|cards.json> [credentials.bin]")
         print("Example: python pn532_write.py 4 AABBCCDDEEFF00112233445566778899")
         sys.exit(1)
 
@@ -99,12 +118,13 @@ def main():
         logging.error("Invalid hex data provided.")
         sys.exit(1)
 
-    pn532 = initialize_pn532()
-    if pn532 is None:
+    # PN532 over I2C with RSTPD_N on GPIO6 and P32/H_Request on GPIO12
+    session = open_session(reset_pin=6, req_pin=12)
+    if not session.connect():
         logging.error("Failed to initialize PN532. Exiting program.")
         sys.exit(1)
 
-    write_to_card(pn532, block_number, data)
+    write_to_card(session, block_number, data, KeyDictionary.from_file(KEYS_FILE, KEY_CACHE_FILE))
 
 if __name__ == "__main__":
     main()
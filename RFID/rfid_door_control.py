@@ -1,51 +1,89 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
-import requests
-import time
 import logging
+import os
+import sys
+import time
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import event_journal, hardware, logs, metrics
+from common.access_policy import PolicyStore
+from common.door import DoorRegistry, UNLOCKED
+from common.event_journal import EventJournal
+from common.repeat_filter import RepeatFilter
+from common.revocation import RevocationList
+from common.server_client import EventUploader, RevocationSync, VerifyClient
 
-# Initialize the RFID reader
-reader = SimpleMFRC522()
+# Setup logging: one JSON line per record, written from a background thread
+logs.setup()
 
-# Relay pin setup
-relay_pin = 17
+# Initialize the RFID reader and GPIO (fakes with ACCESS_CONTROL_FAKE_HARDWARE=1)
+reader = hardware.mfrc522()
+GPIO = hardware.gpio()
+
+# Door relay: a pulse relay on GPIO22, held high while the door is unlocked.
+# (GPIO17 clashed with the HID Wiegand reader's DATA1; see access_daemon.py
+# for driving several doors from one process.)
+DOORS = {
+    "door": {"relay": "pulse", "pin": 22, "hold_time": 5, "cooldown": 0},
+}
 
 # Ensure GPIO is cleaned up before setting mode
 GPIO.cleanup()
 
 # Set the GPIO mode
 GPIO.setmode(GPIO.BCM)
-GPIO.setup(relay_pin, GPIO.OUT)
+
+# Server configuration
+SERVER_URL = "https://beca-76-234-147-61.ngrok-free.app"
+VERIFY_DEADLINE = 1.5  # Seconds to wait for the server before using the cached decision
+EVENT_BATCH_SIZE = 100  # Events per upload request
+REPEAT_WINDOW = 2.0  # Seconds a card held at the reader is ignored after its last read
+
+# Badge groups with weekly schedules, holidays and expiry (see common/access_policy.py).
+# When set, taps are decided locally from this file instead of asking the server.
+POLICY_FILE = None  # e.g. os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy.json")
+
+# Revoked cards, synced from the server in deltas and checked on the Pi, so a revoked
+# card is turned away at once, even while the server cannot be reached
+REVOCATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "revocations.bin")
+REVOCATION_SYNC_INTERVAL = 60  # Seconds between syncs
+
+# Access events are journaled on disk and uploaded in batches, so an outage loses nothing
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events")
+
+# Counters and per-stage latency histograms (see common/metrics.py), served in
+# Prometheus text at http://127.0.0.1:METRICS_PORT/metrics; None to turn off
+METRICS_PORT = 9109
+
+# Pooled server connections, shared by every tap. While the server is down, a card's last
+# known decision is used, however old, as long as the revocation list is current.
+revocations = RevocationList(REVOCATIONS_FILE)
+revocation_sync = RevocationSync(revocations, SERVER_URL, interval=REVOCATION_SYNC_INTERVAL)
+verifier = VerifyClient(SERVER_URL, deadline=VERIFY_DEADLINE, revocations=revocations)
+journal = EventJournal(JOURNAL_DIR)
+uploader = EventUploader(journal, SERVER_URL, batch_size=EVENT_BATCH_SIZE)
+repeats = RepeatFilter(REPEAT_WINDOW)
+metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT is not None else None
+policy = PolicyStore(POLICY_FILE) if POLICY_FILE else None
+if policy is not None:
+    policy.start_watching()  # Picks up a changed policy file without a restart
+
+# The 40-bit card ID as the policy lists it: 5 big-endian bytes in hex
+def card_uid(card_id):
+    return card_id.to_bytes(5, 'big')
 
 # Network Communication
 def verify_card(card_id):
-    server_url = "https://beca-76-234-147-61.ngrok-free.app/verify"
-    data = {"card_id": str(card_id)}
-    try:
-        response = requests.post(server_url, json=data, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        logging.error(f"Error communicating with server: {e}")
-        return None
-
-# Send door status to server
+    return verifier.verify(card_id)
+
+# Record door status for the uploader without blocking the door
 def send_door_status(status):
-    status_url = "https://beca-76-234-147-61.ngrok-free.app/door-status"
-    data = {"status": status}
-    try:
-        response = requests.post(status_url, json=data, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        logging.error(f"Error sending door status: {e}")
+    event_type = event_journal.DOOR_OPENED if status == "opened" else event_journal.DOOR_LOCKED
+    journal.append(event_type, status=status)
 
-# Relay Control
-def control_door(open_door):
-    GPIO.output(relay_pin, GPIO.HIGH if open_door else GPIO.LOW)
-    logging.info(f"Door {'opened' if open_door else 'locked'}")
+# Relay Control: the door relocks on a timer, so the next card can be read while it is open
+doors = DoorRegistry(GPIO, DOORS,
+                     on_change=lambda name, state: send_door_status("opened" if state == UNLOCKED else "locked"))
+doors.setup()
 
 # Main workflow
 def main():
@@ -53,23 +91,42 @@ def main():
         while True:
             logging.info("Place your card to read")
             card_id, text = reader.read()
-            logging.info(f"Card read: ID={card_id}, Text={text}")
+            if repeats.is_repeat(card_id):
+                continue  # Same card still on the reader
+            logs.log_event("card_read", card_id=card_id, text=text)
+            journal.append(event_journal.CARD_READ, card_id=str(card_id))
+            metrics.READS.inc()
             
-            result = verify_card(card_id)
-            if result and result.get("authorized"):
-                control_door(True)
-                send_door_status("opened")
-                time.sleep(5)  # Keep the door open for 5 seconds
-                control_door(False)
+            if policy is not None:
+                start = time.perf_counter_ns()
+                granted = card_uid(card_id) in policy and card_id not in revocations
+                metrics.CREDENTIAL_CHECK.record(time.perf_counter_ns() - start)
+            else:
+                result = verify_card(card_id)
+                granted = bool(result and result.get("authorized"))
+            if granted:
+                metrics.GRANTS.inc()
+                logs.log_event("access_granted", card_id=card_id)
+                journal.append(event_journal.GRANT, card_id=str(card_id))
+                doors["door"].grant()
             else:
-                logging.info("Access denied")
-                
-            time.sleep(1)  # Polling interval
+                metrics.DENIES.inc()
+                logs.log_event("access_denied", card_id=card_id)
+                journal.append(event_journal.DENY, card_id=str(card_id))
     except KeyboardInterrupt:
         logging.info("Program terminated by user")
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
     finally:
+        doors.close()
+        if policy is not None:
+            policy.stop_watching()
+        verifier.close()
+        revocation_sync.close()
+        uploader.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        journal.close()
         GPIO.cleanup()
 
 if __name__ == "__main__":
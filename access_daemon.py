@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Runs every reader and door on this Pi from one asyncio process, instead of one
+blocking script per reader.
+
+Usage: python3 access_daemon.py access_daemon.example.json
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from common import access_policy, card_info, event_journal, hardware, logs, metrics
+from common.access_policy import PolicyStore
+from common.credential_store import CredentialStore
+from common.door import DoorRegistry, UNLOCKED
+from common.event_journal import EventJournal
+from common.pn532_irq import GPIOIrqLine
+from common.pn532_session import PN532Session
+from common.reader_daemon import AccessDaemon, MFRC522Source, PN532Source, WiegandSocketSource, WiegandSource
+from common.repeat_filter import RepeatFilter
+from common.server_client import EventUploader
+
+
+# BCM pins the readers' buses use, which no door relay may share
+I2C_PINS = (2, 3)                  # PN532 SDA, SCL
+MFRC522_PINS = (8, 9, 10, 11, 25)  # SPI CE0, MISO, MOSI, SCLK and RST
+
+
+def reader_pins(config):
+    """
+    The pins a reader uses, from its config.
+    """
+    reader_type = config['type']
+    if reader_type == 'pn532':
+        pins = I2C_PINS + (config.get('reset_pin', 6), config.get('req_pin', 12))
+        return pins + ((config['irq_pin'],) if config.get('irq_pin') is not None else ())
+    if reader_type == 'mfrc522':
+        return MFRC522_PINS
+    if reader_type == 'wiegand':
+        return config['data0'], config['data1']
+    if reader_type == 'wiegand_socket':
+        # The capture daemon owns the data lines; list them so no relay is put on them
+        return tuple(config[pin] for pin in ('data0', 'data1') if pin in config)
+    return ()
+
+
+def build_pn532(config, gpio):
+    # With irq_pin, cards are detected on the PN532's IRQ edge instead of by polling
+    irq_pin = config.get('irq_pin')
+    session = PN532Session(
+        lambda: hardware.pn532_i2c(reset_pin=config.get('reset_pin', 6), req_pin=config.get('req_pin', 12),
+                                   irq_pin=irq_pin),
+        irq_line=GPIOIrqLine(gpio, irq_pin) if irq_pin is not None else None)
+    # A PN532 that is not answering yet is retried by the session, not fatal
+    if not session.connect():
+        logging.error(f"PN532 for {config['name']} is not responding; will keep retrying")
+    # Two cards tapped together are both read (max_targets 1 for one at a time)
+    return PN532Source(config['name'], session, max_targets=config.get('max_targets', card_info.MAX_TARGETS))
+
+
+def build_mfrc522(config):
+    return MFRC522Source(config['name'], hardware.mfrc522())
+
+
+def build_wiegand(config, pi):
+    for pin in (config['data0'], config['data1']):
+        pi.set_mode(pin, hardware.INPUT)
+        pi.set_pull_up_down(pin, hardware.PUD_UP)
+    return WiegandSource(config['name'], pi, config['data0'], config['data1'],
+                         min_bits=config.get('min_bits', 26))
+
+
+def build_wiegand_socket(config):
+    return WiegandSocketSource(config['name'], config.get('socket', '/run/indala_wiegand.sock'),
+                               min_bits=config.get('min_bits', 26))
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python3 access_daemon.py <config.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(sys.argv[1]))
+
+    # One JSON line per record to the console and, with log_file, a rotating log;
+    # written from a background thread so no reader or door waits on the disk
+    log_file = config.get('log_file')
+    logs.setup(os.path.join(base_dir, log_file) if log_file else None,
+               level=getattr(logging, config.get('log_level', 'INFO')))
+
+    # Real hardware libraries, or fakes with ACCESS_CONTROL_FAKE_HARDWARE=1
+    GPIO = hardware.gpio()
+    GPIO.setmode(GPIO.BCM)
+
+    # Counters and per-stage latency histograms in Prometheus text at /metrics
+    metrics_server = None
+    if config.get('metrics_port') is not None:
+        metrics_server = metrics.serve(config['metrics_port'], config.get('metrics_host', '127.0.0.1'))
+
+    journal = EventJournal(os.path.join(base_dir, config.get('journal', 'events')))
+    server_url = config.get('server_url')
+    uploader = EventUploader(journal, server_url) if server_url else None
+
+    # Each door gets its own scheduler thread, so one door's relay never delays another's
+    reserved = {pin: f"reader {reader_config['name']}"
+                for reader_config in config['readers'] for pin in reader_pins(reader_config)}
+    try:
+        doors_by_name = DoorRegistry(
+            GPIO, config['doors'], shards=config.get('relay_threads'), reserved=reserved,
+            on_change=lambda name, state: journal.append(
+                event_journal.DOOR_OPENED if state == UNLOCKED else event_journal.DOOR_LOCKED, door=name))
+    except ValueError as e:
+        logging.error(f"Invalid door configuration: {e}")
+        sys.exit(1)
+    doors_by_name.setup()
+
+    pi = None
+    sources = []
+    doors = {}
+    door_names = {}
+    for reader_config in config['readers']:
+        reader_type = reader_config['type']
+        if reader_type == 'pn532':
+            source = build_pn532(reader_config, GPIO)
+        elif reader_type == 'mfrc522':
+            source = build_mfrc522(reader_config)
+        elif reader_type == 'wiegand':
+            if pi is None:
+                pi = hardware.pigpio_pi()
+                if not pi.connected:
+                    logging.error("Failed to connect to pigpio daemon. Ensure that pigpiod is running.")
+                    sys.exit(1)
+            source = build_wiegand(reader_config, pi)
+        elif reader_type == 'wiegand_socket':
+            source = build_wiegand_socket(reader_config)
+        else:
+            logging.error(f"Unknown reader type {reader_type} for {reader_config['name']}")
+            sys.exit(1)
+        if reader_config['door'] not in doors_by_name:
+            logging.error(f"Unknown door {reader_config['door']} for {reader_config['name']}")
+            sys.exit(1)
+        sources.append(source)
+        doors[source.name] = doors_by_name[reader_config['door']]
+        door_names[source.name] = reader_config['door']
+
+    # With a policy (badge groups, schedules, holidays, expiry, per door), it decides
+    # every tap locally; otherwise any credential in the store opens any door
+    policy = None
+    if config.get('policy'):
+        policy = credentials = PolicyStore(os.path.join(base_dir, config['policy']))
+    else:
+        credentials = CredentialStore(os.path.join(base_dir, config.get('credentials', 'credentials.bin')))
+    credentials.start_watching()
+
+    def authorize(tap):
+        journal.append(event_journal.CARD_READ, reader=tap.reader, credential=tap.credential.hex())
+        start = time.perf_counter_ns()
+        if policy is None:
+            granted = tap.credential in credentials
+            metrics.CREDENTIAL_CHECK.record(time.perf_counter_ns() - start)
+            return granted
+        reason = policy.decide(tap.credential, door=door_names[tap.reader])
+        metrics.CREDENTIAL_CHECK.record(time.perf_counter_ns() - start)
+        if reason != access_policy.GRANTED:
+            logging.info(f"{tap.credential.hex()} at {door_names[tap.reader]}: {reason}")
+        return reason == access_policy.GRANTED
+
+    def on_decision(tap, granted):
+        journal.append(event_journal.GRANT if granted else event_journal.DENY,
+                       reader=tap.reader, credential=tap.credential.hex())
+
+    repeats = RepeatFilter(config.get('repeat_window', 2.0))
+    daemon = AccessDaemon(sources, doors, authorize, on_decision, repeat_filter=repeats)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        logging.info("Access daemon interrupted by user. Exiting...")
+    finally:
+        credentials.stop_watching()
+        doors_by_name.close()  # Lets the final UNSET pulses finish
+        if uploader is not None:
+            uploader.close()
+        journal.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if pi is not None:
+            pi.stop()
+        GPIO.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Load harness for the access-control pipeline on fake hardware: PN532,
+MFRC522 and Wiegand readers feed the asyncio AccessDaemon, which checks a
+credential store, journals every event and drives the doors' relays.
+
+Taps are either replayed from Indala/wiegand_reader.log (one Wiegand reader,
+log gaps capped at --max-gap and sped up by --speed) or generated as Poisson
+arrivals spread over every reader. Reports taps/s, tap-to-unlock latency and
+CPU per tap.
+
+Tap-to-unlock runs from the moment a card enters the field (for Wiegand, the
+first bit) to the moment the daemon has granted the door; the relay pulse
+then starts on the scheduler thread (see bench_door_scheduler.py). CPU per tap
+is the process CPU time over and above the idle polling of the fake readers.
+
+Usage: python3 bench/bench_access_pipeline.py replay [--speed 10]
+       python3 bench/bench_access_pipeline.py poisson [--rate 10] [--duration 10]
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from common import event_journal
+from common.credential_store import CredentialStore, write_store
+from common.door import Door, RelayScheduler
+from common.event_journal import EventJournal
+from common.fakes import FakeGPIO, FakeMFRC522, FakePi, FakePN532
+from common.reader_daemon import AccessDaemon, MFRC522Source, PN532Source, WiegandSource
+from common.repeat_filter import RepeatFilter
+from common.wiegand_formats import H10301
+
+LOG_PATH = os.path.join(ROOT, 'Indala', 'wiegand_reader.log')
+READ_RE = re.compile(r'^(\S+ \S+) \[INFO\] Binary Data\s*: ([01]+)')
+
+# Production settings from the reader scripts
+REPEAT_WINDOW = 2.0
+HOLD_TIME = 5
+PULSE_TIME = 0.1
+DWELL = 0.25  # Seconds a card stays in the field; MFRC522Source polls every 0.1 s
+REPRESENT_GAP = 0.05  # Least time between one card leaving a reader and the next arriving
+IDLE_SAMPLE = 1.0
+
+DATA0_PIN = 23
+DATA1_PIN = 18
+
+
+class Reader:
+    """
+    One fake reader and its daemon source. present() puts a credential in
+    front of it and returns the time the reader first sees it.
+    """
+
+    def __init__(self, kind, index, pi=None):
+        self.kind = kind
+        self.name = f"{kind}-{index}"
+        self.current = None
+        if kind == 'pn532':
+            self.device = FakePN532()
+            self.source = PN532Source(self.name, self.device)
+        elif kind == 'mfrc522':
+            self.device = FakeMFRC522()
+            self.source = MFRC522Source(self.name, self.device)
+        else:
+            self.pi = pi
+            self.data0 = DATA0_PIN + 2 * index
+            self.data1 = DATA1_PIN + 2 * index
+            self.source = WiegandSource(self.name, pi, self.data0, self.data1)
+
+    def random_card(self, rng):
+        """
+        Return (card, credential): what present() takes, and the bytes the
+        daemon will see.
+        """
+        if self.kind == 'pn532':
+            uid = bytes(rng.getrandbits(8) for _ in range(7))
+            return uid, uid
+        if self.kind == 'mfrc522':
+            card_id = rng.getrandbits(40)
+            return card_id, card_id.to_bytes(5, 'big')
+        value = H10301.encode(rng.getrandbits(8), rng.getrandbits(16))
+        return (value, 26), wiegand_credential(value, 26)
+
+    def present(self, card):
+        self.current = card
+        if self.kind == 'wiegand':
+            value, bit_count = card
+            return self.pi.send_frame(self.data0, self.data1, value, bit_count)
+        self.device.present(card)
+        return time.monotonic()
+
+    def remove(self, card):
+        # Only if a later tap has not replaced the card
+        if self.kind != 'wiegand' and self.current == card:
+            self.device.remove()
+            self.current = None
+
+
+def wiegand_credential(value, bit_count):
+    # Same bytes WiegandSource puts on a Tap
+    return bytes((bit_count,)) + value.to_bytes((bit_count + 7) // 8, 'big')
+
+
+def replay_taps(path, speed, max_gap):
+    """
+    Return (delay from start, card, credential) for every read in the log,
+    with gaps capped at max_gap seconds and divided by speed.
+    """
+    taps = []
+    previous = None
+    offset = 0.0
+    with open(path) as f:
+        for line in f:
+            match = READ_RE.match(line)
+            if not match:
+                continue
+            at = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f').timestamp()
+            if previous is not None:
+                offset += min(at - previous, max_gap) / speed
+            previous = at
+            bits = match.group(2)
+            value = int(bits, 2)
+            taps.append((offset, (value, len(bits)), wiegand_credential(value, len(bits))))
+    return taps
+
+
+def poisson_taps(readers, rate, duration, rng):
+    """
+    Poisson arrivals at rate taps/s, each at a random reader. A reader holds
+    one card at a time, so an arrival at a busy reader waits until it is free.
+    """
+    taps = []
+    free_at = {reader.name: 0.0 for reader in readers}
+    at = rng.expovariate(rate)
+    while at < duration:
+        reader = rng.choice(readers)
+        card, credential = reader.random_card(rng)
+        start = max(at, free_at[reader.name])
+        free_at[reader.name] = start + DWELL + REPRESENT_GAP
+        taps.append((start, reader, card, credential))
+        at += rng.expovariate(rate)
+    taps.sort(key=lambda tap: tap[0])
+    return taps
+
+
+def play(schedule, presented):
+    """
+    Present each (delay, reader, card, credential) at its time and take the
+    card away DWELL later, recording when each reader saw each credential.
+    Runs on its own thread.
+    """
+    start = time.monotonic()
+    events = [(delay, 1, i, reader, card, credential) for i, (delay, reader, card, credential)
+              in enumerate(schedule)]
+    heapq.heapify(events)
+    while events:
+        delay, present, i, reader, card, credential = heapq.heappop(events)
+        pause = start + delay - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        if not present:
+            reader.remove(card)
+            continue
+        # Recorded before the card is presented, so a fast decision cannot miss it
+        presented[(reader.name, credential)] = time.monotonic()
+        presented[(reader.name, credential)] = reader.present(card)
+        heapq.heappush(events, (delay + DWELL, 0, i, reader, card, credential))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(readers, schedule, authorized, repeat_window, workdir):
+    gpio = FakeGPIO()
+    scheduler = RelayScheduler()
+    doors = {}
+    for i, reader in enumerate(readers):
+        door = Door(gpio, 100 + 2 * i, 101 + 2 * i, hold_time=HOLD_TIME, pulse_time=PULSE_TIME,
+                    scheduler=scheduler)
+        door.setup()
+        doors[reader.name] = door
+
+    store_path = os.path.join(workdir, 'credentials.bin')
+    write_store(store_path, authorized)
+    credentials = CredentialStore(store_path)
+    journal = EventJournal(os.path.join(workdir, 'events'))
+    repeats = RepeatFilter(repeat_window)
+
+    presented = {}
+    latencies = {reader.kind: [] for reader in readers}
+    decisions = {'granted': 0, 'denied': 0}
+    kinds = {reader.name: reader.kind for reader in readers}
+
+    def authorize(tap):
+        journal.append(event_journal.CARD_READ, reader=tap.reader, credential=tap.credential.hex())
+        return tap.credential in credentials
+
+    def on_decision(tap, granted):
+        done = time.monotonic()
+        journal.append(event_journal.GRANT if granted else event_journal.DENY,
+                       reader=tap.reader, credential=tap.credential.hex())
+        decisions['granted' if granted else 'denied'] += 1
+        tapped_at = presented.get((tap.reader, tap.credential))
+        if tapped_at is not None:
+            latencies[kinds[tap.reader]].append(done - tapped_at)
+
+    daemon = AccessDaemon([reader.source for reader in readers], doors, authorize, on_decision,
+                          repeat_filter=repeats)
+    daemon_task = asyncio.create_task(daemon.run())
+    loop = asyncio.get_running_loop()
+
+    # CPU the idle readers burn on their own, so it can be taken out of the per-tap figure
+    await asyncio.sleep(0.2)
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    await asyncio.sleep(IDLE_SAMPLE)
+    idle_cpu_rate = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    await loop.run_in_executor(None, play, schedule, presented)
+    await asyncio.sleep(0.1)  # Let the last Wiegand frame close
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    daemon_task.cancel()
+    try:
+        await daemon_task
+    except asyncio.CancelledError:
+        pass
+    for door in doors.values():
+        door.lock()
+    scheduler.stop()
+    journal.close()
+
+    return {
+        'latencies': latencies,
+        'decisions': decisions,
+        'suppressed': repeats.suppressed,
+        'wall': wall,
+        'cpu': cpu,
+        'idle_cpu': idle_cpu_rate * wall,
+        'unlock_pulses': sum(len(gpio.pulses(door.set_pin)) for door in doors.values()),
+    }
+
+
+def report(label, offered, result):
+    decided = sum(result['decisions'].values())
+    every = sorted(v for values in result['latencies'].values() for v in values)
+    rows = [
+        ("Workload", label),
+        ("Taps offered", f"{offered}"),
+        ("Decisions", f"{decided} ({result['decisions']['granted']} granted, "
+                      f"{result['decisions']['denied']} denied, {result['suppressed']} repeats suppressed)"),
+        ("Unlock pulses", f"{result['unlock_pulses']}"),
+        ("Throughput", f"{offered / result['wall']:.1f} taps/s offered, {decided / result['wall']:.1f} decisions/s"),
+    ]
+    if every:
+        rows.append(("Tap-to-unlock", f"p50 {statistics.median(every) * 1e3:.2f} ms, "
+                                      f"p99 {percentile(every, 0.99) * 1e3:.2f} ms, max {every[-1] * 1e3:.2f} ms"))
+        for kind, values in sorted(result['latencies'].items()):
+            if values:
+                values.sort()
+                rows.append((f"  {kind}", f"p50 {statistics.median(values) * 1e3:.2f} ms, "
+                                          f"p99 {percentile(values, 0.99) * 1e3:.2f} ms ({len(values)} taps)"))
+    if offered:
+        rows.append(("CPU per tap", f"{(result['cpu'] - result['idle_cpu']) / offered * 1e3:.2f} ms "
+                                    f"(idle readers: {result['idle_cpu'] / result['wall'] * 100:.1f}% of a core)"))
+    for name, value in rows:
+        print(f"{name:<16}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest='workload', required=True)
+    replay = sub.add_parser('replay', help="replay the reads in a Wiegand reader log")
+    replay.add_argument('--log', default=LOG_PATH)
+    replay.add_argument('--speed', type=float, default=10)
+    replay.add_argument('--max-gap', type=float, default=2.0, help="cap on idle time between reads, in log seconds")
+    poisson = sub.add_parser('poisson', help="Poisson arrivals over every reader")
+    poisson.add_argument('--rate', type=float, default=10, help="taps/s over all readers")
+    poisson.add_argument('--duration', type=float, default=10)
+    poisson.add_argument('--pn532', type=int, default=2)
+    poisson.add_argument('--mfrc522', type=int, default=2)
+    poisson.add_argument('--wiegand', type=int, default=2)
+    poisson.add_argument('--denied', type=float, default=0.1, help="fraction of unknown cards")
+    args = parser.parse_args()
+
+    # Denials and parity errors are part of the workload, not news
+    logging.disable(logging.WARNING)
+    rng = random.Random(10)
+    pi = FakePi()
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.workload == 'replay':
+            reader = Reader('wiegand', 0, pi)
+            taps = replay_taps(args.log, args.speed, args.max_gap)
+            schedule = [(delay, reader, card, credential) for delay, card, credential in taps]
+            # The valid card in the log is enrolled; frames failing parity never reach the daemon
+            authorized = [wiegand_credential(H10301.encode(58, 30526), 26)]
+            label = f"replay of {os.path.basename(args.log)} at {args.speed:g}x"
+            result = asyncio.run(run([reader], schedule, authorized, REPEAT_WINDOW / args.speed, workdir))
+        else:
+            readers = [Reader(kind, i, pi) for kind, count in
+                       (('pn532', args.pn532), ('mfrc522', args.mfrc522), ('wiegand', args.wiegand))
+                       for i in range(count)]
+            schedule = poisson_taps(readers, args.rate, args.duration, rng)
+            authorized = [credential for _, _, _, credential in schedule if rng.random() >= args.denied]
+            label = f"Poisson {args.rate:g} taps/s over {len(readers)} readers for {args.duration:g} s"
+            result = asyncio.run(run(readers, schedule, authorized, REPEAT_WINDOW, workdir))
+    pi.stop()
+    report(label, len(schedule), result)
+
+
+if __name__ == "__main__":
+    main()
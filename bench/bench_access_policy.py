@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Access policy decisions at 100k badges x 500 groups: the compiled
+minute-of-week bitmaps (common.access_policy) against evaluating each
+group's windows at tap time, and the time to recompile and swap in the
+policy after a change, with decisions still being made during the reload.
+
+Usage: python3 bench/bench_access_policy.py [--badges 100000] [--groups 500] [--decisions 200000]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import access_policy
+from common.access_policy import (DAYS, EXPIRED, GRANTED, MINUTES_PER_DAY, MINUTES_PER_WEEK, OUTSIDE_SCHEDULE,
+                                  UNKNOWN, WRONG_DOOR, PolicyStore, compile_policy)
+
+DOORS = ["front", "back", "gate", "dock", "lab", "server-room"]
+START = datetime.datetime(2026, 10, 19).timestamp()  # A Monday, local time
+
+
+def hhmm(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def policy_config(rng, badges, groups):
+    config = {'holidays': ["2026-10-21", "2026-12-25", "2027-01-01"], 'groups': {}, 'badges': {}}
+    for g in range(groups):
+        windows = []
+        for _ in range(rng.randint(1, 4)):
+            first = rng.randrange(7)
+            days = rng.choice([DAYS[first], f"{DAYS[first]}-{DAYS[(first + rng.randint(1, 6)) % 7]}", "all"])
+            start = rng.randrange(0, MINUTES_PER_DAY, 15)
+            end = (start + rng.randrange(15, MINUTES_PER_DAY, 15)) % MINUTES_PER_DAY
+            windows.append({'days': days, 'start': hhmm(start), 'end': hhmm(end)})
+        group = {'windows': windows}
+        if rng.random() < 0.2:
+            group['holiday_windows'] = [{'start': "08:00", 'end': "12:00"}]
+        if rng.random() < 0.5:
+            group['doors'] = rng.sample(DOORS, rng.randint(1, 3))
+        config['groups'][f"group-{g}"] = group
+    names = list(config['groups'])
+    for _ in range(badges):
+        badge = {'groups': rng.sample(names, rng.randint(1, 3))}
+        if rng.random() < 0.1:
+            badge['expires'] = f"2026-10-{rng.randint(15, 31)}"
+        config['badges'][rng.randbytes(7).hex().upper()] = badge
+    return config
+
+
+class Interpreted:
+    """
+    The same rules, evaluated at tap time: every window of every group of
+    the badge is checked against the current minute.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.badges = {bytes.fromhex(uid): badge for uid, badge in config['badges'].items()}
+        self.holidays = {datetime.date.fromisoformat(day) for day in config['holidays']}
+
+    def decide(self, uid, door, now):
+        badge = self.badges.get(uid)
+        if badge is None:
+            return UNKNOWN
+        if badge.get('expires') and now >= access_policy._expiry(badge['expires']):
+            return EXPIRED
+        local = datetime.datetime.fromtimestamp(now)
+        minute = local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+        holiday = local.date() in self.holidays
+        reason = WRONG_DOOR
+        for name in badge['groups']:
+            group = self.config['groups'][name]
+            if door is not None and 'doors' in group and door not in group['doors']:
+                continue
+            reason = OUTSIDE_SCHEDULE
+            for window in group.get('holiday_windows' if holiday else 'windows', ()):
+                start, length = access_policy._window(window)
+                if holiday:
+                    if (minute % MINUTES_PER_DAY - start) % MINUTES_PER_DAY < length:
+                        return GRANTED
+                    continue
+                for day in access_policy._days(window.get('days', 'all')):
+                    if (minute - day * MINUTES_PER_DAY - start) % MINUTES_PER_WEEK < length:
+                        return GRANTED
+        return reason
+
+
+def taps(rng, config, count):
+    uids = [bytes.fromhex(uid) for uid in config['badges']]
+    result = []
+    for _ in range(count):
+        uid = rng.choice(uids) if rng.random() < 0.9 else rng.randbytes(7)
+        result.append((uid, rng.choice(DOORS), START + rng.randrange(14 * 86400)))
+    return result
+
+
+def latencies(decide, tap_list, fixed_now=None):
+    times = []
+    for uid, door, now in tap_list:
+        start = time.perf_counter()
+        decide(uid, door, fixed_now or now)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+def row(label, times):
+    print(f"{label:<38}{statistics.median(times) * 1e6:>9.2f}{times[int(len(times) * 0.99)] * 1e6:>9.2f}"
+          f"{times[-1] * 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--badges', type=int, default=100_000)
+    parser.add_argument('--groups', type=int, default=500)
+    parser.add_argument('--decisions', type=int, default=200_000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(22)
+    config = policy_config(rng, args.badges, args.groups)
+    text = json.dumps(config)
+    start = time.perf_counter()
+    parsed = json.loads(text)
+    parse_time = time.perf_counter() - start
+    policy = compile_policy(parsed)
+    compile_time = time.perf_counter() - start - parse_time
+    tracemalloc.start()
+    again = compile_policy(parsed)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del again
+    print(f"{args.badges} badges, {args.groups} groups, {len(text) / 1e6:.1f} MB of JSON: parsed in "
+          f"{parse_time * 1000:.0f} ms, compiled in {compile_time * 1000:.0f} ms to {size / 1e6:.1f} MB")
+
+    tap_list = taps(rng, config, args.decisions)
+    interpreted = Interpreted(config)
+    sample = tap_list[:20_000]
+    outcomes = [policy.decide(uid, door, now) for uid, door, now in sample]
+    assert outcomes == [interpreted.decide(uid, door, now) for uid, door, now in sample], \
+        "compiled policy disagrees with the rules"
+    granted = sum(outcome == GRANTED for outcome in outcomes)
+    print(f"Compiled and interpreted agree on {len(sample)} decisions ({granted} granted)")
+
+    print(f"{'decision latency, us':<38}{'p50':>9}{'p99':>9}{'max':>10}")
+    compiled_times = latencies(policy.decide, tap_list, fixed_now=START + 9 * 3600)
+    row("compiled, taps in the same minute", compiled_times)
+    row("compiled, every tap a new minute", latencies(policy.decide, tap_list))
+    row("interpreted at tap time", latencies(interpreted.decide, sample))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'policy.json')
+        with open(path, 'w') as f:
+            f.write(text)
+        store = PolicyStore(path, door="front")
+        assert len(store) == args.badges
+
+        # Change one group's hours and reload while decisions keep being made
+        config['groups']['group-0']['windows'] = [{'days': "all", 'start': "00:00", 'end': "24:00"}]
+        with open(path + '.tmp', 'w') as f:
+            json.dump(config, f)
+        os.replace(path + '.tmp', path)
+        during = []
+        stop = threading.Event()
+
+        def decide_during_reload():
+            while not stop.is_set():
+                for uid, door, now in tap_list[:1000]:
+                    started = time.perf_counter()
+                    store.decide(uid, door, now)
+                    during.append(time.perf_counter() - started)
+
+        thread = threading.Thread(target=decide_during_reload)
+        thread.start()
+        start = time.perf_counter()
+        assert store.reload()
+        reload_time = time.perf_counter() - start
+        stop.set()
+        thread.join()
+        during.sort()
+        print(f"Reload after changing one group, deciding meanwhile: {reload_time * 1000:.0f} ms "
+              f"(read, parse, compile, swap)")
+        row("compiled, during the reload", during)
+        # group-0 is now open around the clock
+        member = next((bytes.fromhex(uid) for uid, badge in config['badges'].items()
+                       if badge['groups'] == ['group-0'] and 'expires' not in badge), None)
+        if member is not None:
+            assert store.policy.decide(member, None, START + 4 * 86400 + 3 * 3600) == GRANTED
+
+    # The compiled decision stays flat however many groups and windows there are
+    assert statistics.median(compiled_times) < 10e-6
+
+
+if __name__ == "__main__":
+    main()
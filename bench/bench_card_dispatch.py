@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+PN532 commands per tap for pn532_scan.py on a mixed simulated card set:
+trying MiFare Classic authentication on every card (as the scan did), against
+dispatching on the type from ATQA/SAK with the per-UID type cache.
+
+Usage: python3 bench/bench_card_dispatch.py [--cards 60] [--taps 600]
+"""
+import argparse
+import os
+import random
+import sys
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import card_info, mifare_classic
+from common.card_info import CardTypes
+from common.fakes import FakeCard, FakeMifareClassic, FakeNTAG21x, SimulatedPN532
+from common.mifare_keys import KeyDictionary, load_keys
+
+KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PN532', 'mifare_keys.txt')
+BLOCK_NUMBERS = [4, 5, 6, 7]  # As pn532_scan.py reads them
+
+
+def card_set(rng, count):
+    cards = []
+    for n in range(count):
+        uid7 = bytes((0x04,)) + rng.randbytes(6)
+        kind = rng.choices(('classic', 'ntag213', 'ntag215', 'ultralight', 'desfire'), (40, 20, 10, 10, 20))[0]
+        if kind == 'classic':
+            cards.append((kind, FakeMifareClassic(rng.randbytes(4))))
+        elif kind.startswith('ntag'):
+            cards.append((kind, FakeNTAG21x(uid7, kind.upper())))
+        elif kind == 'ultralight':
+            cards.append((kind, FakeCard(uid7, atqa=0x0044, sak=0x00)))
+        else:
+            cards.append((kind, FakeCard(uid7)))
+    return cards
+
+
+def blind(pn532, keys, types):
+    # Every card: detect, then MiFare Classic blocks, then NDEF (no bus traffic)
+    uid = pn532.read_passive_target(timeout=1)
+    try:
+        mifare_classic.read_blocks(pn532, uid, BLOCK_NUMBERS, keys=keys.for_card())
+    except mifare_classic.MifareError:
+        pass
+
+
+def dispatched(pn532, keys, types):
+    info = types.resolve(pn532, card_info.read_card_info(pn532, timeout=1))
+    if info.card_type in card_info.MIFARE_CLASSIC_TYPES:
+        mifare_classic.read_blocks(pn532, info.uid, BLOCK_NUMBERS, keys=keys.for_card())
+    return info.card_type
+
+
+def run(scan, cards, taps, rng):
+    pn532 = SimulatedPN532(exchange_time=0, detect_time=0)
+    pn532.STATUS_POLL = 0
+    pn532.SAM_configuration()
+    keys = KeyDictionary(load_keys(KEYS_FILE))
+    types = CardTypes()
+    commands = defaultdict(list)
+    identified = Counter()
+    for _ in range(taps):
+        kind, card = rng.choice(cards)
+        pn532.present(card)
+        start = pn532.commands
+        card_type = scan(pn532, keys, types)
+        commands[kind].append(pn532.commands - start)
+        if card_type is not None:
+            identified[(kind, card_type)] += 1
+        pn532.remove()
+    return commands, identified, types
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=60)
+    parser.add_argument('--taps', type=int, default=600)
+    args = parser.parse_args()
+    cards = card_set(random.Random(4), args.cards)
+
+    results = {label: run(scan, cards, args.taps, random.Random(8))
+               for label, scan in (("blind", blind), ("dispatched", dispatched))}
+    kinds = sorted({kind for kind, _ in cards})
+    print(f"{args.taps} taps on {args.cards} cards; PN532 commands per tap")
+    print(f"{'':<12}" + ''.join(f"{kind:>12}" for kind in kinds) + f"{'all':>10}")
+    for label, (commands, _, _) in results.items():
+        every = [n for kind in kinds for n in commands[kind]]
+        print(f"{label:<12}" + ''.join(f"{sum(commands[kind]) / len(commands[kind]):>12.1f}" for kind in kinds)
+              + f"{sum(every) / len(every):>10.1f}")
+
+    commands, identified, types = results["dispatched"]
+    expected = {'classic': card_info.MIFARE_CLASSIC_1K, 'ntag213': card_info.NTAG213,
+                'ntag215': card_info.NTAG215, 'ultralight': card_info.MIFARE_ULTRALIGHT,
+                'desfire': card_info.MIFARE_DESFIRE}
+    for (kind, card_type), count in identified.items():
+        assert expected[kind] == card_type, (kind, card_type)
+    print(f"Types identified correctly; type cache {types.hits} hits, {types.misses} misses.")
+
+
+if __name__ == "__main__":
+    main()
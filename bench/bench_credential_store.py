@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmarks credential lookups and hot reloads at 100k entries, against the
+old linear scan over a list of UIDs.
+
+Usage: python3 bench/bench_credential_store.py [--entries 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.credential_store import CredentialStore, read_store, write_store
+
+
+def random_uids(count, rng):
+    # Mix of 4-byte and 7-byte UIDs, like a real badge population
+    return [rng.randbytes(rng.choice((4, 7))) for _ in range(count)]
+
+
+def time_lookups(container, probes, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for uid in probes:
+            uid in container
+    return (time.perf_counter() - start) / (len(probes) * repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    uids = random_uids(args.entries, rng)
+    hits = [bytearray(uid) for uid in rng.sample(uids, 1000)]
+    misses = [bytearray(uid) for uid in random_uids(1000, rng)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'credentials.bin')
+
+        start = time.perf_counter()
+        write_store(path, uids)
+        write_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        read_store(path)
+        load_time = time.perf_counter() - start
+
+        store = CredentialStore(path)
+        assert len(store) == len(set(uids))
+        assert all(uid in store for uid in hits)
+
+        print(f"Entries             : {len(store)}")
+        print(f"File size           : {size / 1024:.1f} KiB")
+        print(f"Write               : {write_time * 1e3:.1f} ms")
+        print(f"Load                : {load_time * 1e3:.1f} ms")
+        print(f"Lookup (hit)        : {time_lookups(store, hits, 100) * 1e9:.0f} ns")
+        print(f"Lookup (miss)       : {time_lookups(store, misses, 100) * 1e9:.0f} ns")
+
+        # The old AUTHORIZED_UIDS check, on a handful of probes since it is slow
+        legacy = list(uids)
+        print(f"List scan (miss)    : {time_lookups(legacy, misses[:20]) * 1e6:.0f} us")
+
+        # Hot reload: replace the file and time until the watcher swaps the set in
+        store.start_watching(interval=0.01)
+        new_uid = b'\x04\x00\x11\x22\x33\x44\x55'
+        write_store(path, uids + [new_uid])
+        start = time.perf_counter()
+        lookups_during_reload = 0
+        while new_uid not in store:
+            # The read loop keeps answering from the old set during the reload
+            assert hits[0] in store
+            lookups_during_reload += 1
+        reload_time = time.perf_counter() - start
+        store.stop_watching()
+        print(f"Reload (watcher)    : {reload_time * 1e3:.1f} ms, "
+              f"{lookups_during_reload} lookups served meanwhile")
+
+
+if __name__ == "__main__":
+    main()
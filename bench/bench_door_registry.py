@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Worst-case actuation skew when every door on one process is granted at once:
+16 simulated doors from a DoorRegistry on one shared RelayScheduler thread,
+against one scheduler thread per door, with each relay write taking --write-ms
+(a relay board behind an I2C port expander).
+
+Usage: python3 bench/bench_door_registry.py [--doors 16] [--rounds 20] [--write-ms 1.0]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.door import DoorRegistry
+from common.fakes import FakeGPIO
+
+HOLD_TIME = 0.05
+PULSE_TIME = 0.01
+
+
+def door_config(count):
+    # Half latching (SET/UNSET coils), half pulse relays on one pin
+    config = {}
+    for i in range(count):
+        if i % 2:
+            config[f"door{i}"] = {"relay": "pulse", "pin": 100 + 2 * i, "hold_time": HOLD_TIME}
+        else:
+            config[f"door{i}"] = {"set_pin": 100 + 2 * i, "unset_pin": 101 + 2 * i,
+                                  "hold_time": HOLD_TIME, "pulse_time": PULSE_TIME}
+    return config
+
+
+def run(doors, rounds, write_time, shards):
+    gpio = FakeGPIO(output_time=write_time)
+    registry = DoorRegistry(gpio, door_config(doors), shards=shards)
+    registry.setup()
+    del gpio.history[:]
+    unlock_skews = []
+    relock_skews = []
+    for _ in range(rounds):
+        start = len(gpio.history)
+        granted_at = time.monotonic()
+        for name, door in registry.items():
+            assert door.grant(), name
+        time.sleep(HOLD_TIME + PULSE_TIME + write_time * doors * 4 + 0.05)
+        edges = gpio.history[start:]
+        # Each door's unlock edge is its set_pin going high; relock is the
+        # UNSET pulse for a latching relay, the pin going low for a pulse relay
+        unlocks = []
+        relocks = []
+        for _, door in registry.items():
+            highs = [t for t, pin, level in edges if pin == door.set_pin and level == gpio.HIGH]
+            assert len(highs) == 1, (door.set_pin, highs)
+            unlocks.append(highs[0] - granted_at)
+            if door.unset_pin is None:
+                relock = [t for t, pin, level in edges if pin == door.set_pin and level == gpio.LOW]
+            else:
+                relock = [t for t, pin, level in edges if pin == door.unset_pin and level == gpio.HIGH]
+            assert len(relock) == 1, (door.set_pin, relock)
+            relocks.append(relock[0])
+        unlock_skews.append(max(unlocks) - min(unlocks))
+        relock_skews.append(max(relocks) - min(relocks))
+    registry.close()
+    return unlock_skews, relock_skews
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--doors', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--write-ms', type=float, default=1.0, help="time per relay GPIO write")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{args.doors} doors granted together, {args.rounds} rounds; skew between the first and last door, ms")
+    print(f"{'write':>9} {'threads':>9}{'unlock p50':>12}{'unlock max':>12}{'relock max':>12}")
+    worst = {}
+    for write_ms in sorted({0.0, args.write_ms}):
+        for shards in (1, args.doors):
+            unlock, relock = run(args.doors, args.rounds, write_ms / 1000, shards)
+            worst[(write_ms, shards)] = max(unlock)
+            print(f"{write_ms:>6.1f} ms{shards:>9}{statistics.median(unlock) * 1000:>12.2f}"
+                  f"{max(unlock) * 1000:>12.2f}{max(relock) * 1000:>12.2f}")
+    if args.write_ms:
+        # One thread serializes every door's SET write behind the others'
+        assert worst[(args.write_ms, args.doors)] < worst[(args.write_ms, 1)]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the on-disk event journal: events/s written with batched vs
+per-event fsync, memory use while 1M events are queued and drained, the
+disk a journal with no uploader is held to, and batched upload through a
+server outage against a local stand-in server.
+
+Usage: python3 bench/bench_event_journal.py [--events 1000000]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import event_journal
+from common.event_journal import EventJournal
+from common.server_client import EventUploader
+
+
+class EventServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), EventHandler)
+        self.down = False
+        self.requests = 0
+        self.ids = set()
+        self.duplicates = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class EventHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.server.down:
+            self.send_response(503)
+        else:
+            self.server.requests += 1
+            for event in body["events"]:
+                if event["id"] in self.server.ids:
+                    self.server.duplicates += 1
+                self.server.ids.add(event["id"])
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_rate(directory, count, fsync_every):
+    journal = EventJournal(directory, fsync_every=fsync_every)
+    start = time.perf_counter()
+    for i in range(count):
+        journal.append(event_journal.CARD_READ, uid=f"{i:014x}")
+    journal.sync()
+    elapsed = time.perf_counter() - start
+    journal.close()
+    return count / elapsed
+
+
+def queued_memory(directory, count):
+    """
+    Queue count events, then drain them in batches; return peak traced memory
+    and the number of events read back.
+    """
+    tracemalloc.start()
+    journal = EventJournal(directory, max_segments=10_000)  # Keep the whole backlog
+    for i in range(count):
+        journal.append(event_journal.GRANT, uid=f"{i:014x}")
+    journal.sync()
+    queued_peak = tracemalloc.get_traced_memory()[1]
+    drained = 0
+    while True:
+        events, cursor = journal.read_batch(1000)
+        if not events:
+            break
+        drained += len(events)
+        journal.commit(cursor)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    journal.close()
+    return queued_peak, peak, drained
+
+
+def retained_bytes(directory, count, segment_bytes, max_segments):
+    # Bytes of segments left by count events appended with nothing uploading them
+    logging.disable(logging.WARNING)  # One warning per dropped segment
+    journal = EventJournal(directory, segment_bytes=segment_bytes, max_segments=max_segments)
+    for i in range(count):
+        journal.append(event_journal.CARD_READ, uid=f"{i:014x}")
+    journal.close()
+    logging.disable(logging.NOTSET)
+    names = [name for name in os.listdir(directory) if name.startswith(event_journal.SEGMENT_PREFIX)]
+    assert len(names) <= max_segments, f"{len(names)} segments kept"
+    last = json.loads(open(os.path.join(directory, max(names)), 'rb').read().splitlines()[-1])
+    assert last["seq"] == count, "the newest events were not kept"
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+
+
+def upload_through_outage(directory, count, batch_size):
+    server = EventServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    journal = EventJournal(directory, fsync_interval=0.05)
+    uploader = EventUploader(journal, server.url, batch_size=batch_size, linger=0.1, max_backoff=0.5)
+
+    server.down = True
+    for i in range(count // 2):
+        journal.append(event_journal.CARD_READ, uid=f"{i:014x}")
+    time.sleep(1.5)  # A few failed attempts with backoff
+    server.down = False
+    for i in range(count // 2, count):
+        journal.append(event_journal.CARD_READ, uid=f"{i:014x}")
+
+    deadline = time.monotonic() + 30
+    while len(server.ids) < count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    uploader.close()
+    journal.close()
+    server.shutdown()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rate = write_rate(os.path.join(tmp, 'per-event'), 2000, fsync_every=1)
+        print(f"Write, fsync per event    : {rate:10.0f} events/s")
+        rate = write_rate(os.path.join(tmp, 'batched'), 200_000, fsync_every=64)
+        print(f"Write, fsync per 64 events: {rate:10.0f} events/s")
+
+        queued_peak, peak, drained = queued_memory(os.path.join(tmp, 'queued'), args.events)
+        assert drained == args.events, f"drained {drained} of {args.events}"
+        print(f"Queued {args.events} events  : peak {queued_peak / 1024:.0f} KiB traced while queuing, "
+              f"{peak / 1024:.0f} KiB after draining")
+
+        segment_bytes, max_segments = 256 * 1024, 4
+        kept = retained_bytes(os.path.join(tmp, 'offline'), 100_000, segment_bytes, max_segments)
+        print(f"No uploader, 100000 events: {kept / 1024:.0f} KiB kept on disk "
+              f"(limit {max_segments} x {segment_bytes // 1024} KiB segments)")
+        assert kept < (max_segments + 1) * segment_bytes
+
+        count = 2000
+        server = upload_through_outage(os.path.join(tmp, 'upload'), count, args.batch)
+        assert len(server.ids) == count, f"server received {len(server.ids)} of {count} events"
+        print(f"Upload through outage     : {count} events in {server.requests} requests, "
+              f"{server.duplicates} duplicates, none lost")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Wiegand callback and card-record latency with DEBUG logging enabled: the old
+Indala reader logging (synchronous FileHandler and console StreamHandler, an
+f-string debug line per bit, seven info lines and seven prints per card)
+against common.logs (one JSON record, queued to a listener thread).
+
+The console is a file on disk, or with --console-ms a stream that takes that
+long per write (a serial console or a slow SSH session).
+
+Usage: python3 bench/bench_logging.py [--cards 100] [--console-ms 0.5]
+"""
+import argparse
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import logs
+from common.wiegand import WiegandCapture
+
+DATA0_PIN = 23
+DATA1_PIN = 18
+BITS = 26
+BIT_INTERVAL = 0.002  # Wiegand bits arrive about 2 ms apart
+
+
+class SlowStream:
+    """
+    A console that takes write_time per write.
+    """
+
+    def __init__(self, stream, write_time):
+        self.stream = stream
+        self.write_time = write_time
+
+    def write(self, text):
+        time.sleep(self.write_time)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def setup_legacy(path, console):
+    # Mirrors the old basicConfig in Indala/indala_reader.py
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s [%(levelname)s] %(message)s',
+                        handlers=[logging.FileHandler(path), logging.StreamHandler(console)], force=True)
+
+
+def legacy_callback(capture, gpio, level, tick):
+    if level == 0:
+        logging.debug(f"Pulse detected on GPIO{gpio} at tick {tick}. Bit: {int(gpio == DATA1_PIN)}")
+    capture.edge(gpio, level, tick)
+
+
+def legacy_card(card_bits, card_number):
+    logging.info("--------------------------------------------------")
+    logging.info("Card Read Detected:")
+    logging.info("Reader Type    : Indala Wiegand")
+    logging.info(f"Binary Data    : {card_bits}")
+    logging.info("Format         : H10301")
+    logging.info("Facility Code  : 1")
+    logging.info(f"Card Number    : {card_number}")
+    logging.info("--------------------------------------------------")
+    for line in ("\nCard Read Detected:", "Reader Type   : Indala Wiegand", f"Binary Data   : {card_bits}",
+                 "Format        : H10301", "Facility Code : 1", f"Card Number   : {card_number}",
+                 "--------------------------------------------------\n"):
+        print(line)
+
+
+def queued_callback(capture, gpio, level, tick):
+    if level == 0:
+        logs.log_event("wiegand_bit", logging.DEBUG, gpio=gpio, tick=tick, bit=int(gpio == DATA1_PIN))
+    capture.edge(gpio, level, tick)
+
+
+def queued_card(card_bits, card_number):
+    logs.log_event("card_read", reader="Indala Wiegand", bits=card_bits, format="H10301",
+                   facility_code=1, card_number=card_number)
+
+
+def run(callback, card, cards):
+    capture = WiegandCapture(DATA0_PIN, DATA1_PIN, clock=None)
+    edge_times = []
+    card_times = []
+    tick = 0
+    for n in range(cards):
+        bits = format((n * 2654435761) & ((1 << BITS) - 1), f'0{BITS}b')
+        for bit in bits:
+            tick += int(BIT_INTERVAL * 1e6)
+            start = time.perf_counter()
+            callback(capture, DATA1_PIN if bit == '1' else DATA0_PIN, 0, tick)
+            edge_times.append(time.perf_counter() - start)
+            time.sleep(BIT_INTERVAL)
+        start = time.perf_counter()
+        card(bits, n)
+        card_times.append(time.perf_counter() - start)
+    return edge_times, card_times
+
+
+def measure(label, setup, callback, card, cards, console_time, tmp):
+    with open(os.path.join(tmp, f'{label}.console'), 'w') as console_file:
+        console = SlowStream(console_file, console_time) if console_time else console_file
+        with contextlib.redirect_stdout(console):
+            setup(os.path.join(tmp, f'{label}.log'), console)
+            edges, card_times = run(callback, card, cards)
+            logs.shutdown()  # Write out anything still queued before the files close
+            logging.getLogger().handlers.clear()
+    return edges, card_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=100)
+    parser.add_argument('--console-ms', type=float, default=0.5, help="per-write time of the slow console")
+    args = parser.parse_args()
+
+    def setup_queued(path, console):
+        logs.setup(path, level=logging.DEBUG)
+
+    print(f"{args.cards} cards x {BITS} bits, DEBUG enabled; latency in microseconds")
+    print(f"{'':<22}{'console':>9}{'bit p50':>10}{'bit p99':>10}{'bit max':>10}{'card p50':>10}{'card max':>10}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for console_ms in (0.0, args.console_ms):
+            for label, setup, callback, card in (("sync FileHandler", setup_legacy, legacy_callback, legacy_card),
+                                                 ("QueueHandler + JSON", setup_queued, queued_callback, queued_card)):
+                name = f"{label.split()[0]}-{console_ms}"
+                edges, cards = measure(name, setup, callback, card, args.cards, console_ms / 1000, tmp)
+                edges.sort()
+                results[(label, console_ms)] = edges
+                print(f"{label:<22}{console_ms:>6.1f} ms{statistics.median(edges) * 1e6:>10.1f}"
+                      f"{edges[int(len(edges) * 0.99)] * 1e6:>10.1f}{edges[-1] * 1e6:>10.1f}"
+                      f"{statistics.median(cards) * 1e6:>10.1f}{max(cards) * 1e6:>10.1f}")
+                if setup is setup_queued:
+                    with open(os.path.join(tmp, f'{name}.log')) as f:
+                        assert len(f.read().splitlines()) == args.cards * (BITS + 1), "queued records were lost"
+    if args.console_ms:
+        # With a slow console the synchronous callback waits for it; the queued one does not
+        assert (statistics.median(results[("QueueHandler + JSON", args.console_ms)])
+                < statistics.median(results[("sync FileHandler", args.console_ms)]))
+
+
+if __name__ == "__main__":
+    main()
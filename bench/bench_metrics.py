@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Cost of the tap-path instrumentation in common.metrics: each operation on its
+own, a tap timed the way access_control.py times it against the same tap
+bare, the time to serve a scrape of every stage histogram and what a scrape
+does to taps running meanwhile, and histogram percentiles against exact ones.
+
+Usage: python3 bench/bench_metrics.py [--taps 200000] [--scrapes 200]
+"""
+import argparse
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import metrics
+from common.metrics import Histogram, MetricsServer, Registry
+
+REPEATS = 5
+
+
+def per_call_ns(fn, count):
+    # Best of REPEATS runs of count calls, in ns per call
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter_ns()
+        fn(count)
+        best = min(best, (time.perf_counter_ns() - start) / count)
+    return best
+
+
+def empty_loop(count):
+    for _ in range(count):
+        pass
+
+
+def timed_record(count):
+    histogram = metrics.CREDENTIAL_CHECK
+    perf_counter_ns = time.perf_counter_ns
+    for _ in range(count):
+        start = perf_counter_ns()
+        histogram.record(perf_counter_ns() - start)
+
+
+def timed_with(count):
+    histogram = metrics.CREDENTIAL_CHECK
+    for _ in range(count):
+        with histogram.time():
+            pass
+
+
+def counter_inc(count):
+    counter = metrics.READS
+    for _ in range(count):
+        counter.inc()
+
+
+def tap_workload(rng, cards):
+    credentials = {rng.randbytes(7) for _ in range(cards)}
+    uids = [rng.choice(list(credentials)) if rng.random() < 0.8 else rng.randbytes(7) for _ in range(4096)]
+    opened = []
+    return credentials, uids, opened.append
+
+
+def bare_taps(credentials, uids, door):
+    def run(count):
+        for i in range(count):
+            uid = uids[i & 4095]
+            granted = uid in credentials
+            if granted:
+                door(uid)
+    return run
+
+
+def instrumented_taps(credentials, uids, door):
+    # Every timer and counter a PN532 tap goes through, timed as the code does:
+    # the IRQ-mode read (with), the credential check, the read and decision
+    # counters, Door.grant() and the relay output
+    perf_counter_ns = time.perf_counter_ns
+
+    def run(count):
+        for i in range(count):
+            with metrics.PN532_READ.time():
+                uid = uids[i & 4095]
+            metrics.READS.inc()
+            start = perf_counter_ns()
+            granted = uid in credentials
+            metrics.CREDENTIAL_CHECK.record(perf_counter_ns() - start)
+            if granted:
+                metrics.GRANTS.inc()
+                start = perf_counter_ns()
+                try:
+                    door(uid)
+                finally:
+                    metrics.DOOR_GRANT.record(perf_counter_ns() - start)
+                scheduled = perf_counter_ns()
+                metrics.RELAY_OUTPUT.record(perf_counter_ns() - scheduled)
+            else:
+                metrics.DENIES.inc()
+    return run
+
+
+def fill_histograms(rng, samples):
+    # Latencies from 1 us to 10 s, so a scrape has every bucket to sum
+    for name in ('pn532_read', 'wiegand_decode', 'credential_check', 'verify', 'door_grant', 'relay_output', 'tap'):
+        histogram = metrics.stage(name)
+        for _ in range(samples):
+            histogram.record(int(10 ** rng.uniform(3, 10)))
+
+
+def tap_latencies(duration, taps):
+    # Per-tap latency, in ns, of instrumented taps run back to back for duration seconds
+    times = []
+    stop = time.monotonic() + duration
+    while time.monotonic() < stop:
+        start = time.perf_counter_ns()
+        taps(1)
+        times.append(time.perf_counter_ns() - start)
+    times.sort()
+    return times
+
+
+def check_exposition(text):
+    # Cumulative buckets never go down and end at the count
+    buckets = {}
+    counts = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        if '_bucket{' in name:
+            series = name[:name.index('le=')]
+            assert float(value) >= buckets.get(series, 0), f"bucket went down at {name}"
+            buckets[series] = float(value)
+        elif name.startswith('access_stage_seconds_count'):
+            counts[name.replace('_count{', '_bucket{').rstrip('}') + ','] = float(value)
+    for series, count in counts.items():
+        assert buckets[series] == count, f"+Inf bucket of {series} is not the count"
+    return len(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--taps', type=int, default=200_000)
+    parser.add_argument('--scrapes', type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    rng = random.Random(24)
+
+    baseline = per_call_ns(empty_loop, args.taps)
+    print(f"{'operation':<44}{'ns per call':>12}")
+    for label, fn in (("perf_counter_ns() x2 + Histogram.record()", timed_record),
+                      ("with Histogram.time()", timed_with),
+                      ("Counter.inc()", counter_inc)):
+        print(f"{label:<44}{per_call_ns(fn, args.taps) - baseline:>12.0f}")
+
+    credentials, uids, door = tap_workload(rng, 100_000)
+    bare = per_call_ns(bare_taps(credentials, uids, door), args.taps)
+    instrumented = per_call_ns(instrumented_taps(credentials, uids, door), args.taps)
+    overhead = instrumented - bare
+    print(f"Tap with 4 timers and 2 counters: {instrumented:.0f} ns against {bare:.0f} ns bare, "
+          f"{overhead / 1000:.2f} us added per tap")
+
+    fill_histograms(rng, 100_000)
+    server = MetricsServer(0)
+    try:
+        scrape_times = []
+        for _ in range(args.scrapes):
+            start = time.perf_counter()
+            with urllib.request.urlopen(server.url) as response:
+                text = response.read().decode()
+            scrape_times.append(time.perf_counter() - start)
+        scrape_times.sort()
+        start = time.perf_counter()
+        for _ in range(args.scrapes):
+            metrics.REGISTRY.render()
+        render = (time.perf_counter() - start) / args.scrapes
+        series = check_exposition(text)
+        print(f"Scrape of {series} stage histograms ({len(text) / 1024:.1f} KB): render {render * 1000:.2f} ms, "
+              f"HTTP p50 {statistics.median(scrape_times) * 1000:.2f} ms, max {scrape_times[-1] * 1000:.2f} ms; "
+              f"{render / 15 * 100:.3f}% of a core at one scrape per 15 s")
+
+        # Taps with a scraper hammering the endpoint, against taps alone
+        taps = instrumented_taps(credentials, uids, door)
+        quiet = tap_latencies(1.0, taps)
+        stop = threading.Event()
+
+        def scrape_continuously():
+            while not stop.is_set():
+                with urllib.request.urlopen(server.url) as response:
+                    response.read()
+
+        scraper = threading.Thread(target=scrape_continuously)
+        scraper.start()
+        busy = tap_latencies(1.0, taps)
+        stop.set()
+        scraper.join()
+    finally:
+        server.close()
+    print(f"{'tap latency, us':<36}{'p50':>8}{'p99':>8}{'p99.9':>8}{'max':>9}")
+    for label, times in (("no scrapes", quiet), ("scraped back to back", busy)):
+        print(f"{label:<36}{times[len(times) // 2] / 1000:>8.2f}{times[int(len(times) * 0.99)] / 1000:>8.2f}"
+              f"{times[int(len(times) * 0.999)] / 1000:>8.2f}{times[-1] / 1000:>9.0f}")
+
+    # Percentiles from the buckets against the exact ones
+    histogram = Histogram()
+    values = sorted(int(rng.lognormvariate(11, 1.5)) for _ in range(200_000))
+    for value in values:
+        histogram.record(value)
+    print(f"{'percentile':<12}{'exact us':>10}{'histogram':>11}{'error':>8}")
+    worst = 0
+    for percent in (50, 90, 99, 99.9):
+        exact = values[math.ceil(len(values) * percent / 100) - 1] / 1e9
+        estimate = histogram.percentile(percent)
+        worst = max(worst, abs(estimate / exact - 1))
+        print(f"p{percent:<11g}{exact * 1e6:>10.1f}{estimate * 1e6:>11.1f}{estimate / exact - 1:>8.2%}")
+    assert Registry().render() == "\n"
+
+    # The whole tap's instrumentation stays within a few microseconds
+    assert overhead < 3000, f"{overhead:.0f} ns of instrumentation per tap"
+    assert worst < 0.035, "percentile outside the bucket precision"
+
+
+if __name__ == "__main__":
+    main()
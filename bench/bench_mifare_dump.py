@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Full MIFARE Classic 1K dumps on a simulated PN532 and card: authenticating
+before every block, as pn532_scan.py did, against one authentication per
+sector (mifare_classic.dump). Both must produce the same image.
+
+Usage: python3 bench/bench_mifare_dump.py [--dumps 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import mifare_classic
+from common.fakes import FakeMifareClassic, SimulatedPN532
+
+UID = bytes.fromhex('DEADBEEF')
+
+
+def per_block_dump(pn532, uid):
+    # The old loop: authenticate, then read, for every data block
+    image = bytearray(mifare_classic.CARD_SIZE)
+    for block in range(mifare_classic.BLOCKS):
+        if mifare_classic.is_trailer(block):
+            continue
+        assert pn532.mifare_classic_authenticate_block(uid, block, mifare_classic.AUTH_A, mifare_classic.DEFAULT_KEY)
+        block_data = pn532.mifare_classic_read_block(block)
+        assert block_data is not None, block
+        image[block * mifare_classic.BLOCK_SIZE:(block + 1) * mifare_classic.BLOCK_SIZE] = block_data
+    return bytes(image)
+
+
+def measure(dump, dumps, data):
+    pn532 = SimulatedPN532()
+    pn532.SAM_configuration()
+    card = FakeMifareClassic(UID, data)
+    pn532.present(card)
+    times = []
+    commands = transactions = 0
+    image = None
+    for _ in range(dumps):
+        uid = pn532.read_passive_target(timeout=1)
+        start_commands, start_transactions = pn532.commands, pn532.transactions
+        start = time.perf_counter()
+        image = dump(pn532, uid)
+        times.append(time.perf_counter() - start)
+        commands = pn532.commands - start_commands
+        transactions = pn532.transactions - start_transactions
+    return image, statistics.median(times), commands, transactions, card.authentications // dumps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--dumps', type=int, default=5)
+    args = parser.parse_args()
+    data = random.Random(3).randbytes(mifare_classic.CARD_SIZE)
+
+    print(f"{'':<22}{'wall/dump':>12}{'auths':>8}{'commands':>10}{'I2C txns':>10}")
+    images = []
+    for label, dump in (("per-block auth", per_block_dump), ("per-sector auth", mifare_classic.dump)):
+        image, wall, commands, transactions, auths = measure(dump, args.dumps, data)
+        images.append(image)
+        print(f"{label:<22}{wall * 1e3:>9.0f} ms{auths:>8}{commands:>10}{transactions:>10}")
+
+    assert images[0] == images[1], "dumps differ"
+    image = images[0]
+    # Data blocks match the card; trailers are left zeroed
+    for block in range(mifare_classic.BLOCKS):
+        chunk = slice(block * mifare_classic.BLOCK_SIZE, (block + 1) * mifare_classic.BLOCK_SIZE)
+        if mifare_classic.is_trailer(block):
+            assert image[chunk] == bytes(mifare_classic.BLOCK_SIZE)
+        elif block:
+            assert image[chunk] == data[chunk], block
+    print(f"Both dumps are identical {mifare_classic.CARD_SIZE}-byte images.")
+
+
+if __name__ == "__main__":
+    main()
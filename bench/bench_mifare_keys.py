@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Authentication attempts per card for full MIFARE Classic reads across a mixed
+population of card families, each with its own sector keys: a dictionary
+sweep for every card, against the KeyDictionary learning keys per (family,
+sector) as cards come in, and starting from the cache a previous run saved.
+
+Usage: python3 bench/bench_mifare_keys.py [--cards 200] [--keys 40]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import mifare_classic
+from common.fakes import FakeMifareClassic, SimulatedPN532
+from common.mifare_keys import KeyDictionary
+
+TRANSPORT = mifare_classic.DEFAULT_KEY
+MAD_KEY = bytes.fromhex('A0A1A2A3A4A5')
+NDEF_KEY = bytes.fromhex('D3F7D3F7D3F7')
+
+
+def make_families(rng, keys):
+    """
+    family name -> {sector: (key_a, key_b)}. The site keys are the last ones
+    in the dictionary; Key A of the 'site-b' family is not in it at all.
+    """
+    site_a = keys[-16:]
+    site_b = keys[-20:-16]
+    return {
+        'transport': {},
+        'ndef': {sector: (MAD_KEY if sector == 0 else NDEF_KEY, TRANSPORT) for sector in range(16)},
+        'site-a': {sector: (site_a[sector], rng.randbytes(6)) for sector in range(16)},
+        'site-b': {sector: (rng.randbytes(6), site_b[sector % 4]) for sector in range(16)},
+    }
+
+
+def population(rng, families, count):
+    names = sorted(families)
+    for n in range(count):
+        family = rng.choice(names)
+        # Families are told apart by the issuer's UID prefix
+        uid = bytes((0x10 + names.index(family),)) + n.to_bytes(3, 'big')
+        yield family, FakeMifareClassic(uid, rng.randbytes(mifare_classic.CARD_SIZE), families[family])
+
+
+def read_population(cards, dictionary_for_card):
+    pn532 = SimulatedPN532(exchange_time=0, detect_time=0)
+    pn532.STATUS_POLL = 0
+    attempts, commands = [], []
+    for family, card in cards:
+        dictionary = dictionary_for_card()
+        pn532.present(card)
+        uid = pn532.read_passive_target(timeout=1)
+        start_attempts, start_commands = dictionary.attempts, pn532.commands
+        image = mifare_classic.dump(pn532, uid, keys=dictionary.for_card(family))
+        assert image[16:48] == card.memory[16:48], family
+        attempts.append(dictionary.attempts - start_attempts)
+        commands.append(pn532.commands - start_commands)
+        pn532.remove()
+    return attempts, commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=200)
+    parser.add_argument('--keys', type=int, default=40, help="keys in the dictionary")
+    args = parser.parse_args()
+    rng = random.Random(5)
+
+    keys = [TRANSPORT, MAD_KEY, NDEF_KEY] + [rng.randbytes(6) for _ in range(args.keys - 3)]
+    families = make_families(rng, keys)
+    cards = list(population(rng, families, args.cards))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'mifare_key_cache.json')
+        learning = KeyDictionary(keys, cache_path)
+        runs = [
+            ("dictionary sweep", lambda: KeyDictionary(keys)),
+            ("per-family cache", lambda: learning),
+        ]
+        results = [(label, *read_population(cards, factory)) for label, factory in runs]
+        learning.save()
+        warm = KeyDictionary(keys, cache_path)
+        results.append(("cache from disk", *read_population(cards, lambda: warm)))
+
+    print(f"{len(cards)} cards, {len(keys)} keys, families: "
+          + ", ".join(f"{name} {sum(family == name for family, _ in cards)}" for name in sorted(families)))
+    print(f"{'':<20}{'auths/card':>12}{'max':>8}{'commands/card':>15}")
+    for label, attempts, commands in results:
+        print(f"{label:<20}{statistics.mean(attempts):>12.1f}{max(attempts):>8}{statistics.mean(commands):>15.1f}")
+    assert max(results[-1][1]) == mifare_classic.SECTORS, "a cached card needed more than one auth per sector"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Taps served per second at a crowded entrance: a queue of people at one PN532,
+some of them tapping two at a time (or one wallet with two badges), read with
+one target per InListPassiveTarget (read_passive_target, as access_control.py
+did) against up to two (PN532Session.read_targets). A card that gets no
+decision while it is on the reader is tapped again, alone, straight after.
+
+Usage: python3 bench/bench_multi_target.py [--people 60] [--together 0.4] [--dwell-ms 250]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.fakes import FakeMifareClassic, SimulatedPN532
+from common.pn532_session import PN532Session
+from common.repeat_filter import RepeatFilter
+
+READ_TIMEOUT = 0.05
+SETTLE_TIME = 0.03  # For a read already under way when the cards leave
+
+
+def crowd(rng, people, together):
+    """
+    The people's cards in arrival order, grouped into taps of one or two, and
+    the UIDs allowed in (three quarters of them).
+    """
+    cards = [FakeMifareClassic(rng.randbytes(4)) for _ in range(people)]
+    allowed = {card.uid for card in cards if rng.random() < 0.75}
+    groups = []
+    n = 0
+    while n < people:
+        size = 2 if n + 1 < people and rng.random() < together else 1
+        groups.append(cards[n:n + size])
+        n += size
+    return groups, allowed
+
+
+def run(groups, allowed, multi, dwell, rng):
+    pn532 = SimulatedPN532()
+    session = PN532Session(lambda: pn532)
+    assert session.connect()
+    repeats = RepeatFilter()
+    decisions = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+    arrived = [0.0]  # When the cards now on the reader were presented
+
+    def authorize(uid):
+        # (granted, seconds from presenting the card to its decision)
+        with lock:
+            decisions.setdefault(uid, []).append((uid in allowed, time.monotonic() - arrived[0]))
+
+    def reader():
+        while not stop.is_set():
+            if multi:
+                uids = [card.uid for card in session.read_targets(timeout=READ_TIMEOUT)]
+            else:
+                uid = session.read_passive_target(timeout=READ_TIMEOUT)
+                uids = [] if uid is None else [bytes(uid)]
+            for uid in uids:
+                if not repeats.is_repeat(uid):
+                    authorize(uid)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    queue = deque(groups)
+    taps = 0
+    start = time.monotonic()
+    while queue:
+        group = queue.popleft()
+        taps += len(group)
+        arrived[0] = time.monotonic()
+        pn532.present(*group)
+        time.sleep(dwell * rng.uniform(0.75, 1.25))
+        pn532.remove()
+        time.sleep(SETTLE_TIME)
+        with lock:
+            missed = [card for card in group if card.uid not in decisions]
+        # Nothing beeped for them: they tap again, one at a time
+        queue.extendleft([card] for card in reversed(missed))
+        time.sleep(dwell * 0.2)  # The next person steps up
+    elapsed = time.monotonic() - start
+    stop.set()
+    thread.join()
+    return decisions, taps, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--people', type=int, default=60)
+    parser.add_argument('--together', type=float, default=0.4, help="chance that two people tap together")
+    parser.add_argument('--dwell-ms', type=float, default=250, help="mean time a card is held at the reader")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    groups, allowed = crowd(random.Random(21), args.people, args.together)
+    pairs = sum(len(group) == 2 for group in groups)
+    print(f"{args.people} people, {pairs} pairs tapping together, {args.dwell_ms:g} ms per tap")
+    print(f"{'':<28}{'taps':>6}{'re-taps':>9}{'people/s':>10}{'decision p50':>14}{'max':>8}")
+    served = {}
+    for label, multi in (("MaxTg 1 (read_passive)", False), ("MaxTg 2 (read_targets)", True)):
+        decisions, taps, elapsed = run(groups, allowed, multi, args.dwell_ms / 1000, random.Random(1))
+        assert len(decisions) == args.people, "someone never got a decision"
+        for uid, made in decisions.items():
+            assert len(made) == 1, "a card was decided twice"
+            assert made[0][0] == (uid in allowed), "wrong decision"
+        latency = sorted(made[0][1] for made in decisions.values())
+        served[multi] = (taps, args.people / elapsed)
+        print(f"{label:<28}{taps:>6}{taps - args.people:>9}{args.people / elapsed:>10.2f}"
+              f"{statistics.median(latency) * 1000:>11.1f} ms{latency[-1] * 1000:>5.0f} ms")
+    # Both cards of a pair are read together, so nobody has to tap twice
+    assert served[True][0] == args.people
+    if pairs:
+        assert served[True][1] > served[False][1]
+
+
+if __name__ == "__main__":
+    main()
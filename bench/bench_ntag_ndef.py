@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+PN532 transactions and latency per tag for reading an NDEF message from a
+simulated NTAG213/215/216: one page per READ over the whole data area, four
+pages per READ over the whole data area, and common.ntag (capability
+container first, then four-page READs only up to the NDEF TLV's length).
+
+Usage: python3 bench/bench_ntag_ndef.py [--reads 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import ntag
+from common.fakes import FakeNTAG21x, SimulatedPN532
+
+
+def data_area(pn532):
+    cc = ntag.parse_capability_container(pn532.ntag2xx_read_block(ntag.CC_PAGE))
+    return cc.data_size // ntag.PAGE_SIZE
+
+
+def per_page(pn532):
+    pages = data_area(pn532)
+    data = b''.join(pn532.ntag2xx_read_block(ntag.DATA_PAGE + n) for n in range(pages))
+    return parse_tlv(data)
+
+
+def four_pages(pn532):
+    pages = data_area(pn532)
+    data = b''.join(pn532.mifare_classic_read_block(ntag.DATA_PAGE + n)
+                    for n in range(0, pages, 4))[:pages * ntag.PAGE_SIZE]
+    return parse_tlv(data)
+
+
+def tlv_bounded(pn532):
+    return bytes(ntag.read_ndef(pn532).data)
+
+
+def parse_tlv(data):
+    # The whole data area is in; the NDEF TLV comes first (see ntag.ndef_tlv)
+    if data[1] == 0xFF:
+        return data[4:4 + int.from_bytes(data[2:4], 'big')]
+    return data[2:2 + data[1]]
+
+
+def messages(model):
+    fill = FakeNTAG21x.MODELS[model][1] * 8 - 16  # Data area less TLV and record headers
+    return {
+        "URL": ntag.encode_message([ntag.uri_record("https://example.com/door/7?badge=0421")]),
+        "full": ntag.encode_message([ntag.text_record("x" * fill)]),
+    }
+
+
+def measure(read, card, expected, reads):
+    pn532 = SimulatedPN532(detect_time=0)
+    pn532.STATUS_POLL = 0
+    pn532.present(card)
+    pn532.read_passive_target(timeout=1)
+    times = []
+    start_commands = pn532.commands
+    for _ in range(reads):
+        start = time.perf_counter()
+        assert read(pn532) == expected
+        times.append(time.perf_counter() - start)
+    return (pn532.commands - start_commands) / reads, statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reads', type=int, default=20)
+    args = parser.parse_args()
+
+    strategies = (("per page", per_page), ("4 pages", four_pages), ("TLV-bounded", tlv_bounded))
+    print("READ transactions (PN532 commands) and median ms per tag, simulated 3 ms per exchange")
+    print(f"{'':<16}{'bytes':>6}" + ''.join(f"{label:>22}" for label, _ in strategies))
+    for model in FakeNTAG21x.MODELS:
+        for name, message in messages(model).items():
+            card = FakeNTAG21x(bytes.fromhex('04A1B2C3D4E5F6'), model, ntag.ndef_tlv(message))
+            row = f"{model + ' ' + name:<16}{len(message):>6}"
+            for _, read in strategies:
+                commands, ms = measure(read, card, message, args.reads)
+                row += f"{commands:>12.0f}{ms:>8.1f} ms"
+            print(row)
+
+    message = ntag.read_ndef(_selected(FakeNTAG21x(bytes(7), 'NTAG213', ntag.ndef_tlv(messages('NTAG213')["URL"]))))
+    assert message.first().uri == "https://example.com/door/7?badge=0421"
+    print("Records decoded correctly.")
+
+
+def _selected(card):
+    pn532 = SimulatedPN532(detect_time=0, exchange_time=0)
+    pn532.STATUS_POLL = 0
+    pn532.present(card)
+    pn532.read_passive_target(timeout=1)
+    return pn532
+
+
+if __name__ == "__main__":
+    main()
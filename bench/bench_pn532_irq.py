@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compares the read_passive_target(timeout=0.5) polling loop with IRQ-driven
+detection on a simulated PN532 I2C transport (SimulatedPN532): I2C
+transactions and CPU time per idle minute, and time from a card entering the
+field to its UID being returned.
+
+Usage: python3 bench/bench_pn532_irq.py [--idle 5] [--taps 40]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.fakes import FakeGPIO, SimulatedPN532
+from common.pn532_irq import GPIOIrqLine, IrqCardReader
+
+IRQ_PIN = 12
+READ_TIMEOUT = 0.5  # What the PN532 scripts pass to read_passive_target
+DWELL = 0.2
+UID = bytes.fromhex('041B1AA2F75780')
+
+
+def make_reader(mode):
+    gpio = FakeGPIO()
+    gpio.setmode(gpio.BCM)
+    pn532 = SimulatedPN532(gpio, IRQ_PIN)
+    pn532.SAM_configuration()
+    if mode == 'irq':
+        return pn532, IrqCardReader(pn532, GPIOIrqLine(gpio, IRQ_PIN))
+    return pn532, pn532
+
+
+class ReadLoop:
+    """
+    The scripts' read loop on its own thread, recording when UIDs come back
+    and the thread's CPU time.
+    """
+
+    def __init__(self, cards):
+        self.cards = cards
+        self.reads = []
+        self.cpu = 0.0
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+
+    def _run(self):
+        start = time.thread_time()
+        while self._running:
+            uid = self.cards.read_passive_target(timeout=READ_TIMEOUT)
+            if uid is not None:
+                self.reads.append(time.monotonic())
+        self.cpu = time.thread_time() - start
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+
+def idle(mode, seconds):
+    pn532, cards = make_reader(mode)
+    loop = ReadLoop(cards)
+    time.sleep(0.1)  # Past the first command
+    transactions = pn532.transactions
+    time.sleep(seconds)
+    transactions = pn532.transactions - transactions
+    loop.stop()
+    per_minute = 60 / seconds
+    return transactions * per_minute, loop.cpu * per_minute
+
+
+def detect(mode, taps, rng):
+    pn532, cards = make_reader(mode)
+    loop = ReadLoop(cards)
+    latencies = []
+    for _ in range(taps):
+        # Arrive at a random point of the polling cycle
+        time.sleep(rng.uniform(0.1, 0.6))
+        seen = len(loop.reads)
+        presented = time.monotonic()
+        pn532.present(UID)
+        deadline = presented + 2
+        while len(loop.reads) == seen and time.monotonic() < deadline:
+            time.sleep(0.0005)
+        assert len(loop.reads) > seen, f"{mode}: card not detected"
+        latencies.append(loop.reads[seen] - presented)
+        time.sleep(DWELL)
+        pn532.remove()
+    loop.stop()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--idle', type=float, default=5, help="seconds of idle time to sample")
+    parser.add_argument('--taps', type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{'':<10}{'I2C txns/idle min':>20}{'CPU/idle min':>16}{'detect p50':>13}{'detect max':>13}")
+    for mode in ('polling', 'irq'):
+        transactions, cpu = idle(mode, args.idle)
+        latencies = sorted(detect(mode, args.taps, random.Random(11)))
+        print(f"{mode:<10}{transactions:>20,.0f}{cpu * 1e3:>13.1f} ms"
+              f"{statistics.median(latencies) * 1e3:>10.1f} ms{latencies[-1] * 1e3:>10.1f} ms")
+    print("IRQ mode also re-sends InListPassiveTarget after each idle minute (rearm_interval): "
+          "3 transactions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Cards per minute for bulk provisioning on a simulated PN532: the Provisioner
+(one session, one authentication per sector, read-back verification,
+credential store updated in batches) against running pn532_write.py once per
+block (PN532 reset and set up again, card detected again, one authentication
+per block, no verification; interpreter start-up and retyping the command are
+not counted). Cards are swapped --swap seconds after each finishes. Half the
+cards are site badges on the site's own keys, mapped by UID prefix to a key
+family of their own, and half are blanks on transport keys, in turn; after
+the first card of each family, the Provisioner must open every sector with
+one authentication.
+
+Usage: python3 bench/bench_provisioning.py [--cards 40] [--swap 0.5]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import mifare_classic
+from common.credential_store import read_store, write_store
+from common.fakes import FakeMifareClassic, SimulatedPN532
+from common.mifare_keys import KeyDictionary
+from common.pn532_session import PN532Session
+from common.provisioning import Provisioner
+
+BLOCKS = (4, 5, 6, 8, 9)  # Two sectors
+SECTORS = len({mifare_classic.sector_of(block) for block in BLOCKS})
+EXTERNAL_UID = bytes.fromhex('AABBCCDD')  # Not 04..., so never in the manifest
+SITE_PREFIX = '04A2'
+SITE_KEY = bytes.fromhex('A0A1A2A3A4A5')
+PREFIXES = {SITE_PREFIX: 'site_badges'}
+
+
+def make_manifest(rng, count):
+    # Site badges and blanks in turn, so a key cache shared by both would miss on every card
+    prefixes = (bytes.fromhex(SITE_PREFIX), bytes.fromhex('0411'))
+    return {prefixes[i % 2] + rng.randbytes(2): {block: rng.randbytes(16) for block in BLOCKS}
+            for i in range(count)}
+
+
+def card_key(uid):
+    return SITE_KEY if uid.hex().upper().startswith(SITE_PREFIX) else mifare_classic.DEFAULT_KEY
+
+
+def make_cards(manifest):
+    return [FakeMifareClassic(uid, keys={sector: (card_key(uid),) * 2 for sector in range(mifare_classic.SECTORS)})
+            for uid in manifest]
+
+
+def operator(pn532, cards, swap, done):
+    """
+    Presents each card until done(card) is true, then swaps in the next.
+    """
+    for card in cards:
+        pn532.present(card)
+        while not done(card):
+            time.sleep(0.001)
+        pn532.remove()
+        time.sleep(swap)
+
+
+def provisioner_run(manifest, swap):
+    pn532 = SimulatedPN532()
+    cards = make_cards(manifest)
+    keys = KeyDictionary([mifare_classic.DEFAULT_KEY, SITE_KEY])
+    with tempfile.TemporaryDirectory() as tmp:
+        credentials_path = os.path.join(tmp, 'credentials.bin')
+        provisioner = Provisioner(PN532Session(lambda: pn532), manifest, credentials_path,
+                                  keys=keys, prefixes=PREFIXES)
+        # A card authorized by someone else during the run must survive it
+        write_store(credentials_path, [EXTERNAL_UID])
+        thread = threading.Thread(target=operator,
+                                  args=(pn532, cards, swap, lambda card: card.uid in provisioner.written))
+        start = time.perf_counter()
+        thread.start()
+        while provisioner.remaining:
+            provisioner.provision_next(timeout=0.1)
+        provisioner.flush()
+        elapsed = time.perf_counter() - start
+        thread.join()
+        assert read_store(credentials_path) == frozenset(manifest) | {EXTERNAL_UID}, \
+            "credential store is missing cards"
+    check_cards(cards, manifest)
+    return elapsed, pn532.commands, keys.attempts
+
+
+def per_block_run(manifest, swap):
+    pn532 = SimulatedPN532()
+    cards = make_cards(manifest)
+    finished = set()
+    attempts = 0
+    thread = threading.Thread(target=operator, args=(pn532, cards, swap, lambda card: card.uid in finished))
+    start = time.perf_counter()
+    thread.start()
+    for uid, blocks in manifest.items():
+        for block, data in blocks.items():
+            # One pn532_write.py invocation: PN532_I2C() pulses RSTPD_N first
+            pn532.reset()
+            pn532.firmware_version
+            pn532.SAM_configuration()
+            while pn532.read_passive_target(timeout=0.1) != uid:
+                pass
+            # The operator passes each card's key on the command line
+            attempts += 1
+            assert pn532.mifare_classic_authenticate_block(uid, block, mifare_classic.AUTH_A, card_key(uid))
+            assert pn532.mifare_classic_write_block(block, data)
+        finished.add(uid)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    check_cards(cards, manifest)
+    return elapsed, pn532.commands, attempts
+
+
+def check_cards(cards, manifest):
+    for card in cards:
+        for block, data in manifest[card.uid].items():
+            start = block * mifare_classic.BLOCK_SIZE
+            assert card.memory[start:start + mifare_classic.BLOCK_SIZE] == data, (card.uid.hex(), block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=40)
+    parser.add_argument('--swap', type=float, default=0.5, help="seconds to swap one card for the next")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    manifest = make_manifest(random.Random(9), args.cards)
+
+    print(f"{args.cards} cards x {len(BLOCKS)} blocks in {SECTORS} sectors, site badges and blanks in turn")
+    print(f"{'':<26}{'swap':>6}{'cards/min':>11}{'commands/card':>15}{'auths/card':>12}")
+    for swap in (0.0, args.swap):
+        for label, run in (("pn532_write.py per block", per_block_run), ("Provisioner", provisioner_run)):
+            elapsed, commands, attempts = run(manifest, swap)
+            print(f"{label:<26}{swap:>5.1f}s{args.cards / elapsed * 60:>11.0f}{commands / args.cards:>15.1f}"
+                  f"{attempts / args.cards:>12.2f}")
+        # One wrong guess on the first sector of each family's first card; every other sector opens first time
+        assert attempts <= SECTORS * args.cards + 2, f"{attempts} authentications for {args.cards} cards"
+
+
+if __name__ == "__main__":
+    main()
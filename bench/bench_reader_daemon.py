@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measures end-to-end tap-to-unlock latency of the asyncio access daemon with
+many simulated PN532 readers, each driving its own door on fake GPIO.
+
+Latency runs from the moment a card enters a reader's field to the moment the
+door's SET coil is driven high.
+
+Usage: python3 bench/bench_reader_daemon.py [--readers 8] [--taps 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.door import Door, RelayScheduler
+from common.fakes import FakeGPIO, FakePN532
+from common.reader_daemon import AccessDaemon, PN532Source
+
+AUTHORIZED = bytes.fromhex('041B1AA2F75780')
+HOLD_TIME = 0.05
+PULSE_TIME = 0.01
+
+
+def present_cards(readers, taps_per_reader, presented, rng):
+    """
+    Tap each reader taps_per_reader times at random intervals, recording when
+    each card entered the field. Runs on its own thread per reader.
+    """
+    def tap_reader(index, pn532):
+        for _ in range(taps_per_reader):
+            # Leave the door time to relock so every tap is a fresh unlock
+            time.sleep(HOLD_TIME + PULSE_TIME + rng.uniform(0.05, 0.15))
+            presented[index].append(time.monotonic())
+            pn532.present(AUTHORIZED)
+            time.sleep(0.02)
+            pn532.remove()
+
+    threads = [threading.Thread(target=tap_reader, args=(i, pn532)) for i, pn532 in enumerate(readers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+async def run(readers_count, taps_per_reader):
+    gpio = FakeGPIO()
+    scheduler = RelayScheduler()
+    readers = [FakePN532() for _ in range(readers_count)]
+    sources = [PN532Source(f"reader-{i}", pn532, timeout=0.1) for i, pn532 in enumerate(readers)]
+    doors = {}
+    for i, source in enumerate(sources):
+        door = Door(gpio, 100 + 2 * i, 101 + 2 * i, hold_time=HOLD_TIME, pulse_time=PULSE_TIME,
+                    scheduler=scheduler)
+        door.setup()
+        doors[source.name] = door
+
+    daemon = AccessDaemon(sources, doors, lambda tap: tap.credential == AUTHORIZED)
+    daemon_task = asyncio.create_task(daemon.run())
+
+    presented = [[] for _ in readers]
+    threads = present_cards(readers, taps_per_reader, presented, random.Random(1))
+    await asyncio.get_running_loop().run_in_executor(None, lambda: [t.join() for t in threads])
+    await asyncio.sleep(HOLD_TIME + PULSE_TIME * 3)
+
+    daemon_task.cancel()
+    try:
+        await daemon_task
+    except asyncio.CancelledError:
+        pass
+    scheduler.stop()
+
+    latencies = []
+    for i, door in enumerate(doors.values()):
+        unlocks = [start for start, _ in gpio.pulses(door.set_pin)]
+        assert len(unlocks) == len(presented[i]), \
+            f"reader {i}: {len(presented[i])} taps but {len(unlocks)} unlocks"
+        latencies.extend(unlock - tap for tap, unlock in zip(presented[i], unlocks))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--taps', type=int, default=20, help="Taps per reader")
+    args = parser.parse_args()
+
+    latencies = sorted(asyncio.run(run(args.readers, args.taps)))
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"Readers            : {args.readers}")
+    print(f"Taps               : {len(latencies)}")
+    print(f"Tap-to-unlock p50  : {statistics.median(latencies) * 1e3:.2f} ms")
+    print(f"Tap-to-unlock p99  : {p99 * 1e3:.2f} ms")
+    print(f"Tap-to-unlock max  : {latencies[-1] * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Replays the reads recorded in Indala/wiegand_reader.log, with their logged
+timestamps, through RepeatFilter and reports how many would still be handled.
+Compares that with the old blanket sleep after each read, and times
+is_repeat() on a busy multi-card stream.
+
+Usage: python3 bench/bench_repeat_filter.py [--window 2.0] [--calls 200000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from common.repeat_filter import RepeatFilter
+
+LOG_PATH = os.path.join(ROOT, 'Indala', 'wiegand_reader.log')
+READ_RE = re.compile(r'^(\S+ \S+) \[INFO\] Binary Data\s*: ([01]+)')
+
+# What the PN532 scripts did to avoid re-reading a held card
+LEGACY_SLEEP = 1.0
+
+
+def logged_reads(path):
+    """
+    Yield (seconds since the first read, bits) for every read in the log.
+    """
+    start = None
+    with open(path) as f:
+        for line in f:
+            match = READ_RE.match(line)
+            if not match:
+                continue
+            at = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f').timestamp()
+            start = at if start is None else start
+            yield at - start, match.group(2)
+
+
+class ReplayClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def replay(reads, window):
+    clock = ReplayClock()
+    repeats = RepeatFilter(window, clock=clock)
+    handled = []
+    for at, bits in reads:
+        clock.now = at
+        if not repeats.is_repeat(bits):
+            handled.append((at, bits))
+    return handled, repeats.suppressed
+
+
+def replay_blanket_sleep(reads, pause):
+    # Every read blinds the reader to all cards for pause seconds
+    handled = []
+    blind_until = float('-inf')
+    for at, bits in reads:
+        if at >= blind_until:
+            handled.append((at, bits))
+            blind_until = at + pause
+    return handled
+
+
+def check_other_card_passes(window):
+    clock = ReplayClock()
+    repeats = RepeatFilter(window, clock=clock)
+    assert not repeats.is_repeat(b'card-a')
+    clock.now = 0.1
+    assert not repeats.is_repeat(b'card-b'), "a different card must not be held up"
+    clock.now = window * 0.9
+    assert repeats.is_repeat(b'card-a'), "a held card must be suppressed"
+    clock.now = window * 2.5
+    assert not repeats.is_repeat(b'card-a'), "a card presented again after the window must pass"
+
+
+def throughput(calls, cards, window):
+    rng = random.Random(9)
+    credentials = [rng.getrandbits(32).to_bytes(4, 'big') for _ in range(cards)]
+    stream = [rng.choice(credentials) for _ in range(calls)]
+    clock = ReplayClock()
+    repeats = RepeatFilter(window, max_entries=cards, clock=clock)
+    step = 0.001  # 1000 reads/s across all cards
+    start = time.perf_counter()
+    for i, credential in enumerate(stream):
+        clock.now = i * step
+        repeats.is_repeat(credential)
+    elapsed = time.perf_counter() - start
+    return elapsed / calls * 1e9, repeats.suppressed / calls, len(repeats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--window', type=float, default=2.0)
+    parser.add_argument('--calls', type=int, default=200_000)
+    args = parser.parse_args()
+
+    reads = list(logged_reads(LOG_PATH))
+    assert reads, f"no reads found in {LOG_PATH}"
+    check_other_card_passes(args.window)
+
+    handled, suppressed = replay(reads, args.window)
+    blanket = replay_blanket_sleep(reads, LEGACY_SLEEP)
+    rows = [
+        ("Logged reads", f"{len(reads)} ({len(set(bits for _, bits in reads))} distinct frames)"),
+        (f"Handled, {args.window:g} s window", f"{len(handled)} ({suppressed} repeats suppressed)"),
+        (f"Handled, {LEGACY_SLEEP:g} s blanket sleep", f"{len(blanket)} (every card blocked during each sleep)"),
+    ]
+    for window in (1.0, 3.0, 5.0):
+        rows.append((f"Handled, {window:g} s window", str(len(replay(reads, window)[0]))))
+    ns, ratio, live = throughput(args.calls, 1000, args.window)
+    rows.append(("is_repeat()", f"{ns:.0f} ns/call over 1000 cards ({ratio:.0%} repeats, {live} live entries)"))
+    for label, value in rows:
+        print(f"{label:<28}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Revocation list at 1M revoked card IDs: memory against a Python set, filter
+size against measured false positives, lookup latency for revoked and other
+cards, and the time to apply deltas of various sizes, directly and synced
+from a local stand-in server. Then checks that VerifyClient turns revoked
+cards away and admits previously allowed ones while the server is down.
+
+Usage: python3 bench/bench_revocation.py [--revoked 1000000] [--lookups 200000]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.revocation import BloomFilter, RevocationList
+from common.server_client import RevocationSync, VerifyClient
+
+ID_BITS = 40  # MFRC522 card IDs
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serves GET /revocations?since=N from a version history, with a delta
+    when it has every change since N and the whole list otherwise, and
+    POST /verify from a set of allowed card IDs.
+    """
+    daemon_threads = True
+
+    def __init__(self, revoked, history=16):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.revoked = set(revoked)
+        self.version = 1
+        self.history = history
+        self.changes = {}  # version -> (added, removed) that produced it
+        self.allowed = set()
+        self.down = False
+        self.full_lists = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def change(self, added, removed):
+        added, removed = set(added), set(removed) & self.revoked
+        self.revoked |= added
+        self.revoked -= removed
+        self.version += 1
+        self.changes[self.version] = (added, removed)
+        self.changes.pop(self.version - self.history, None)
+
+    def update_since(self, since):
+        if since == self.version:
+            return {"from": since, "version": since, "added": [], "removed": []}
+        if since < 1 or since + 1 not in self.changes:
+            self.full_lists += 1
+            return {"version": self.version, "revoked": sorted(self.revoked)}
+        added, removed = set(), set()
+        for version in range(since + 1, self.version + 1):
+            new, gone = self.changes[version]
+            added = (added - gone) | new
+            removed = (removed - new) | gone
+        return {"from": since, "version": self.version, "added": sorted(added), "removed": sorted(removed)}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.server.down or url.path != "/revocations":
+            return self._reply(503, {})
+        self._reply(200, self.server.update_since(int(parse_qs(url.query)["since"][0])))
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.server.down:
+            return self._reply(503, {})
+        self._reply(200, {"authorized": int(body["card_id"]) in self.server.allowed})
+
+    def _reply(self, status, reply):
+        payload = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def resident_kb(path):
+    # (KB of the memory-mapped file in memory, KB of it dirty), from /proc/self/smaps
+    resident = dirty = 0
+    mapping = False
+    with open('/proc/self/smaps') as f:
+        for line in f:
+            if not line[0].isupper():
+                mapping = line.rstrip().endswith(path)
+            elif mapping and line.startswith('Rss:'):
+                resident += int(line.split()[1])
+            elif mapping and line.split(':')[0] in ('Private_Dirty', 'Shared_Dirty'):
+                dirty += int(line.split()[1])
+    return resident, dirty
+
+
+def wait_for_sync(sync, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not sync.syncs:
+        assert time.monotonic() < deadline, "no sync from the stand-in server"
+        time.sleep(0.001)
+
+
+def timings(fn, keys):
+    times = []
+    for key in keys:
+        start = time.perf_counter()
+        fn(key)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--revoked', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)  # The server is taken down on purpose
+
+    rng = random.Random(23)
+    revoked = set()
+    while len(revoked) < args.revoked:
+        revoked.add(rng.getrandbits(ID_BITS))
+    others = []
+    while len(others) < args.lookups:
+        key = rng.getrandbits(ID_BITS)
+        if key not in revoked:
+            others.append(key)
+    revoked_sample = rng.sample(sorted(revoked), min(args.lookups, len(revoked)))
+
+    # Filter size against false positives, with the filter sized for the list
+    print(f"{args.revoked} revoked IDs; filter false positives on {len(others)} other cards")
+    print(f"{'bits/ID':>8}{'hashes':>8}{'filter KB':>11}{'expected':>10}{'measured':>10}")
+    for bits_per_key in (3, 5, 8, 10):
+        bloom = BloomFilter.for_capacity(args.revoked, bits_per_key)
+        for key in revoked:
+            bloom.add(key)
+        measured = sum(key in bloom for key in others) / len(others)
+        print(f"{bits_per_key:>8}{bloom.hashes:>8}{len(bloom.data) / 1024:>11.0f}"
+              f"{bloom.false_positive_rate(args.revoked):>10.2%}{measured:>10.2%}")
+
+    tracemalloc.start()
+    as_set = set(revoked)
+    set_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = StandInServer(revoked)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        path = os.path.join(tmp, 'revocations.bin')
+        revocations = RevocationList(path)
+        start = time.perf_counter()
+        sync = RevocationSync(revocations, server.url, interval=3600)  # Syncs once, then waits
+        wait_for_sync(sync)
+        print(f"Full sync of {len(revocations)} IDs from the stand-in server: "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        assert len(revocations) == args.revoked and server.full_lists == 1
+
+        # Lookups: other cards stop at the filter, revoked ones search the mapped list
+        del as_set
+        revocations = RevocationList(path)  # Freshly mapped, nothing of the list read yet
+        sync.revocations = revocations
+        before, _ = resident_kb(path)
+        other_times = timings(revocations.__contains__, others)
+        searched = sum(key in revocations._snapshot.bloom for key in others)
+        revoked_times = timings(revocations.__contains__, revoked_sample[:20_000])
+        after, dirty = resident_kb(path)
+        assert not any(key in revocations for key in others[:20_000] if key in revoked)
+        assert all(key in revocations for key in revoked_sample[:20_000]), "false negative"
+        size = os.path.getsize(path)
+        print(f"Memory: filter {revocations.filter_bytes / 1024:.0f} KB in RAM, list file "
+              f"{size / 1024:.0f} KB mapped; a Python set of the same IDs takes {set_bytes / 1024:.0f} KB")
+        print(f"List searched for {searched} of {len(others)} other cards; mapped list in memory "
+              f"{before} KB before the lookups, {after} KB after, {dirty} KB of it dirty (clean file "
+              f"pages are shared with the page cache and dropped under memory pressure)")
+        assert dirty == 0
+        print(f"{'lookup, us':<28}{'p50':>8}{'p99':>8}{'max':>9}")
+        for label, times in (("other card (filter)", other_times), ("revoked card (list)", revoked_times)):
+            print(f"{label:<28}{statistics.median(times) * 1e6:>8.2f}{times[int(len(times) * 0.99)] * 1e6:>8.2f}"
+                  f"{times[-1] * 1e6:>9.1f}")
+
+        # Deltas: applied directly, then the same size through the server
+        print(f"{'delta (added + removed)':<28}{'apply ms':>10}{'sync ms':>10}")
+        ids = sorted(server.revoked)
+        for size in (10, 100, 1000, 10_000):
+            added = [rng.getrandbits(ID_BITS) for _ in range(size)]
+            removed = rng.sample(ids, size // 2)
+            version = revocations.version
+            start = time.perf_counter()
+            revocations.apply(version, version + 1, added, removed)
+            applied = time.perf_counter() - start
+            server.change(added, removed)
+            assert revocations.version == server.version
+            added = [rng.getrandbits(ID_BITS) for _ in range(size)]
+            removed = rng.sample(added, size // 10) + rng.sample(ids, size // 2)
+            server.change(added, [])
+            server.change([], removed)
+            start = time.perf_counter()
+            sync.sync()
+            synced = time.perf_counter() - start
+            print(f"{size:>8} + {size // 2:<17}{applied * 1000:>10.1f}{synced * 1000:>10.1f}")
+            ids = sorted(server.revoked)
+        assert list(revocations._snapshot.ids) == sorted(server.revoked), "list differs from the server"
+        assert server.full_lists == 1, "a delta sync fetched the whole list"
+
+        # Too far behind for the server's history: it sends the whole list again
+        for _ in range(server.history + 1):
+            server.change([rng.getrandbits(ID_BITS)], [])
+        shutil.copy(path, os.path.join(tmp, 'behind.bin'))
+        stale = RevocationList(os.path.join(tmp, 'behind.bin'))
+        behind = RevocationSync(stale, server.url, interval=3600)
+        wait_for_sync(behind)
+        assert server.full_lists == 2 and stale.version == server.version
+
+        # Offline decisions: an allowed card stays allowed, a revoked one is refused
+        allowed, to_revoke = others[0], others[1]
+        server.allowed = {allowed, to_revoke}
+        verifier = VerifyClient(server.url, deadline=0.5, revocations=stale)
+        assert verifier.verify(allowed)["authorized"] and verifier.verify(to_revoke)["authorized"]
+        server.change([to_revoke], [])
+        behind.sync()
+        server.down = True
+        verifier.cache.allow_ttl = 0  # Force a trip to the server
+        verifier.stale_ttl = 0        # Which, without a current revocation list, means no fallback
+        assert verifier.verify(allowed) == {"authorized": True}, "offline fallback refused an allowed card"
+        assert verifier.verify(to_revoke) == {"authorized": False, "revoked": True}
+        stale.synced_at -= verifier.revocations_max_age + 1
+        assert verifier.verify(allowed) is None, "stale revocation list trusted"
+        print("Offline: previously allowed card admitted, revoked card refused; no false negatives.")
+        verifier.close()
+        behind.close()
+        sync.close()
+        server.shutdown()
+    # Microseconds per lookup in a small fraction of the memory of a set
+    assert statistics.median(other_times) < 10e-6 and statistics.median(revoked_times) < 50e-6
+    assert revocations.filter_bytes * 10 < set_bytes
+
+
+if __name__ == "__main__":
+    main()
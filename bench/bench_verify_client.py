@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Exercises VerifyClient and EventUploader against a local stand-in for the
+access-control server that injects latency, and reports per-tap latency for
+cold, cached and slow-server taps next to the old one-request-per-tap flow.
+
+Usage: python3 bench/bench_verify_client.py [--taps 50] [--slow 3.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import event_journal
+from common.event_journal import EventJournal
+from common.server_client import EventUploader, VerifyClient
+
+AUTHORIZED = {"1001", "1002"}
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = 0.0
+        self.verify_requests = 0
+        self.statuses = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server behind ngrok
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.latency)
+        if self.path == "/verify":
+            self.server.verify_requests += 1
+            reply = {"authorized": body["card_id"] in AUTHORIZED}
+        else:
+            self.server.statuses.extend(event["status"] for event in body["events"])
+            reply = {"ok": True}
+        payload = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def legacy_verify(url, card_id):
+    # The original verify_card(): a fresh connection per tap
+    response = requests.post(f"{url}/verify", json={"card_id": str(card_id)}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    worst = samples[-1]
+    print(f"{label:<34}: p50 {p50 * 1e3:7.2f} ms   max {worst * 1e3:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--taps', type=int, default=50)
+    parser.add_argument('--slow', type=float, default=3.0, help="Injected server latency in seconds")
+    args = parser.parse_args()
+
+    server = StandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # The deadline is short so the benchmark finishes quickly
+    client = VerifyClient(server.url, deadline=0.2)
+    journal_dir = tempfile.TemporaryDirectory()
+    journal = EventJournal(journal_dir.name)
+    uploader = EventUploader(journal, server.url, linger=0.05)
+    try:
+        report("Legacy (new connection per tap)",
+               [timed(legacy_verify, server.url, 2000 + i)[1] for i in range(args.taps)])
+
+        # Distinct cards so every tap goes to the server over the pooled session
+        report("Pooled session, cache miss",
+               [timed(client.verify, 3000 + i)[1] for i in range(args.taps)])
+
+        client.verify(1001)
+        before = server.verify_requests
+        cached = [timed(client.verify, 1001)[1] for _ in range(args.taps)]
+        report("Cached allow", cached)
+        denied = [timed(client.verify, 3000)[1] for _ in range(args.taps)]
+        report("Cached deny (negative cache)", denied)
+        assert server.verify_requests == before, "cached taps must not reach the server"
+
+        # Slow server: expired entries fall back to the last known decision at the deadline
+        client.cache.clear()
+        client.verify(1002)
+        client.cache.allow_ttl = 0
+        server.latency = args.slow
+        decision, elapsed = timed(client.verify, 1002)
+        assert decision == {"authorized": True}, decision
+        report(f"Server +{args.slow}s, stale fallback", [elapsed])
+        decision, elapsed = timed(client.verify, 4000)
+        assert decision is None, decision
+        report(f"Server +{args.slow}s, unknown card", [elapsed])
+
+        # Door events go to the journal at once and are uploaded in the background
+        report(f"Door event, server +{args.slow}s",
+               [timed(lambda: journal.append(event_journal.DOOR_OPENED, status="opened"))[1] for _ in range(3)])
+        journal.sync()
+        deadline = time.monotonic() + args.slow * 4
+        while len(server.statuses) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        server.latency = 0.0
+    finally:
+        uploader.close(timeout=args.slow * 4)
+        journal.close()
+        journal_dir.cleanup()
+        client.close()
+        server.shutdown()
+    assert server.statuses == ["opened"] * 3, server.statuses
+    print("All status updates delivered.")
+
+
+if __name__ == "__main__":
+    main()
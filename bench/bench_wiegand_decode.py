@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Replays synthetic pigpio tick streams through WiegandAssembler, checks every
+frame decodes exactly (including across the 32-bit tick wrap), and reports
+decode latency next to the old 0.5 s BIT_TIMEOUT / 50 ms polling loop.
+
+Decode latency is measured in stream time: from the tick of a frame's last
+bit to the tick of the edge or watchdog event that closed it.
+
+Usage: python3 bench/bench_wiegand_decode.py [--frames 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.wiegand import FALLING, TIMEOUT, WiegandAssembler, tick_diff
+
+DATA0_PIN = 23
+DATA1_PIN = 18
+
+# Old indala_reader.py main loop
+LEGACY_BIT_TIMEOUT_US = 500_000
+LEGACY_POLL_US = 50_000
+
+
+def synthetic_stream(frame_count, watchdog_us, rng):
+    """
+    Build (tick, gpio, level) events for frame_count random 26/34/35/37-bit
+    frames, plus the watchdog timeouts pigpio would report on idle lines.
+    Starts just before the tick wraps so the wrap is exercised.
+    """
+    frames = []
+    edges = []
+    tick = 0xFFFFFFFF - 3_000_000
+    for _ in range(frame_count):
+        bit_count = rng.choice((26, 34, 35, 37))
+        value = rng.getrandbits(bit_count)
+        frames.append((value, bit_count))
+        interval = rng.randint(1000, 2500)  # Reader-dependent bit period
+        for i in reversed(range(bit_count)):
+            gpio = DATA1_PIN if (value >> i) & 1 else DATA0_PIN
+            edges.append((tick, gpio, FALLING))
+            tick += interval + rng.randint(-50, 50)
+        tick += rng.randint(50_000, 1_000_000)  # Time until the next badge
+
+    # pigpio repeats a watchdog timeout every watchdog_us while a line is idle
+    events = list(edges)
+    for gpio in (DATA0_PIN, DATA1_PIN):
+        gpio_ticks = [t for t, g, _ in edges if g == gpio] + [tick]
+        for last, nxt in zip(gpio_ticks, gpio_ticks[1:]):
+            t = last + watchdog_us
+            while t < nxt:
+                events.append((t, gpio, TIMEOUT))
+                t += watchdog_us
+    events.sort()
+    return frames, [(t & 0xFFFFFFFF, g, level) for t, g, level in events], edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(6)
+    decoded = []
+    closed_at = []
+    state = {'tick': 0}
+
+    def on_frame(frame):
+        decoded.append(frame)
+        closed_at.append(state['tick'])
+
+    assembler = WiegandAssembler(DATA0_PIN, DATA1_PIN, on_frame=on_frame)
+    frames, events, edges = synthetic_stream(args.frames, assembler.watchdog_ms * 1000, rng)
+
+    edge = assembler.edge
+    start = time.perf_counter()
+    for tick, gpio, level in events:
+        state['tick'] = tick
+        edge(gpio, level, tick)
+    elapsed = time.perf_counter() - start
+
+    assert len(decoded) == len(frames), f"decoded {len(decoded)} of {len(frames)} frames"
+    for (value, bit_count), frame in zip(frames, decoded):
+        assert (frame.value, frame.bit_count) == (value, bit_count), (frame, value, bit_count)
+
+    latencies = [tick_diff(frame.last_tick, closed) / 1000 for frame, closed in zip(decoded, closed_at)]
+
+    # The old loop processed a frame on the first 50 ms poll after 0.5 s of silence
+    legacy = [(LEGACY_BIT_TIMEOUT_US + rng.uniform(0, LEGACY_POLL_US)) / 1000 for _ in frames]
+
+    print(f"Frames decoded          : {len(decoded)} (all exact)")
+    print(f"Events replayed         : {len(events)} ({len(edges)} edges)")
+    print(f"Replay throughput       : {len(events) / elapsed:,.0f} events/s, {len(decoded) / elapsed:,.0f} frames/s")
+    print(f"Decode latency (ticks)  : p50 {statistics.median(latencies):.1f} ms, max {max(latencies):.1f} ms")
+    print(f"Legacy latency (model)  : p50 {statistics.median(legacy):.1f} ms, max {max(legacy):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
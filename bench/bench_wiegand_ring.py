@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Stress test for the Wiegand EdgeRing: fires simulated edges from several
+threads at well over real Wiegand rates and checks that no edge is lost,
+duplicated or reordered, and that every frame is assembled exactly.
+
+Two runs:
+
+    ring     several producer threads push into one small ring while a
+             consumer drains it, forcing wrap-around and backpressure
+    readers  one WiegandCapture per simulated reader, each fed whole frames
+             at 10x the real bit rate (a bit every 100 us instead of ~1 ms)
+
+Usage: python3 bench/bench_wiegand_ring.py [--producers 4] [--edges 200000] [--readers 4] [--seconds 3]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.wiegand import FALLING, TIMEOUT, EdgeRing, WiegandCapture
+
+REAL_BIT_INTERVAL_US = 1000
+SPEEDUP = 10
+DATA0_PIN = 23
+DATA1_PIN = 18
+
+
+class CheckingSink:
+    """
+    Stands in for the assembler: each tick encodes (producer, sequence), and
+    each producer's edges must arrive complete and in order.
+    """
+
+    def __init__(self, producers):
+        self.expected = [0] * producers
+        self.edges = 0
+
+    def bit(self, bit, tick):
+        producer, seq = tick >> 24, tick & 0xFFFFFF
+        assert seq == self.expected[producer], f"producer {producer}: got {seq}, expected {self.expected[producer]}"
+        assert bit == seq & 1, (producer, seq, bit)
+        self.expected[producer] += 1
+        self.edges += 1
+
+    def idle(self, tick):
+        raise AssertionError("no idle markers were pushed")
+
+
+def ring_stress(producers, edges_each):
+    ring = EdgeRing(1024)
+    sink = CheckingSink(producers)
+    done = threading.Event()
+
+    def produce(producer):
+        push = ring.push
+        base = producer << 24
+        for seq in range(edges_each):
+            push(seq & 1, base | seq)
+
+    def consume():
+        while not done.is_set():
+            if not ring.drain(sink):
+                time.sleep(0)
+        ring.drain(sink)
+
+    threads = [threading.Thread(target=produce, args=(p,)) for p in range(producers)]
+    consumer = threading.Thread(target=consume)
+    start = time.perf_counter()
+    consumer.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    consumer.join()
+    elapsed = time.perf_counter() - start
+
+    assert sink.edges == producers * edges_each, f"{sink.edges} of {producers * edges_each} edges"
+    assert sink.expected == [edges_each] * producers
+    return sink.edges / elapsed, ring.full
+
+
+def reader_stress(readers, seconds, rng):
+    bit_interval_us = REAL_BIT_INTERVAL_US // SPEEDUP
+    sent = [[] for _ in range(readers)]
+    received = [[] for _ in range(readers)]
+    captures = [WiegandCapture(DATA0_PIN, DATA1_PIN, on_frame=received[r].append, clock=None)
+                for r in range(readers)]
+    seeds = [rng.getrandbits(32) for _ in range(readers)]
+
+    def feed(r):
+        # pigpio-style: ticks from the simulated reader, plus a watchdog timeout after each frame
+        capture, frames, frame_rng = captures[r], sent[r], random.Random(seeds[r])
+        gap_us = capture.assembler.frame_gap_us
+        tick = frame_rng.getrandbits(32)
+        deadline = time.perf_counter() + seconds
+        next_frame = time.perf_counter()
+        while time.perf_counter() < deadline:
+            bit_count = frame_rng.choice((26, 34, 35, 37))
+            value = frame_rng.getrandbits(bit_count)
+            for i in reversed(range(bit_count)):
+                gpio = DATA1_PIN if (value >> i) & 1 else DATA0_PIN
+                capture.edge(gpio, FALLING, tick & 0xFFFFFFFF)
+                tick += bit_interval_us
+            tick += gap_us
+            capture.edge(DATA0_PIN, TIMEOUT, tick & 0xFFFFFFFF)
+            frames.append((value, bit_count))
+            # One bit per bit_interval_us of wall time; the frame gap only exists in ticks
+            next_frame += bit_count * bit_interval_us / 1e6
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    for capture in captures:
+        capture.start()
+    threads = [threading.Thread(target=feed, args=(r,)) for r in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for capture in captures:
+        capture.stop()
+
+    bits = 0
+    for r in range(readers):
+        assert len(received[r]) == len(sent[r]), f"reader {r}: {len(received[r])} of {len(sent[r])} frames"
+        for (value, bit_count), frame in zip(sent[r], received[r]):
+            assert (frame.value, frame.bit_count) == (value, bit_count), (r, frame, value, bit_count)
+            bits += bit_count
+    return sum(len(s) for s in sent), bits / seconds / readers, sum(c.ring.full for c in captures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--producers', type=int, default=4)
+    parser.add_argument('--edges', type=int, default=200_000, help="edges per producer")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    rate, full = ring_stress(args.producers, args.edges)
+    print(f"Ring stress             : {args.producers} producers x {args.edges:,} edges, none lost or reordered")
+    print(f"                          {rate:,.0f} edges/s, producers waited on a full ring {full} times")
+
+    frames, bit_rate, full = reader_stress(args.readers, args.seconds, random.Random(8))
+    print(f"Reader stress           : {args.readers} readers, {frames:,} frames, all assembled exactly")
+    print(f"                          {bit_rate:,.0f} bits/s per reader "
+          f"({bit_rate / (1e6 / REAL_BIT_INTERVAL_US):.1f}x a real reader), ring full {full} times")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+C++ Wiegand capture daemon to Python over its Unix socket, with simulated edges:
+builds Indala/indalaPigpioWiegandReader.cpp with -DSIMULATED_EDGES (no pigpio),
+which calls its own edge callback the way pigpio would, and reads the frames
+with WiegandSocketClient. Measures frames per second flat out (to one and to
+two clients), latency from the callback closing a frame to Python holding it,
+directly and as a Tap from WiegandSocketSource, at a steady frame rate, and
+checks every frame's bits, 32-bit tick wrap and frames over 64 bits.
+
+Usage: python3 bench/bench_wiegand_socket.py [--frames 200000] [--rate 1000] [--seconds 3]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from common.reader_daemon import WiegandSocketSource
+from common.wiegand_socket import OVERFLOW, WiegandSocketClient
+
+SOURCE = os.path.join(ROOT, 'Indala', 'indalaPigpioWiegandReader.cpp')
+BIT_INTERVAL_US = 2000  # As the simulated reader sends them
+MASK = (1 << 64) - 1
+
+
+def frame_pattern(i):
+    # Same SplitMix64 as the simulated reader: frame i's bits, first bit most significant
+    z = (i + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def expected_value(i, bits):
+    return frame_pattern(i) >> (64 - bits) if bits <= 64 else frame_pattern(i)
+
+
+def build(tmp):
+    compiler = shutil.which('g++')
+    if compiler is None:
+        sys.exit("g++ is needed to build the simulated capture daemon")
+    binary = os.path.join(tmp, 'wiegand_sim')
+    subprocess.run([compiler, '-O2', '-std=c++17', '-Wall', '-DSIMULATED_EDGES', '-o', binary, SOURCE, '-pthread'],
+                   check=True)
+    return binary
+
+
+class SimulatedReader:
+    """
+    The simulated daemon in a subprocess. It waits for the first client, sends
+    its frames, and closes the connections once every frame has been sent.
+    """
+
+    def __init__(self, binary, tmp, frames, bits, rate):
+        self.path = os.path.join(tmp, 'wiegand.sock')
+        self.process = subprocess.Popen([binary, self.path, str(frames), str(bits), str(rate)], cwd=tmp,
+                                        stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.path):
+            assert self.process.poll() is None, "simulated daemon exited"
+            assert time.monotonic() < deadline, "simulated daemon is not listening"
+            time.sleep(0.001)
+
+    def wait(self):
+        assert self.process.wait(timeout=30) == 0, "simulated daemon failed"
+
+
+async def read_all(path, clients=1, on_record=None):
+    # Every record each client gets until the daemon closes; returns (records per client, dropped, seconds)
+    connected = [WiegandSocketClient(path) for _ in range(clients)]
+    for client in connected:
+        await client.connect()
+    start = time.perf_counter()
+
+    async def drain(client):
+        records = []
+        async for record in client:
+            if on_record:
+                on_record(record)
+            records.append(record)
+        client.close()
+        return records
+
+    received = await asyncio.gather(*(drain(client) for client in connected))
+    return received, sum(client.dropped for client in connected), time.perf_counter() - start
+
+
+def check_frames(records, count, bits):
+    assert len(records) == count, f"{len(records)} of {count} frames"
+    wrapped = 0
+    for i, record in enumerate(records):
+        frame = record.frame
+        assert record.seq == i and frame.bit_count == bits, (i, record)
+        assert frame.value == expected_value(i, bits), f"frame {i}: {frame.value:x}"
+        assert bool(record.flags & OVERFLOW) == (bits > 64), (i, record.flags)
+        assert (frame.last_tick - frame.first_tick) & 0xFFFFFFFF == (bits - 1) * BIT_INTERVAL_US
+        wrapped += frame.last_tick < frame.first_tick
+    return wrapped
+
+
+def run(binary, tmp, frames, bits, rate, clients=1, on_record=None):
+    reader = SimulatedReader(binary, tmp, frames, bits, rate)
+    received, dropped, seconds = asyncio.run(read_all(reader.path, clients, on_record))
+    reader.wait()
+    return received, dropped, seconds
+
+
+async def taps_from_source(path, count):
+    # (tap latencies in seconds, taps) through WiegandSocketSource into a tap queue
+    source = WiegandSocketSource('bench', path, min_bits=26, retry=0.01)
+    taps = asyncio.Queue()
+    task = asyncio.create_task(source.run(taps))
+    latencies = []
+    credentials = []
+    for _ in range(count):
+        tap = await taps.get()
+        latencies.append(time.monotonic() - tap.detected_at)
+        credentials.append(tap.credential)
+    task.cancel()
+    source.close()
+    return latencies, credentials
+
+
+def percentiles(times):
+    times = sorted(times)
+    return times[len(times) // 2], times[int(len(times) * 0.99)], times[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=200_000)
+    parser.add_argument('--rate', type=int, default=1000, help="frames per second for the latency runs")
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = build(tmp)
+
+        # Flat out: the daemon waits on the ring whenever Python falls behind, so nothing is dropped
+        print(f"{'flat out, 26-bit frames':<32}{'frames/s':>12}{'dropped':>9}")
+        throughput = {}
+        for clients in (1, 2):
+            received, dropped, seconds = run(binary, tmp, args.frames, 26, 0, clients)
+            for records in received:
+                wrapped = check_frames(records, args.frames, 26)
+                assert wrapped, "ticks never wrapped"
+            throughput[clients] = args.frames / seconds
+            print(f"{f'{clients} client(s)':<32}{throughput[clients]:>12.0f}{dropped:>9}")
+            assert dropped == 0
+
+        # Steady rate: from the callback closing a frame to the client holding it
+        count = int(args.rate * args.seconds)
+        latencies = []
+        received, dropped, _ = run(binary, tmp, count, 26, args.rate,
+                                   on_record=lambda record: latencies.append(time.monotonic_ns() - record.completed_ns))
+        check_frames(received[0], count, 26)
+        assert dropped == 0
+
+        # The same through WiegandSocketSource, as access_daemon.py reads it; 40-bit frames
+        # have no known format, so every one becomes a tap
+        reader = SimulatedReader(binary, tmp, count, 40, args.rate)
+        tap_latencies, credentials = asyncio.run(taps_from_source(reader.path, count))
+        reader.wait()
+        assert credentials == [bytes((40,)) + expected_value(i, 40).to_bytes(5, 'big') for i in range(count)]
+
+        print(f"{f'latency at {args.rate} frames/s, us':<32}{'p50':>8}{'p99':>8}{'max':>9}")
+        client_times = percentiles(latencies)
+        tap_times = percentiles(tap_latencies)
+        print(f"{'callback to client':<32}" + "".join(f"{t / 1000:>8.0f}" for t in client_times[:2])
+              + f"{client_times[2] / 1000:>9.0f}")
+        print(f"{'callback to tap queue':<32}" + "".join(f"{t * 1e6:>8.0f}" for t in tap_times[:2])
+              + f"{tap_times[2] * 1e6:>9.0f}")
+
+        # Frames over 64 bits keep their first 64 and are flagged
+        received, _, _ = run(binary, tmp, 100, 70, 0)
+        check_frames(received[0], 100, 70)
+        print("70-bit frames flagged as overflow with their first 64 bits; ticks checked across the 32-bit wrap.")
+
+    # Far beyond any reader (a frame takes 50 ms on the wire), within a millisecond of the callback
+    assert throughput[1] > 20_000, f"{throughput[1]:.0f} frames/s"
+    assert client_times[0] < 1_000_000 and tap_times[0] < 0.002
+
+
+if __name__ == "__main__":
+    main()
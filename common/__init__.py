@@ -0,0 +1 @@
+# Shared building blocks for the PN532, MFRC522 and Wiegand reader scripts.
@@ -0,0 +1,316 @@
+"""
+Time-windowed access policies, decided locally at tap time.
+
+A policy file (JSON) puts badges into groups; a group says when, and
+optionally at which doors, its badges are let in. Holidays replace the
+weekly schedule for the whole day, and a badge can expire:
+
+    {
+        "holidays": ["2026-12-25", "2027-01-01"],
+        "groups": {
+            "staff":    {"windows": [{"days": "mon-fri", "start": "07:00", "end": "19:00"}]},
+            "security": {"windows": [{"days": "all", "start": "00:00", "end": "24:00"}],
+                         "holiday_windows": [{"start": "00:00", "end": "24:00"}]},
+            "cleaners": {"windows": [{"days": ["mon", "thu"], "start": "20:00", "end": "02:00"}],
+                         "doors": ["front"]}
+        },
+        "badges": {
+            "041B1AA2F75780": {"groups": ["staff"]},
+            "047551A2F75780": {"groups": ["cleaners"], "expires": "2026-12-31"}
+        }
+    }
+
+Days are names, ranges ("fri-mon" wraps) or "all"; a window ending at or
+before its start runs past midnight. Groups without holiday_windows are
+shut out on holidays, and a group without doors may use every door. Badges
+are hex UIDs, as the readers report them; "expires" is a date (valid
+through that day) or a local date and time.
+
+compile_policy() turns every group's windows into a bitmap with one bit
+per minute of the week (1260 bytes) and one per minute of a holiday, and
+the badges into a dict of group indexes, so a decision is a dict lookup
+and a bit test per group of the badge, whatever the number of badges,
+groups and windows. Times are local, the wall clock of the building.
+
+    python3 -m common.access_policy check policy.json
+    python3 -m common.access_policy decide policy.json 041B1AA2F75780 --door front --at 2026-10-19T08:30
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+
+from common.credential_store import CredentialStore
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# decide() results
+GRANTED = "granted"
+UNKNOWN = "unknown badge"
+EXPIRED = "expired"
+WRONG_DOOR = "not allowed at this door"
+OUTSIDE_SCHEDULE = "outside schedule"
+
+
+class Policy:
+    """
+    A compiled policy; see compile_policy(). Immutable, so any number of
+    readers can decide against it while a new one is being compiled.
+    """
+
+    def __init__(self, group_names, week, holiday, doors, badges, holidays):
+        self.group_names = group_names
+        self._week = week          # Per group: bytes, bit m set if minute-of-week m is open
+        self._holiday = holiday    # Per group: the same per minute of a holiday
+        self._doors = doors        # Per group: frozenset of door names, or None for all
+        self._badges = badges      # UID -> (group indexes, expiry as Unix time or None)
+        self.holidays = holidays   # Date ordinals
+        self._minute = (None, 0, 0)
+
+    @classmethod
+    def allow_all(cls, uids):
+        """
+        A policy that lets uids in at every door at any time.
+        """
+        return compile_policy({
+            'groups': {'all': {'windows': [{'days': 'all', 'start': '00:00', 'end': '24:00'}],
+                               'holiday_windows': [{'start': '00:00', 'end': '24:00'}]}},
+            'badges': {bytes(uid).hex(): {'groups': ['all']} for uid in uids},
+        })
+
+    def __len__(self):
+        return len(self._badges)
+
+    def __contains__(self, uid):
+        return self.allows(uid)
+
+    def allows(self, uid, door=None, now=None):
+        return self.decide(uid, door, now) == GRANTED
+
+    def decide(self, uid, door=None, now=None):
+        """
+        GRANTED, or why the badge is refused at door (any door if None) at
+        Unix time now (default: the current time).
+        """
+        if now is None:
+            now = time.time()
+        badge = self._badges.get(bytes(uid))
+        if badge is None:
+            return UNKNOWN
+        groups, expires = badge
+        if expires is not None and now >= expires:
+            return EXPIRED
+        _, minute, day = self._clock(now)
+        if day in self.holidays:
+            bitmaps, minute = self._holiday, minute % MINUTES_PER_DAY
+        else:
+            bitmaps = self._week
+        byte, bit = minute >> 3, 1 << (minute & 7)
+        reason = WRONG_DOOR
+        for group in groups:
+            doors = self._doors[group]
+            if door is not None and doors is not None and door not in doors:
+                continue
+            if bitmaps[group][byte] & bit:
+                return GRANTED
+            reason = OUTSIDE_SCHEDULE
+        return reason
+
+    def _clock(self, now):
+        # (Unix minute, minute of the week, date ordinal), local time. Time
+        # zone offsets are whole minutes, so this only changes every minute.
+        clock = self._minute
+        key = int(now // 60)
+        if clock[0] != key:
+            t = time.localtime(now)
+            clock = (key, t.tm_wday * MINUTES_PER_DAY + t.tm_hour * 60 + t.tm_min,
+                     datetime.date(t.tm_year, t.tm_mon, t.tm_mday).toordinal())
+            self._minute = clock
+        return clock
+
+
+def compile_policy(config):
+    """
+    Compile a policy from its parsed JSON. Raises ValueError for anything
+    malformed, naming the group or badge.
+    """
+    group_names = []
+    index = {}
+    week = []
+    holiday = []
+    doors = []
+    for name, group in config.get('groups', {}).items():
+        try:
+            week_bits = 0
+            for window in group.get('windows', ()):
+                start, length = _window(window)
+                for day in _days(window.get('days', 'all')):
+                    week_bits = _set_minutes(week_bits, day * MINUTES_PER_DAY + start, length, MINUTES_PER_WEEK)
+            holiday_bits = 0
+            for window in group.get('holiday_windows', ()):
+                start, length = _window(window)
+                holiday_bits = _set_minutes(holiday_bits, start, length, MINUTES_PER_DAY)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"group {name}: {e}") from None
+        index[name] = len(group_names)
+        group_names.append(name)
+        week.append(week_bits.to_bytes(MINUTES_PER_WEEK // 8, 'little'))
+        holiday.append(holiday_bits.to_bytes(MINUTES_PER_DAY // 8, 'little'))
+        doors.append(frozenset(group['doors']) if 'doors' in group else None)
+
+    badges = {}
+    interned = {}  # Badges in the same groups share one tuple
+    for uid, badge in config.get('badges', {}).items():
+        try:
+            groups = tuple(index[name] for name in badge.get('groups', ()))
+            expires = _expiry(badge['expires']) if badge.get('expires') else None
+            badges[bytes.fromhex(uid)] = (interned.setdefault(groups, groups), expires)
+        except KeyError as e:
+            raise ValueError(f"badge {uid}: unknown group {e}") from None
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"badge {uid}: {e}") from None
+
+    try:
+        holidays = frozenset(datetime.date.fromisoformat(day).toordinal() for day in config.get('holidays', ()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"holidays: {e}") from None
+    return Policy(group_names, week, holiday, doors, badges, holidays)
+
+
+def load_policy(path):
+    """
+    Load and compile a policy file. Raises ValueError if it is malformed.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path} is not a policy")
+    return compile_policy(config)
+
+
+class PolicyStore(CredentialStore):
+    """
+    A policy file, reloaded and swapped in when it changes like a
+    CredentialStore. `uid in store` asks whether the badge may open door
+    (any door if None) now, so it can stand in for a CredentialStore. Until
+    the file exists, the fallback UIDs are let in at any time.
+    """
+    description = "access policy"
+    entries = "badges"
+
+    def __init__(self, path, door=None, fallback=()):
+        self.door = door
+        self._policy = Policy.allow_all(fallback)
+        super().__init__(path)
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def __contains__(self, uid):
+        return self._policy.allows(uid, self.door)
+
+    def __len__(self):
+        return len(self._policy)
+
+    def allows(self, uid, door=None, now=None):
+        return self.decide(uid, door, now) == GRANTED
+
+    def decide(self, uid, door=None, now=None):
+        return self._policy.decide(uid, self.door if door is None else door, now)
+
+    def _load(self):
+        return load_policy(self.path)
+
+    def _install(self, policy):
+        self._policy = policy
+
+
+def _days(spec):
+    if isinstance(spec, str):
+        spec = [spec]
+    days = set()
+    for part in spec:
+        part = part.strip().lower()
+        if part == 'all':
+            days.update(range(7))
+        elif '-' in part:
+            first, last = (_day(day) for day in part.split('-', 1))
+            days.update(day % 7 for day in range(first, last + 1 if last >= first else last + 8))
+        else:
+            days.add(_day(part))
+    return sorted(days)
+
+
+def _day(name):
+    if name not in DAYS:
+        raise ValueError(f"unknown day {name}")
+    return DAYS.index(name)
+
+
+def _window(window):
+    # (start minute of the day, length in minutes)
+    start = _minute_of_day(window['start'])
+    end = _minute_of_day(window['end'])
+    if start == end:
+        raise ValueError(f"empty window {window['start']}-{window['end']}")
+    return start, (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+
+
+def _minute_of_day(text):
+    hours, minutes = (int(part) for part in text.split(':'))
+    minute = hours * 60 + minutes
+    if not 0 <= minutes < 60 or not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"bad time {text}")
+    return minute
+
+
+def _set_minutes(bits, start, length, period):
+    # Set length bits from start, wrapping around at period
+    end = start + length
+    bits |= ((1 << (min(end, period) - start)) - 1) << start
+    if end > period:
+        bits |= (1 << (end - period)) - 1
+    return bits
+
+
+def _expiry(text):
+    # A date is valid through that day; a date and time until then (local)
+    if 'T' not in text and ' ' not in text:
+        return time.mktime((datetime.date.fromisoformat(text) + datetime.timedelta(days=1)).timetuple())
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m common.access_policy",
+                                     description="Check an access policy file or try a decision.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help="compile the policy and summarize it")
+    check.add_argument('path')
+    decide = commands.add_parser('decide', help="decide a badge at a door and time")
+    decide.add_argument('path')
+    decide.add_argument('uid', help="hex UID")
+    decide.add_argument('--door')
+    decide.add_argument('--at', help="local date and time, e.g. 2026-10-19T08:30 (default: now)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        policy = load_policy(args.path)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    if args.command == 'check':
+        print(f"{len(policy)} badges in {len(policy.group_names)} groups, "
+              f"{len(policy.holidays)} holidays; compiled in {elapsed * 1000:.1f} ms")
+        return
+    now = datetime.datetime.fromisoformat(args.at).timestamp() if args.at else None
+    print(policy.decide(bytes.fromhex(args.uid), args.door, now))
+
+
+if __name__ == "__main__":
+    main()
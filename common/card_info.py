@@ -0,0 +1,245 @@
+"""
+Card identification from the PN532's InListPassiveTarget response.
+
+For a 106 kbps type A target the response is:
+
+    NbTg  Tg  SENS_RES (ATQA, 2 bytes)  SEL_RES (SAK)  NFCIDLength  NFCID1 (UID)  [ATS]
+
+read_passive_target() keeps only the UID; get_card_info() returns the rest
+too, as a CardInfo whose card_type comes from ATQA/SAK (NXP AN10833). SAK
+0x00 covers the whole Ultralight/NTAG family, which only GET_VERSION tells
+apart, so CardTypes remembers the resolved type per UID: a card seen before
+is dispatched to the right handler without another command.
+
+read_passive_target() also asks for a single target (MaxTg 1), so of two
+cards in the field together only the one that wins anticollision is seen,
+for as long as it stays there. read_targets() asks for up to MAX_TARGETS and
+returns a CardInfo for each; the PN532 lists them in one response, with an
+entry per target laid out as above from Tg on.
+"""
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+_COMMAND_INLISTPASSIVETARGET = 0x4A
+_COMMAND_INCOMMUNICATETHRU = 0x42
+_GET_VERSION = 0x60
+
+# The most targets the PN532 activates at once at 106 kbps type A
+MAX_TARGETS = 2
+# Room for one target with a 10-byte UID and an ATS
+_TARGET_RESPONSE_LENGTH = 30
+
+# atqa and sak are ints; ats is bytes (empty unless the card speaks ISO14443-4)
+CardInfo = namedtuple('CardInfo', 'uid atqa sak card_type ats')
+
+MIFARE_CLASSIC_1K = "MiFare Classic 1K"
+MIFARE_CLASSIC_4K = "MiFare Classic 4K"
+MIFARE_MINI = "MiFare Mini"
+MIFARE_PLUS_SL2 = "MiFare Plus (SL2)"
+MIFARE_ULTRALIGHT = "MiFare Ultralight"  # Or an NTAG, until GET_VERSION says which
+MIFARE_ULTRALIGHT_EV1 = "MiFare Ultralight EV1"
+NTAG213 = "NTAG213"
+NTAG215 = "NTAG215"
+NTAG216 = "NTAG216"
+MIFARE_DESFIRE = "MiFare DESFire"
+ISO14443_4 = "ISO14443-4"  # MiFare Plus SL3, smart cards, phones
+UNKNOWN = "Unknown"
+
+MIFARE_CLASSIC_TYPES = frozenset((MIFARE_CLASSIC_1K, MIFARE_CLASSIC_4K, MIFARE_MINI))
+NTAG_TYPES = frozenset((MIFARE_ULTRALIGHT, MIFARE_ULTRALIGHT_EV1, NTAG213, NTAG215, NTAG216))
+
+SAK_TYPES = {
+    0x00: MIFARE_ULTRALIGHT,
+    0x08: MIFARE_CLASSIC_1K,
+    0x09: MIFARE_MINI,
+    0x10: MIFARE_PLUS_SL2,
+    0x11: MIFARE_PLUS_SL2,
+    0x18: MIFARE_CLASSIC_4K,
+    0x28: MIFARE_CLASSIC_1K,  # SmartMX with Classic emulation
+    0x38: MIFARE_CLASSIC_4K,
+}
+
+# GET_VERSION (product type, storage size) -> type
+VERSION_TYPES = {
+    (0x03, 0x0B): MIFARE_ULTRALIGHT_EV1,
+    (0x03, 0x0E): MIFARE_ULTRALIGHT_EV1,
+    (0x04, 0x0F): NTAG213,
+    (0x04, 0x11): NTAG215,
+    (0x04, 0x13): NTAG216,
+}
+
+
+def identify(atqa, sak):
+    """
+    The card type for an ATQA/SAK pair, before GET_VERSION.
+    """
+    card_type = SAK_TYPES.get(sak)
+    if card_type is not None:
+        return card_type
+    if sak & 0x20:
+        return MIFARE_DESFIRE if atqa == 0x0344 else ISO14443_4
+    return UNKNOWN
+
+
+def parse_target(response):
+    """
+    CardInfo for the first target in an InListPassiveTarget response (from
+    NbTg on, as process_response() returns it), or None if there is none.
+    """
+    if not response or response[0] == 0:
+        return None
+    return _parse_entry(response, 1)[0]
+
+
+def parse_targets(response):
+    """
+    CardInfo for every target in an InListPassiveTarget response, in the
+    order the PN532 numbered them (Tg 1, 2).
+    """
+    targets = []
+    offset = 1
+    for _ in range(response[0] if response else 0):
+        info, offset = _parse_entry(response, offset)
+        targets.append(info)
+    return targets
+
+
+def _parse_entry(response, offset):
+    # Tg  ATQA (2)  SAK  UID length  UID  [ATS, its first byte the length];
+    # returns the CardInfo and the offset of the next entry
+    if len(response) < offset + 5:
+        raise RuntimeError("Truncated InListPassiveTarget response")
+    uid_length = response[offset + 4]
+    uid_start = offset + 5
+    if uid_length > 10 or len(response) < uid_start + uid_length:
+        raise RuntimeError("Found card with unexpectedly long UID!")
+    atqa = response[offset + 1] << 8 | response[offset + 2]
+    sak = response[offset + 3]
+    uid = bytes(response[uid_start:uid_start + uid_length])
+    end = uid_start + uid_length
+    ats = b''
+    if sak & 0x20 and len(response) > end:
+        ats = bytes(response[end:end + response[end]])
+        end += len(ats)
+    return CardInfo(uid, atqa, sak, identify(atqa, sak), ats), end
+
+
+def get_card_info(pn532, timeout=1):
+    """
+    Like PN532.get_passive_target(), but returns a CardInfo.
+    """
+    response = pn532.process_response(_COMMAND_INLISTPASSIVETARGET, response_length=_TARGET_RESPONSE_LENGTH,
+                                      timeout=timeout)
+    return parse_target(response)
+
+
+def read_card_info(pn532, card_baud=0x00, timeout=1):
+    """
+    Like PN532.read_passive_target(), but returns a CardInfo.
+    """
+    if not pn532.listen_for_passive_target(card_baud=card_baud, timeout=timeout):
+        return None
+    return get_card_info(pn532, timeout)
+
+
+def listen_for_targets(pn532, max_targets=MAX_TARGETS, card_baud=0x00, timeout=1):
+    """
+    Like PN532.listen_for_passive_target(), but asks the PN532 for up to
+    max_targets cards. Returns False if it did not acknowledge the command.
+    """
+    if max_targets == 1:
+        return pn532.listen_for_passive_target(card_baud=card_baud, timeout=timeout)
+    try:
+        return pn532.send_command(_COMMAND_INLISTPASSIVETARGET, params=[max_targets, card_baud], timeout=timeout)
+    except _busy_error():
+        return False
+
+
+def get_targets(pn532, timeout=1):
+    """
+    CardInfo for each card found by the pending InListPassiveTarget; an
+    empty list if none answered within timeout seconds.
+    """
+    response = pn532.process_response(_COMMAND_INLISTPASSIVETARGET,
+                                      response_length=1 + _TARGET_RESPONSE_LENGTH * MAX_TARGETS, timeout=timeout)
+    return parse_targets(response)
+
+
+def read_targets(pn532, max_targets=MAX_TARGETS, card_baud=0x00, timeout=1):
+    """
+    Every card in the field, up to max_targets, from one InListPassiveTarget.
+    MIFARE and NTAG commands afterwards go to the first (Tg 1).
+    """
+    if not listen_for_targets(pn532, max_targets, card_baud, timeout):
+        return []
+    return get_targets(pn532, timeout)
+
+
+def _busy_error():
+    # adafruit_pn532's BusyError, which listen_for_passive_target() treats as
+    # no ACK; looked up only if the library is loaded, so the fakes need none
+    module = sys.modules.get('adafruit_pn532.adafruit_pn532')
+    return getattr(module, 'BusyError', ())
+
+
+def get_version(pn532):
+    """
+    The 8-byte GET_VERSION answer of an Ultralight EV1 / NTAG21x, or None if
+    the card does not support it (and is halted until selected again).
+    """
+    response = pn532.call_function(_COMMAND_INCOMMUNICATETHRU, params=[_GET_VERSION], response_length=9)
+    if response is None or len(response) < 9 or response[0] != 0:
+        return None
+    return bytes(response[1:9])
+
+
+class CardTypes:
+    """
+    Per-UID cache of resolved card types, bounded LRU. An entry is only
+    used while the card answers with the same ATQA/SAK, so a different card
+    that happens to reuse a UID is identified afresh.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._types = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._types)
+
+    def resolve(self, pn532, info):
+        """
+        Return info with its final card_type, asking the card (GET_VERSION)
+        only the first time an Ultralight/NTAG UID is seen.
+        """
+        with self._lock:
+            cached = self._types.get(info.uid)
+            if cached is not None and cached[:2] == (info.atqa, info.sak):
+                self._types.move_to_end(info.uid)
+                self.hits += 1
+                return info._replace(card_type=cached[2])
+            self.misses += 1
+
+        card_type = info.card_type
+        if card_type == MIFARE_ULTRALIGHT:
+            version = get_version(pn532)
+            if version is None:
+                # A plain Ultralight; the failed command halted it
+                pn532.read_passive_target(timeout=0.1)
+            else:
+                card_type = VERSION_TYPES.get((version[2], version[6]), MIFARE_ULTRALIGHT)
+
+        with self._lock:
+            self._types[info.uid] = (info.atqa, info.sak, card_type)
+            self._types.move_to_end(info.uid)
+            while len(self._types) > self.max_entries:
+                self._types.popitem(last=False)
+        return info._replace(card_type=card_type)
+
+    def clear(self):
+        with self._lock:
+            self._types.clear()
@@ -0,0 +1,185 @@
+"""
+Hash-indexed credential store for authorized card UIDs.
+
+UIDs are kept in a frozenset so each tap is an O(1) lookup, and are loaded from
+a compact sorted binary file that can be replaced while the reader is running:
+
+    magic   4 bytes  b'CRED'
+    version 1 byte   1
+    count   4 bytes  big-endian number of records
+    records count x (1 byte UID length + UID bytes), sorted
+
+A background watcher swaps in a freshly loaded set when the file changes on disk
+or when request_reload() is called (e.g. from a SIGHUP handler). Lookups only
+ever see a complete set: the old one until the new file has loaded cleanly.
+
+Build a store from a text file with one hex UID per line:
+    python3 -m common.credential_store build uids.txt credentials.bin
+"""
+import logging
+import os
+import struct
+import sys
+import threading
+
+MAGIC = b'CRED'
+VERSION = 1
+HEADER = struct.Struct('>4sBI')
+
+
+def write_store(path, uids):
+    """
+    Write UIDs to path in the sorted binary format. The file is written to a
+    temporary name and renamed into place, so readers never see a partial file.
+    """
+    records = sorted(set(bytes(uid) for uid in uids))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        f.write(b''.join(bytes((len(uid),)) + uid for uid in records))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def read_store(path):
+    """
+    Load a credential file and return its UIDs as a frozenset of bytes.
+    Raises ValueError if the file is truncated or not a credential store.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is too short to be a credential store")
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} credential store")
+
+    uids = []
+    offset = HEADER.size
+    end = len(data)
+    for _ in range(count):
+        if offset >= end or offset + 1 + data[offset] > end:
+            raise ValueError(f"{path} is truncated after {len(uids)} of {count} records")
+        length = data[offset]
+        uids.append(data[offset + 1:offset + 1 + length])
+        offset += 1 + length
+    if offset != end:
+        raise ValueError(f"{path} has {end - offset} trailing bytes")
+    return frozenset(uids)
+
+
+class CredentialStore:
+    """
+    Set-like view of the authorized UIDs in a credential file.
+
+    If the file does not exist yet, the store starts with the fallback UIDs
+    (typically AUTHORIZED_UIDS) and picks the file up once it appears.
+    """
+    description = "credential store"
+    entries = "credentials"
+
+    def __init__(self, path, fallback=()):
+        self.path = path
+        self.loaded_signature = None
+        self._uids = frozenset(bytes(uid) for uid in fallback)
+        self._reload_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._watcher = None
+        self.reload()
+
+    def __contains__(self, uid):
+        # PN532 returns a bytearray, which is unhashable
+        return bytes(uid) in self._uids
+
+    def __len__(self):
+        return len(self._uids)
+
+    def reload(self):
+        """
+        Load the file if it changed since the last load.
+        Returns True if a new set was swapped in.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        # write_store() renames a new file into place, so the inode changes too
+        signature = (st.st_mtime_ns, st.st_ino, st.st_size)
+        if signature == self.loaded_signature:
+            return False
+        try:
+            loaded = self._load()
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to load {self.description} {self.path}: {e}")
+            return False
+        self._install(loaded)
+        self.loaded_signature = signature
+        logging.info(f"Loaded {len(loaded)} {self.entries} from {self.path}")
+        return True
+
+    def _load(self):
+        # Subclasses load other files with the same watching and swapping
+        return read_store(self.path)
+
+    def _install(self, uids):
+        # Rebinding the reference is atomic; lookups see the old or the new set
+        self._uids = uids
+
+    def request_reload(self):
+        """
+        Force a reload on the watcher thread. Safe to call from a signal handler.
+        """
+        self.loaded_signature = None
+        self._reload_event.set()
+
+    def start_watching(self, interval=1.0):
+        """
+        Start a daemon thread that reloads the file when it changes.
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                         name="credential-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+        self._stop_event.set()
+        self._reload_event.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def _watch(self, interval):
+        while not self._stop_event.is_set():
+            self._reload_event.wait(interval)
+            self._reload_event.clear()
+            if not self._stop_event.is_set():
+                self.reload()
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] != 'build':
+        print("Usage: python3 -m common.credential_store build <uids.txt> <credentials.bin>")
+        sys.exit(1)
+
+    uids = []
+    with open(sys.argv[2]) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                uids.append(bytes.fromhex(line))
+            except ValueError:
+                print(f"Invalid UID on line {line_number}: {line}")
+                sys.exit(1)
+
+    count = write_store(sys.argv[3], uids)
+    print(f"Wrote {count} credentials to {sys.argv[3]}")
+
+
+if __name__ == "__main__":
+    main()
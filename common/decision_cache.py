@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DecisionCache:
+    """
+    Bounded LRU cache of recent allow/deny decisions keyed by card ID.
+
+    Grants and denials expire separately: denials are cached too (negative
+    caching) but for a shorter time, so a newly enrolled card is not locked
+    out for long. Expired entries stay in the cache until evicted and can still
+    be read with a larger max_age, which is how the verifier falls back to the
+    last known decision when the server is slow or down.
+    """
+
+    def __init__(self, max_entries=4096, allow_ttl=300, deny_ttl=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.allow_ttl = allow_ttl
+        self.deny_ttl = deny_ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, card_id, decision):
+        """
+        Store a server decision (the /verify JSON body) for card_id.
+        """
+        with self._lock:
+            self._entries[card_id] = (decision, self.clock())
+            self._entries.move_to_end(card_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, card_id, max_age=None):
+        """
+        Return the cached decision for card_id, or None if there is none or it
+        is older than max_age. By default max_age is the TTL for its outcome.
+        """
+        with self._lock:
+            entry = self._entries.get(card_id)
+            if entry is None:
+                return None
+            decision, stored_at = entry
+            if max_age is None:
+                max_age = self.allow_ttl if decision.get("authorized") else self.deny_ttl
+            if self.clock() - stored_at > max_age:
+                return None
+            self._entries.move_to_end(card_id)
+            return decision
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,323 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from common import metrics
+
+# Door states
+LOCKED = "locked"
+UNLOCKED = "unlocked"
+
+# Relay types: a latching relay has SET (unlock) and UNSET (lock) coils that
+# are pulsed; a pulse relay has one pin, held high while the door is unlocked
+LATCHING = "latching"
+PULSE = "pulse"
+RELAY_TYPES = (LATCHING, PULSE)
+
+
+class RelayScheduler:
+    """
+    Runs relay actions at monotonic deadlines on a single background thread,
+    so the card polling loop never sleeps while a door is open.
+    """
+
+    def __init__(self, name="relay-scheduler"):
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+        self._draining = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def call_at(self, deadline, action):
+        """
+        Schedule action() to run at the given time.monotonic() deadline.
+        Returns a handle that can be passed to cancel().
+        """
+        entry = [deadline, next(self._counter), action]
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self._cond.notify()
+        return entry
+
+    def call_later(self, delay, action):
+        return self.call_at(time.monotonic() + delay, action)
+
+    def cancel(self, entry):
+        """
+        Cancel a scheduled action. Cancelling an action that already ran is a no-op.
+        """
+        with self._cond:
+            entry[2] = None
+
+    def stop(self, drain=True):
+        """
+        Stop the scheduler thread. With drain, actions that are already due or
+        scheduled (such as the end of a relay pulse) run first.
+        """
+        with self._cond:
+            if drain:
+                self._draining = True
+            else:
+                self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                action = None
+                while self._running:
+                    if self._draining:
+                        # Cancelled actions do not hold up shutdown
+                        while self._queue and self._queue[0][2] is None:
+                            heapq.heappop(self._queue)
+                        if not self._queue:
+                            return
+                    if not self._queue:
+                        self._cond.wait()
+                        continue
+                    remaining = self._queue[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        action = heapq.heappop(self._queue)[2]
+                        break
+                    self._cond.wait(remaining)
+                if not self._running:
+                    return
+            if action is None:
+                continue  # Cancelled
+            try:
+                action()
+            except Exception as e:
+                logging.error(f"Error running scheduled relay action: {e}")
+
+
+class Door:
+    """
+    Timer-driven door state machine for a latching relay with SET (unlock)
+    and UNSET (lock) coils, or a pulse relay on set_pin alone.
+
+    grant() returns immediately: the SET pulse, the relock deadline and the
+    UNSET pulse all run on the scheduler. A grant while the door is already
+    unlocked only pushes the relock deadline back; within cooldown seconds
+    of the door relocking, a grant is refused. A latching relay's pulses
+    never overlap: one that is due while the other coil's pulse is still
+    high starts when that pulse ends.
+
+    on_change, if given, is called with the new state (UNLOCKED or LOCKED)
+    whenever the door changes state.
+    """
+
+    def __init__(self, gpio, set_pin, unset_pin=None, hold_time=5, pulse_time=0.1, scheduler=None,
+                 on_change=None, relay=LATCHING, cooldown=0):
+        if relay not in RELAY_TYPES:
+            raise ValueError(f"Unknown relay type {relay!r}")
+        if relay == LATCHING and unset_pin is None:
+            raise ValueError("A latching relay needs an unset_pin")
+        self.gpio = gpio
+        self.set_pin = set_pin
+        self.unset_pin = unset_pin if relay == LATCHING else None
+        self.hold_time = hold_time
+        self.pulse_time = pulse_time
+        self.scheduler = scheduler or RelayScheduler()
+        self.on_change = on_change
+        self.relay = relay
+        self.cooldown = cooldown
+        self.state = LOCKED
+        self.relock_at = None
+        self.locked_at = None
+        self._relock_entry = None
+        self._pulse_end = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def pins(self):
+        return (self.set_pin,) if self.unset_pin is None else (self.set_pin, self.unset_pin)
+
+    def setup(self):
+        """
+        Configure the relay pins as outputs and drive them low.
+        """
+        for pin in self.pins:
+            self.gpio.setup(pin, self.gpio.OUT)
+            self.gpio.output(pin, self.gpio.LOW)
+
+    def grant(self):
+        """
+        Unlock the door, or extend the relock deadline if it is already unlocked.
+        Returns True if this call unlocked the door.
+        """
+        start = time.perf_counter_ns()
+        try:
+            return self._grant()
+        finally:
+            metrics.DOOR_GRANT.record(time.perf_counter_ns() - start)
+
+    def _grant(self):
+        with self._lock:
+            if self.state == LOCKED and self.locked_at is not None:
+                remaining = self.locked_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    logging.info(f"Door cooling down. Grant ignored for another {remaining:.1f} seconds.")
+                    return False
+            self.relock_at = time.monotonic() + self.hold_time
+            if self._relock_entry is not None:
+                self.scheduler.cancel(self._relock_entry)
+            self._relock_entry = self.scheduler.call_at(self.relock_at, self._relock)
+
+            if self.state == UNLOCKED:
+                logging.debug(f"Door already unlocked. Relock extended by {self.hold_time} seconds.")
+                return False
+
+            logging.info(f"Unlocking the door for {self.hold_time} seconds...")
+            self._set_state(UNLOCKED)
+            self._actuate(UNLOCKED)
+            return True
+
+    def lock(self):
+        """
+        Relock the door immediately, cancelling any pending relock.
+        """
+        with self._lock:
+            if self._relock_entry is not None:
+                self.scheduler.cancel(self._relock_entry)
+                self._relock_entry = None
+            if self.state == LOCKED:
+                return
+            self.relock_at = None
+            logging.info("Locking the door...")
+            self._set_state(LOCKED)
+            self._actuate(LOCKED)
+
+    def close(self):
+        """
+        Lock the door and stop the scheduler once the final pulse has finished.
+        """
+        self.lock()
+        self.scheduler.stop()
+
+    def _relock(self):
+        with self._lock:
+            if self.state != UNLOCKED or time.monotonic() < self.relock_at:
+                return
+            self.relock_at = None
+            self._relock_entry = None
+            logging.info("Hold time elapsed. Locking the door...")
+            self._set_state(LOCKED)
+            self._actuate(LOCKED)
+
+    def _set_state(self, state):
+        self.state = state
+        if state == LOCKED:
+            self.locked_at = time.monotonic()
+        if self.on_change is not None:
+            try:
+                self.on_change(state)
+            except Exception as e:
+                logging.error(f"Error in door state callback: {e}")
+
+    def _actuate(self, state):
+        if self.relay == LATCHING:
+            self._pulse(self.set_pin if state == UNLOCKED else self.unset_pin)
+        else:
+            gpio = self.gpio
+            self.scheduler.call_later(0, self._output(self.set_pin, gpio.HIGH if state == UNLOCKED else gpio.LOW))
+
+    def _pulse(self, pin):
+        # Never energize both coils: a pulse starts once the one before it has
+        # ended. Its LOW was scheduled first, so it runs first at that deadline.
+        gpio = self.gpio
+        now = time.monotonic()
+        start = max(now, self._pulse_end)
+        self._pulse_end = start + self.pulse_time
+        self.scheduler.call_at(start, self._output(pin, gpio.HIGH, start - now))
+        self.scheduler.call_at(self._pulse_end, lambda: gpio.output(pin, gpio.LOW))
+
+    def _output(self, pin, level, delay=0):
+        # The scheduler action that drives pin to level delay seconds from now,
+        # timing how late it ran
+        due = time.perf_counter_ns() + int(delay * 1e9)
+
+        def output():
+            self.gpio.output(pin, level)
+            metrics.RELAY_OUTPUT.record(max(0, time.perf_counter_ns() - due))
+        return output
+
+
+class DoorRegistry:
+    """
+    The doors on this Pi by name, built from config such as:
+
+        {"front": {"set_pin": 27, "unset_pin": 17, "hold_time": 5},
+         "gate": {"relay": "pulse", "pin": 22, "hold_time": 3, "cooldown": 10}}
+
+    relay defaults to "latching"; hold_time, pulse_time and cooldown to the
+    Door defaults. Doors are spread over shards RelayScheduler threads (one
+    per door by default), so a relay write that blocks, such as one to an
+    I2C relay board, never delays another door's actuation.
+
+    reserved maps pins used by something else (reader data lines, the PN532
+    IRQ) to their user; a door pin that is reserved or shared with another
+    door raises ValueError. on_change, if given, is called with the door's
+    name and its new state.
+    """
+
+    def __init__(self, gpio, config, shards=None, reserved=None, on_change=None):
+        owners = dict(reserved or {})
+        for name, door_config in config.items():
+            for pin in _door_pins(door_config):
+                if pin in owners:
+                    raise ValueError(f"Door {name} pin {pin} is already used by {owners[pin]}")
+                owners[pin] = f"door {name}"
+
+        shards = shards or max(len(config), 1)
+        self.schedulers = [RelayScheduler(name=f"relay-scheduler-{n}") for n in range(shards)]
+        self._doors = {}
+        for n, (name, door_config) in enumerate(config.items()):
+            relay = door_config.get('relay', LATCHING)
+            if relay == PULSE:
+                set_pin, unset_pin = door_config['pin'], None
+            else:
+                set_pin, unset_pin = door_config['set_pin'], door_config['unset_pin']
+            self._doors[name] = Door(
+                gpio, set_pin, unset_pin, hold_time=door_config.get('hold_time', 5),
+                pulse_time=door_config.get('pulse_time', 0.1), scheduler=self.schedulers[n % shards],
+                on_change=None if on_change is None else lambda state, name=name: on_change(name, state),
+                relay=relay, cooldown=door_config.get('cooldown', 0))
+
+    def __getitem__(self, name):
+        return self._doors[name]
+
+    def __contains__(self, name):
+        return name in self._doors
+
+    def __iter__(self):
+        return iter(self._doors)
+
+    def __len__(self):
+        return len(self._doors)
+
+    def items(self):
+        return self._doors.items()
+
+    def setup(self):
+        for door in self._doors.values():
+            door.setup()
+
+    def close(self):
+        """
+        Lock every door and stop the schedulers once the final pulses have finished.
+        """
+        for door in self._doors.values():
+            door.lock()
+        for scheduler in self.schedulers:
+            scheduler.stop()
+
+
+def _door_pins(door_config):
+    if door_config.get('relay', LATCHING) == PULSE:
+        return (door_config['pin'],)
+    return door_config['set_pin'], door_config['unset_pin']
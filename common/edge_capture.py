@@ -0,0 +1,322 @@
+"""
+Binary capture and replay of raw Wiegand edge streams.
+
+EdgeRecorder stores every (gpio, level, tick) that the pigpio callbacks see
+in a capture file; replay() feeds a capture back into a decoder callback
+(WiegandAssembler.edge, WiegandCapture.edge) at the original speed, faster,
+or as fast as it will go. Captures of noisy wiring can be examined offline,
+and decoder changes can be checked against the same edges every time.
+
+The file is a 16-byte header followed by fixed 8-byte little-endian records:
+
+    header  magic b'WGEC', version (u16), record size (u16),
+            capture start as Unix time (f64)
+    record  tick (u32), gpio (u8), level (u8), 2 bytes padding
+
+so record n is at 16 + 8 * n and EdgeFile can memory-map hours of capture
+and read it in chunks without loading it. EdgeRecorder writes out what it
+has and fsyncs the file every sync_interval seconds, so a crash or power
+cut loses at most the last second or so of edges; a record cut short by one
+is ignored.
+
+    python3 -m common.edge_capture info capture.wgec
+    python3 -m common.edge_capture decode capture.wgec 23 18
+"""
+import argparse
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+
+from common import wiegand_formats
+from common.wiegand import DEFAULT_FRAME_GAP_US, FALLING, TIMEOUT, WiegandAssembler, frame_bits, tick_diff
+
+MAGIC = b'WGEC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHd')
+RECORD = struct.Struct('<IBBxx')
+CHUNK = 65536  # Records EdgeFile unpacks at a time
+
+# Wiegand bits are at least ~1 ms apart; falling edges closer than this are noise
+GLITCH_US = 200
+
+Edge = namedtuple('Edge', 'gpio level tick')
+
+_SYNC = object()  # Writer queue marker: fsync what has been written
+
+
+class EdgeRecorder:
+    """
+    Records pigpio edge callbacks to a capture file. edge() packs the record
+    into a preallocated buffer; full buffers are written by a background
+    thread, so the callback never waits on the disk. Every sync_interval
+    seconds that thread also takes the partly filled buffer and fsyncs the
+    file, so edges reach the disk even when they trickle in. forward, if
+    given, is called with every edge afterwards, so edge() can stand in for
+    the decoder's own callback.
+
+    Watchdog timeouts (level 2) are not recorded unless timeouts is true;
+    replay() puts them back where the watchdog would have reported them.
+    """
+
+    def __init__(self, path, forward=None, timeouts=False, buffer_edges=4096, sync_interval=1.0):
+        self.path = path
+        self.forward = forward
+        self.timeouts = timeouts
+        self.sync_interval = sync_interval
+        self.edges = 0
+        self._size = buffer_edges * RECORD.size
+        self._buffer = bytearray(self._size)
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._pending = queue.SimpleQueue()
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, time.time()))
+        self._writer = threading.Thread(target=self._write, name="edge-recorder", daemon=True)
+        self._writer.start()
+
+    def edge(self, gpio, level, tick):
+        """
+        pigpio callback for the data lines.
+        """
+        if level != TIMEOUT or self.timeouts:
+            with self._lock:
+                RECORD.pack_into(self._buffer, self._offset, tick, gpio, level)
+                self._offset += RECORD.size
+                self.edges += 1
+                if self._offset == self._size:
+                    self._hand_off()
+        if self.forward is not None:
+            self.forward(gpio, level, tick)
+
+    def flush(self):
+        """
+        Write out everything recorded so far and wait until it is on the file.
+        """
+        done = threading.Event()
+        with self._lock:
+            self._hand_off()
+            self._pending.put(done)
+        done.wait()
+
+    def close(self):
+        self.flush()
+        self._pending.put(None)
+        self._writer.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _hand_off(self):
+        # Called with the lock held; the writer owns the buffer from here
+        if self._offset:
+            self._pending.put((self._buffer, self._offset))
+            self._buffer = bytearray(self._size)
+            self._offset = 0
+
+    def _write(self):
+        next_sync = time.monotonic() + self.sync_interval
+        unsynced = False
+        while True:
+            if time.monotonic() >= next_sync:
+                # Queued behind any full buffers, so edges stay in order
+                with self._lock:
+                    self._hand_off()
+                    self._pending.put(_SYNC)
+                next_sync = time.monotonic() + self.sync_interval
+            try:
+                item = self._pending.get(timeout=max(0.0, next_sync - time.monotonic()))
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            if item is _SYNC:
+                if unsynced:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    unsynced = False
+                continue
+            if isinstance(item, threading.Event):
+                self._file.flush()
+                item.set()
+                continue
+            buffer, length = item
+            self._file.write(memoryview(buffer)[:length])
+            unsynced = True
+
+
+class EdgeFile:
+    """
+    Read-only, memory-mapped view of a capture file: len(), indexing and
+    iteration yield Edge(gpio, level, tick). Raises ValueError if the file
+    is not a capture.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty, not an edge capture") from None
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is too short for an edge capture")
+        magic, version, record_size, self.started = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} edge capture")
+        self._count = (len(self._map) - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("edge index out of range")
+        tick, gpio, level = RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+        return Edge(gpio, level, tick)
+
+    def __iter__(self):
+        return self.edges()
+
+    def edges(self, start=0, stop=None, chunk=CHUNK):
+        """
+        Yield edges start..stop, unpacking chunk records at a time.
+        """
+        stop = self._count if stop is None else min(stop, self._count)
+        for first in range(start, stop, chunk):
+            last = min(first + chunk, stop)
+            data = self._map[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+            for tick, gpio, level in RECORD.iter_unpack(data):
+                yield Edge(gpio, level, tick)
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def replay(edges, callback, speed=1.0, idle_us=DEFAULT_FRAME_GAP_US):
+    """
+    Feed edges to callback(gpio, level, tick) with their recorded ticks, so
+    the decoder sees the original timing. speed 1.0 paces delivery like the
+    capture, 10 ten times faster, and None as fast as possible.
+
+    Where the capture has no watchdog timeouts, one is delivered idle_us after
+    an edge that is followed by a longer gap, and after the last edge, as the
+    pigpio watchdog would have. Returns the number of edges fed.
+    """
+    start = time.monotonic()
+    elapsed_us = 0
+    previous = None
+    count = 0
+
+    def wait(at_us):
+        if speed:
+            delay = start + at_us / 1e6 / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    for edge in edges:
+        if previous is not None:
+            gap = tick_diff(previous.tick, edge.tick)
+            if idle_us and gap > idle_us and TIMEOUT not in (edge.level, previous.level):
+                wait(elapsed_us + idle_us)
+                callback(previous.gpio, TIMEOUT, (previous.tick + idle_us) & 0xFFFFFFFF)
+            elapsed_us += gap
+            wait(elapsed_us)
+        callback(edge.gpio, edge.level, edge.tick)
+        previous = edge
+        count += 1
+    if previous is not None and idle_us and previous.level != TIMEOUT:
+        wait(elapsed_us + idle_us)
+        callback(previous.gpio, TIMEOUT, (previous.tick + idle_us) & 0xFFFFFFFF)
+    return count
+
+
+def summarize(edges, glitch_us=GLITCH_US):
+    """
+    Edge counts per (gpio, level), the span in microseconds, and the number
+    of falling edges within glitch_us of the previous one (noise or bounce).
+    """
+    counts = Counter()
+    span_us = 0
+    glitches = 0
+    last_falling = None
+    previous = None
+    for edge in edges:
+        counts[(edge.gpio, edge.level)] += 1
+        if previous is not None:
+            span_us += tick_diff(previous.tick, edge.tick)
+        if edge.level == FALLING:
+            if last_falling is not None and tick_diff(last_falling, edge.tick) < glitch_us:
+                glitches += 1
+            last_falling = edge.tick
+        previous = edge
+    return counts, span_us, glitches
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m common.edge_capture",
+                                     description="Inspect or decode a Wiegand edge capture.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help="edge counts, span and glitches")
+    info.add_argument('path')
+    decode = commands.add_parser('decode', help="replay into the Wiegand decoder and print frames")
+    decode.add_argument('path')
+    decode.add_argument('data0', type=int)
+    decode.add_argument('data1', type=int)
+    decode.add_argument('--frame-gap-us', type=int, default=DEFAULT_FRAME_GAP_US)
+    decode.add_argument('--speed', type=float, default=None, help="1 for the original timing (default: no pacing)")
+    args = parser.parse_args()
+
+    try:
+        capture = EdgeFile(args.path)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    with capture:
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture.started))
+        if args.command == 'info':
+            counts, span_us, glitches = summarize(capture)
+            print(f"{len(capture)} edges over {span_us / 1e6:.3f} s, captured from {started}")
+            for (gpio, level), count in sorted(counts.items()):
+                print(f"  GPIO{gpio} level {level}: {count}")
+            print(f"{glitches} falling edges within {GLITCH_US} us of the previous one")
+            return
+
+        def show(frame):
+            credential = wiegand_formats.decode(frame.value, frame.bit_count)
+            if credential is not None:
+                detail = f"{credential.format} facility {credential.facility_code} card {credential.card_number}"
+            elif wiegand_formats.formats_for(frame.bit_count):
+                detail = "parity error"
+            else:
+                detail = "unknown format"
+            print(f"tick {frame.first_tick:>10}  {frame.bit_count:>2} bits  {frame_bits(frame)}  {detail}")
+
+        assembler = WiegandAssembler(args.data0, args.data1, args.frame_gap_us, on_frame=show)
+        replay(capture, assembler.edge, speed=args.speed, idle_us=args.frame_gap_us)
+
+
+if __name__ == "__main__":
+    main()
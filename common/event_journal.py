@@ -0,0 +1,237 @@
+"""
+Append-only on-disk journal of access events (card reads, grants, denials,
+door opened/locked) that survives network outages and restarts.
+
+Events are JSON lines in numbered segment files. Writes are fsynced in
+batches: after fsync_every events or fsync_interval seconds, whichever comes
+first. The uploader reads synced events from a persisted cursor, and the
+journal deletes segments once the server has acknowledged every event in them.
+Nothing is kept in memory beyond the batch being read, so the backlog can grow
+to millions of events during an outage.
+
+The backlog is bounded on disk all the same: at most max_segments segments
+(default 32 of segment_bytes 4 MB, so 128 MB) are kept. Past that, the oldest
+segment is deleted with a warning when a new one is started, whether or not
+it was uploaded. A Pi with no server configured keeps its most recent events
+this way instead of filling the SD card.
+
+Every event carries an "id" made of the journal ID and a sequence number, so
+the server can drop duplicates when a batch is retried after a lost reply.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+# Event types
+CARD_READ = "card_read"
+GRANT = "grant"
+DENY = "deny"
+DOOR_OPENED = "door_opened"
+DOOR_LOCKED = "door_locked"
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class EventJournal:
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, fsync_every=64, fsync_interval=0.5,
+                 max_segments=32):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.journal_id = self._load_journal_id()
+        self._cursor_path = os.path.join(directory, "cursor.json")
+        self._cursor, committed_seq = self._load_cursor()
+
+        self._lock = threading.Lock()
+        self._new_events = threading.Condition(self._lock)
+        self._unsynced = 0
+        self._seq = committed_seq
+
+        segments = self._segments()
+        self._segment = segments[-1] if segments else self._cursor[0]
+        self._recover(segments)
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._trim()
+        self._synced_size = self._file.tell()
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    # --------------------- Writing ---------------------
+
+    def append(self, event_type, **fields):
+        """
+        Record an event and return it. The event is durable after the next
+        batched fsync; call sync() to force one.
+        """
+        with self._lock:
+            self._seq += 1
+            event = {"id": f"{self.journal_id}-{self._seq}", "seq": self._seq,
+                     "type": event_type, "time": time.time()}
+            event.update(fields)
+            self._file.write(json.dumps(event, separators=(',', ':')).encode() + b'\n')
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync_locked()
+            return event
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+
+    def _sync_locked(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._synced_size = self._file.tell()
+            if self._synced_size >= self.segment_bytes:
+                self._roll_locked()
+            self._new_events.notify_all()
+
+    def _roll_locked(self):
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._synced_size = 0
+        self._trim()
+
+    def _trim(self):
+        # Keep the newest max_segments segments, the one being written included
+        segments = self._segments()
+        for old in segments[:max(0, len(segments) - self.max_segments)]:
+            path = self._segment_path(old)
+            logging.warning(f"Event journal is over {self.max_segments} segments; "
+                            f"dropping {path} without uploading it")
+            os.remove(path)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+
+    # --------------------- Reading ---------------------
+
+    def read_batch(self, max_events):
+        """
+        Return up to max_events synced events after the committed cursor, and
+        the cursor to pass to commit() once the server has accepted them.
+        """
+        events = []
+        segment, offset = self._cursor
+        while len(events) < max_events:
+            with self._lock:
+                current, synced_size = self._segment, self._synced_size
+            if segment > current:
+                break
+            path = self._segment_path(segment)
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    limit = synced_size if segment == current else None
+                    while len(events) < max_events:
+                        if limit is not None and offset >= limit:
+                            break
+                        line = f.readline()
+                        if not line.endswith(b'\n'):
+                            break
+                        offset += len(line)
+                        events.append(json.loads(line))
+            except FileNotFoundError:
+                pass
+            if len(events) >= max_events or segment == current:
+                break
+            segment, offset = segment + 1, 0
+        return events, (segment, offset)
+
+    def commit(self, cursor):
+        """
+        Persist the upload cursor and delete segments that are fully uploaded.
+        """
+        segment, offset = cursor
+        state = {"segment": segment, "offset": offset, "seq": self._seq}
+        tmp_path = f"{self._cursor_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._cursor_path)
+        self._cursor = (segment, offset)
+        for old in self._segments():
+            if old < segment:
+                os.remove(self._segment_path(old))
+
+    def wait_for_events(self, timeout):
+        """
+        Block until new events are synced or timeout seconds pass.
+        """
+        with self._new_events:
+            self._new_events.wait(timeout)
+
+    def pending_segments(self):
+        return len(self._segments())
+
+    # --------------------- Startup ---------------------
+
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{index:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        indexes = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                indexes.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(indexes)
+
+    def _load_journal_id(self):
+        path = os.path.join(self.directory, "journal_id")
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            journal_id = uuid.uuid4().hex[:12]
+            with open(path, 'w') as f:
+                f.write(journal_id)
+            return journal_id
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_path) as f:
+                state = json.load(f)
+            return (state["segment"], state["offset"]), state["seq"]
+        except FileNotFoundError:
+            return (0, 0), 0
+
+    def _recover(self, segments):
+        """
+        Drop a torn final record left by a crash mid-write, and continue the
+        sequence from the last record on disk.
+        """
+        for index in reversed(segments):
+            path = self._segment_path(index)
+            with open(path, 'rb') as f:
+                data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                logging.warning(f"Discarding {len(data) - end} bytes of a torn event in {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            if end:
+                last = data[data.rfind(b'\n', 0, end - 1) + 1:end]
+                self._seq = max(self._seq, json.loads(last)["seq"])
+                return
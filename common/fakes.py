@@ -0,0 +1,667 @@
+"""
+In-memory stand-ins for the Raspberry Pi hardware libraries, so the reader
+logic can be exercised and benchmarked off-Pi.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from common import mifare_classic
+
+
+class FakeGPIO:
+    """
+    Mimics the subset of RPi.GPIO used by the door scripts and records every
+    output change as (time.monotonic(), pin, level). Inputs are driven with
+    drive(), which runs add_event_detect() callbacks on matching edges.
+
+    output_time makes each output() take that long before the level changes,
+    like a relay board behind an I2C port expander.
+    """
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, output_time=0):
+        self.output_time = output_time
+        self.levels = {}
+        self.history = []
+        self._edge_callbacks = {}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.levels.setdefault(pin, self.HIGH if pull_up_down == self.PUD_UP else self.LOW)
+
+    def output(self, pin, level):
+        if self.output_time:
+            time.sleep(self.output_time)
+        with self._lock:
+            self.levels[pin] = level
+            self.history.append((time.monotonic(), pin, level))
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            self._edge_callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._edge_callbacks.pop(pin, None)
+
+    def drive(self, pin, level):
+        """
+        Set an input pin as external hardware would, firing edge callbacks.
+        """
+        with self._lock:
+            previous = self.levels.get(pin)
+            self.levels[pin] = level
+            edge, callback = self._edge_callbacks.get(pin, (None, None))
+        if callback is None or previous == level:
+            return
+        if edge == self.BOTH or edge == (self.RISING if level == self.HIGH else self.FALLING):
+            callback(pin)
+
+    def cleanup(self, *args):
+        with self._lock:
+            self.levels.clear()
+            self._edge_callbacks.clear()
+
+    def pulses(self, pin):
+        """
+        Return (start, duration) for every HIGH pulse recorded on pin.
+        """
+        pulses = []
+        start = None
+        for t, p, level in self.history:
+            if p != pin:
+                continue
+            if level == self.HIGH and start is None:
+                start = t
+            elif level == self.LOW and start is not None:
+                pulses.append((start, t - start))
+                start = None
+        return pulses
+
+
+class FakePN532:
+    """
+    Mimics PN532_I2C.read_passive_target(). Cards are presented by calling
+    present(uid); a read returns read_time seconds after a card is in the
+    field, and blocks for the full timeout if none arrives.
+    """
+
+    firmware_version = (0x32, 1, 6, 7)
+
+    def __init__(self, read_time=0.005):
+        self.read_time = read_time
+        self.reads = 0
+        self._uid = None
+        self._present = threading.Event()
+
+    def SAM_configuration(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def present(self, uid):
+        self._uid = uid
+        self._present.set()
+
+    def remove(self):
+        self._present.clear()
+        self._uid = None
+
+    def read_passive_target(self, card_baud=0, timeout=1):
+        self.reads += 1
+        if not self._present.wait(timeout):
+            return None
+        time.sleep(self.read_time)
+        return self._uid
+
+
+class SimulatedPN532:
+    """
+    Models a PN532 on I2C closely enough to count bus traffic. Every command
+    is an I2C write; like adafruit_pn532, the host then reads the one-byte
+    status every 10 ms until the PN532 is ready and reads the ACK or response
+    frame. InListPassiveTarget stays pending until a card is in the field,
+    and the response is ready detect_time after that.
+
+    present() takes a UID, or a card object (FakeCard, FakeMifareClassic,
+    FakeNTAG21x), which then answers with its own ATQA/SAK and the MIFARE,
+    NTAG and GET_VERSION commands; each of those is an InDataExchange or
+    InCommunicateThru that takes exchange_time on the air. Several presented
+    together are in the field at once and win anticollision in that order:
+    InListPassiveTarget returns as many as its MaxTg asks for, taking
+    detect_time for each, and later commands go to the first.
+
+    With a FakeGPIO and irq_pin, the active-low IRQ output is driven too: low
+    while an ACK or response is waiting to be read.
+
+    For fault injection, every fail_every-th transaction raises OSError (a
+    NAK, as busio reports it); with wedge, every later one fails too until
+    reset() pulses RSTPD_N, which takes reset_time like adafruit_pn532.
+    """
+    STATUS_POLL = 0.01
+
+    def __init__(self, gpio=None, irq_pin=None, detect_time=0.005, fail_every=None, wedge=False,
+                 reset_time=0.2, exchange_time=0.003):
+        self.gpio = gpio
+        self.irq_pin = irq_pin
+        self.detect_time = detect_time
+        self.exchange_time = exchange_time
+        self.fail_every = fail_every
+        self.wedge = wedge
+        self.reset_time = reset_time
+        self.transactions = 0
+        self.commands = 0
+        self.faults = 0
+        self.resets = 0
+        self._wedged = False
+        self._field = []
+        self._card_at = None
+        self._pending_at = None
+        self._max_targets = 1
+        self._lock = threading.Lock()
+        if gpio is not None and irq_pin is not None:
+            gpio.drive(irq_pin, gpio.HIGH)
+
+    def present(self, card, *more):
+        with self._lock:
+            self._field = [card, *more]
+            self._card_at = time.monotonic()
+            self._schedule_response_locked()
+
+    def remove(self):
+        with self._lock:
+            self._field = []
+            self._card_at = None
+
+    @property
+    def _card(self):
+        # The card commands go to (Tg 1), unless it is a bare UID
+        card = self._field[0] if self._field else None
+        return card if hasattr(card, 'uid') else None
+
+    @property
+    def firmware_version(self):
+        self._command()
+        with self._lock:
+            self._transaction()  # Response frame
+        return (0x32, 1, 6, 7)
+
+    def SAM_configuration(self):
+        self._command()
+        with self._lock:
+            self._transaction()  # Response frame
+
+    def reset(self):
+        time.sleep(self.reset_time)
+        with self._lock:
+            self.resets += 1
+            self._wedged = False
+            self._pending_at = None
+        self._set_irq(False)
+
+    def listen_for_passive_target(self, card_baud=0, timeout=1):
+        return self.send_command(0x4A, params=[0x01, card_baud], timeout=timeout)
+
+    def send_command(self, command, params=(), timeout=1):
+        # Only InListPassiveTarget (MaxTg, BrTy) is modelled
+        self._command()
+        with self._lock:
+            self._max_targets = params[0]
+            self._pending_at = time.monotonic()
+            self._schedule_response_locked()
+        return True
+
+    def get_passive_target(self, timeout=1):
+        response = self.process_response(0x4A, response_length=30, timeout=timeout)
+        if response is None:
+            return None
+        return response[6:6 + response[5]]
+
+    def process_response(self, command, response_length=0, timeout=1):
+        # Only the pending InListPassiveTarget has a deferred response
+        if not self._wait_ready(self._response_ready, timeout):
+            return None
+        with self._lock:
+            self._transaction()  # Response frame
+            targets = self._field[:self._max_targets]
+            self._pending_at = None
+        self._set_irq(False)
+        response = bytes((len(targets),))
+        for tg, card in enumerate(targets, 1):
+            if not hasattr(card, 'uid'):
+                response += bytes((tg, 0x00, 0x04, 0x08, len(card))) + bytes(card)
+                continue
+            card.select()
+            response += bytes((tg, card.atqa >> 8, card.atqa & 0xFF, card.sak, len(card.uid))) + card.uid + card.ats
+        return response
+
+    def call_function(self, command, response_length=0, params=(), timeout=1):
+        # InCommunicateThru GET_VERSION is the only raw command modelled
+        card = self._exchange()
+        if command == 0x42 and list(params) == [0x60] and card is not None:
+            version = card.get_version()
+            if version is not None:
+                return bytes((0x00,)) + version
+        return bytes((0x01,))  # Timeout status: the card did not answer
+
+    def read_passive_target(self, card_baud=0, timeout=1):
+        if not self.listen_for_passive_target(card_baud, timeout):
+            return None
+        return self.get_passive_target(timeout)
+
+    def mifare_classic_authenticate_block(self, uid, block_number, key_number, key):
+        card = self._exchange()
+        return card is not None and card.uid == bytes(uid) and card.authenticate(block_number, key_number, key)
+
+    def mifare_classic_read_block(self, block_number):
+        card = self._exchange()
+        return None if card is None else card.read(block_number)
+
+    def mifare_classic_write_block(self, block_number, data):
+        card = self._exchange()
+        return card is not None and card.write(block_number, data)
+
+    def ntag2xx_read_block(self, block_number):
+        card = self._exchange()
+        data = None if card is None else card.read(block_number)
+        return None if data is None else data[:4]
+
+    def ntag2xx_write_block(self, block_number, data):
+        card = self._exchange()
+        return card is not None and card.write(block_number, data)
+
+    def _exchange(self):
+        # InDataExchange: the command, then the card's answer exchange_time later
+        self._command()
+        ready_at = time.monotonic() + self.exchange_time
+        self._wait_ready(lambda: time.monotonic() >= ready_at, 1)
+        with self._lock:
+            self._transaction()  # Response frame
+            return self._card
+
+    def _command(self):
+        # Command frame, then the ACK: IRQ low until the host has read it
+        with self._lock:
+            self.commands += 1
+            self._transaction()
+            # A new command aborts a pending InListPassiveTarget
+            self._pending_at = None
+        self._set_irq(True)
+        self._wait_ready(lambda: True, 1)
+        with self._lock:
+            self._transaction()  # ACK frame
+        self._set_irq(False)
+
+    def _wait_ready(self, ready, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._transaction()  # Status byte
+            if ready():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.STATUS_POLL)
+
+    def _transaction(self):
+        # Called with the lock held
+        self.transactions += 1
+        if self._wedged:
+            raise OSError(121, "Remote I/O error")
+        if self.fail_every and self.transactions % self.fail_every == 0:
+            self.faults += 1
+            self._wedged = self.wedge
+            raise OSError(121, "Remote I/O error")
+
+    def _response_ready(self):
+        with self._lock:
+            ready_at = self._ready_at_locked()
+        return ready_at is not None and time.monotonic() >= ready_at
+
+    def _ready_at_locked(self):
+        if self._pending_at is None or self._card_at is None:
+            return None
+        found = min(len(self._field), self._max_targets)
+        return max(self._pending_at, self._card_at) + self.detect_time * found
+
+    def _schedule_response_locked(self):
+        ready_at = self._ready_at_locked()
+        if ready_at is None or self.irq_pin is None:
+            return
+        timer = threading.Timer(max(0, ready_at - time.monotonic()), self._raise_irq, args=(ready_at,))
+        timer.daemon = True
+        timer.start()
+
+    def _raise_irq(self, ready_at):
+        with self._lock:
+            still_ready = self._ready_at_locked() == ready_at
+        if still_ready:
+            self._set_irq(True)
+
+    def _set_irq(self, asserted):
+        if self.gpio is not None and self.irq_pin is not None:
+            self.gpio.drive(self.irq_pin, self.gpio.LOW if asserted else self.gpio.HIGH)
+
+
+class FakeCard:
+    """
+    A card for SimulatedPN532 that answers anticollision with its ATQA, SAK
+    and ATS and nothing else, like a DESFire or a phone. Any other command
+    halts it until it is selected again.
+    """
+
+    def __init__(self, uid, atqa=0x0344, sak=0x20, ats=b'\x06\x75\x77\x81\x02\x80', version=None):
+        self.uid = bytes(uid)
+        self.atqa = atqa
+        self.sak = sak
+        self.ats = ats if sak & 0x20 else b''
+        self.version = version
+        self.authentications = 0
+        self.halted = False
+
+    def select(self):
+        self.halted = False
+
+    def get_version(self):
+        if self.halted or self.version is None:
+            self.halted = True
+            return None
+        return self.version
+
+    def authenticate(self, block, key_type, key):
+        self.authentications += 1
+        self.halted = True
+        return False
+
+    def read(self, block):
+        self.halted = True
+        return None
+
+    def write(self, block, data):
+        self.halted = True
+        return False
+
+
+class FakeMifareClassic(FakeCard):
+    """
+    A MIFARE Classic 1K card for SimulatedPN532. Every sector is in the
+    transport configuration (both keys FF FF FF FF FF FF) unless keys maps
+    sector -> (key_a, key_b). Like the real card, a failed authentication or
+    an access outside the open sector halts it until it is selected again.
+    """
+
+    def __init__(self, uid, data=None, keys=None):
+        super().__init__(uid, atqa=0x0004 if len(uid) == 4 else 0x0044, sak=0x08)
+        self.memory = bytearray(mifare_classic.CARD_SIZE)
+        if data:
+            self.memory[:len(data)] = data
+        self.memory[:len(self.uid)] = self.uid  # Manufacturer block
+        for sector in range(mifare_classic.SECTORS):
+            key_a, key_b = (keys or {}).get(sector, (mifare_classic.DEFAULT_KEY, mifare_classic.DEFAULT_KEY))
+            self.set_keys(sector, key_a, key_b)
+        self._open_sector = None
+
+    def set_keys(self, sector, key_a, key_b):
+        start = mifare_classic.trailer_of(sector) * mifare_classic.BLOCK_SIZE
+        self.memory[start:start + 16] = bytes(key_a) + b'\xFF\x07\x80\x69' + bytes(key_b)
+
+    def select(self):
+        super().select()
+        self._open_sector = None
+
+    def authenticate(self, block, key_type, key):
+        self.authentications += 1
+        start = mifare_classic.trailer_of(mifare_classic.sector_of(block)) * mifare_classic.BLOCK_SIZE
+        expected = self.memory[start:start + 6] if key_type == mifare_classic.AUTH_A else \
+            self.memory[start + 10:start + 16]
+        if self.halted or bytes(key) != expected:
+            self._halt()
+            return False
+        self._open_sector = mifare_classic.sector_of(block)
+        return True
+
+    def read(self, block):
+        if not self._is_open(block):
+            return None
+        data = bytearray(self._block(block))
+        if mifare_classic.is_trailer(block):
+            data[:6] = bytes(6)  # Key A never reads back
+        return bytes(data)
+
+    def write(self, block, data):
+        if block == 0 or len(data) != mifare_classic.BLOCK_SIZE or not self._is_open(block):
+            return False
+        self.memory[block * mifare_classic.BLOCK_SIZE:(block + 1) * mifare_classic.BLOCK_SIZE] = data
+        return True
+
+    def _block(self, block):
+        return self.memory[block * mifare_classic.BLOCK_SIZE:(block + 1) * mifare_classic.BLOCK_SIZE]
+
+    def _is_open(self, block):
+        if self.halted or mifare_classic.sector_of(block) != self._open_sector:
+            self._halt()
+            return False
+        return True
+
+    def _halt(self):
+        self.halted = True
+        self._open_sector = None
+
+
+class FakeNTAG21x(FakeCard):
+    """
+    An NTAG213/215/216 for SimulatedPN532: 4-byte pages, READ returns four
+    pages (16 bytes) wrapping around at the end of memory, WRITE takes one.
+    user_data is written from page 4, right after the capability container.
+    """
+    MODELS = {
+        # pages, capability container size byte, GET_VERSION storage size
+        'NTAG213': (45, 0x12, 0x0F),
+        'NTAG215': (135, 0x3E, 0x11),
+        'NTAG216': (231, 0x6D, 0x13),
+    }
+
+    def __init__(self, uid, model='NTAG213', user_data=b''):
+        pages, cc_size, storage_size = self.MODELS[model]
+        super().__init__(uid, atqa=0x0044, sak=0x00,
+                         version=bytes((0x00, 0x04, 0x04, 0x02, 0x01, 0x00, storage_size, 0x03)))
+        self.model = model
+        self.pages = pages
+        self.memory = bytearray(pages * 4)
+        self.memory[:3] = self.uid[:3]
+        self.memory[4:8] = self.uid[3:7]
+        self.memory[12:16] = bytes((0xE1, 0x10, cc_size, 0x00))
+        self.memory[16:16 + len(user_data)] = user_data
+        self.reads = 0
+
+    def read(self, page):
+        if self.halted or page >= self.pages:
+            self.halted = True
+            return None
+        self.reads += 1
+        start = page * 4
+        return bytes((self.memory * 2)[start:start + 16])
+
+    def write(self, page, data):
+        if self.halted or not 4 <= page < self.pages or len(data) != 4:
+            self.halted = True
+            return False
+        self.memory[page * 4:page * 4 + 4] = data
+        return True
+
+
+class FakeMFRC522:
+    """
+    Mimics SimpleMFRC522. Cards are presented by calling present(card_id,
+    text); read_id_no_block() takes read_time and returns the ID or None, and
+    read() / read_id() block until a card is in the field.
+    """
+
+    def __init__(self, read_time=0.002):
+        self.read_time = read_time
+        self.reads = 0
+        self._card = None
+        self._present = threading.Event()
+
+    def present(self, card_id, text=""):
+        self._card = (card_id, text)
+        self._present.set()
+
+    def remove(self):
+        self._present.clear()
+        self._card = None
+
+    def read_no_block(self):
+        self.reads += 1
+        time.sleep(self.read_time)
+        return self._card or (None, None)
+
+    def read_id_no_block(self):
+        return self.read_no_block()[0]
+
+    def read(self):
+        while True:
+            self._present.wait()
+            card_id, text = self.read_no_block()
+            if card_id is not None:
+                return card_id, text
+
+    def read_id(self):
+        return self.read()[0]
+
+
+class _FakeCallback:
+    def __init__(self, pi, pin, func):
+        self._pi = pi
+        self.pin = pin
+        self.func = func
+
+    def cancel(self):
+        self._pi._remove_callback(self)
+
+
+class FakePi:
+    """
+    Mimics a pigpio.pi connection for Wiegand readers. Frames queued with
+    send_frame() are delivered as falling edges to the registered callbacks
+    at their scheduled times, on one callback thread as pigpio does. Ticks
+    are the scheduled times in microseconds, so they stay exact even when
+    delivery runs late. Watchdogs report TIMEOUT (level 2) every timeout_ms
+    while a line is idle.
+    """
+    connected = True
+
+    def __init__(self):
+        self.modes = {}
+        self.pulls = {}
+        self._callbacks = {}
+        self._watchdogs = {}
+        self._generation = {}
+        self._events = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="fake-pigpio", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def tick_at(when):
+        return int(when * 1_000_000) & 0xFFFFFFFF
+
+    def get_current_tick(self):
+        return self.tick_at(time.monotonic())
+
+    def set_mode(self, pin, mode):
+        self.modes[pin] = mode
+
+    def set_pull_up_down(self, pin, pud):
+        self.pulls[pin] = pud
+
+    def callback(self, pin, edge=0, func=None):
+        cb = _FakeCallback(self, pin, func)
+        with self._cond:
+            self._callbacks.setdefault(pin, []).append(cb)
+        return cb
+
+    def _remove_callback(self, cb):
+        with self._cond:
+            callbacks = self._callbacks.get(cb.pin, [])
+            if cb in callbacks:
+                callbacks.remove(cb)
+
+    def set_watchdog(self, pin, timeout_ms):
+        with self._cond:
+            self._watchdogs[pin] = timeout_ms
+            self._rearm(pin, time.monotonic())
+
+    def send_frame(self, data0_pin, data1_pin, value, bit_count, bit_interval_us=1000, at=None):
+        """
+        Queue a frame's falling edges, first bit first, starting at monotonic
+        time at (default now). Returns the time of the first edge.
+        """
+        start = time.monotonic() if at is None else at
+        with self._cond:
+            for i in range(bit_count):
+                pin = data1_pin if (value >> (bit_count - 1 - i)) & 1 else data0_pin
+                self._push(start + i * bit_interval_us / 1_000_000, pin, 0, None)
+            self._cond.notify()
+        return start
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _push(self, due, pin, level, generation):
+        heapq.heappush(self._events, (due, next(self._seq), pin, level, generation))
+
+    def _rearm(self, pin, since):
+        # A new edge or watchdog setting supersedes any pending timeout on pin
+        generation = self._generation.get(pin, 0) + 1
+        self._generation[pin] = generation
+        timeout_ms = self._watchdogs.get(pin, 0)
+        if timeout_ms:
+            self._push(since + timeout_ms / 1000, pin, 2, generation)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._events or self._events[0][0] > time.monotonic()):
+                    self._cond.wait(self._events[0][0] - time.monotonic() if self._events else None)
+                if not self._running:
+                    return
+                due, _, pin, level, generation = heapq.heappop(self._events)
+                if level == 2:
+                    if generation != self._generation.get(pin):
+                        continue
+                    self._rearm(pin, due)
+                elif pin in self._watchdogs:
+                    self._rearm(pin, due)
+                callbacks = [cb.func for cb in self._callbacks.get(pin, ())]
+            tick = self.tick_at(due)
+            for func in callbacks:
+                func(pin, level, tick)
@@ -0,0 +1,83 @@
+"""
+Chooses between the Raspberry Pi hardware libraries and the in-memory fakes
+in fakes.py, so the reader scripts run unchanged off-Pi.
+
+Set ACCESS_CONTROL_FAKE_HARDWARE=1 in the environment (or call use_fakes())
+to get fakes. The hardware libraries are only imported when a real device is
+asked for.
+"""
+import os
+
+from common import fakes
+
+# pigpio constants used by the scripts (same values as the pigpio module)
+INPUT = 0
+PUD_UP = 2
+FALLING_EDGE = 1
+
+_use_fakes = os.environ.get('ACCESS_CONTROL_FAKE_HARDWARE') == '1'
+_fake_gpio = None
+
+
+def use_fakes(enabled=True):
+    global _use_fakes
+    _use_fakes = enabled
+
+
+def using_fakes():
+    return _use_fakes
+
+
+def gpio():
+    """
+    RPi.GPIO, or one FakeGPIO shared by every caller.
+    """
+    global _fake_gpio
+    if _use_fakes:
+        if _fake_gpio is None:
+            _fake_gpio = fakes.FakeGPIO()
+        return _fake_gpio
+    import RPi.GPIO
+    return RPi.GPIO
+
+
+def pn532_i2c(reset_pin=6, req_pin=12, debug=False, irq_pin=None):
+    """
+    A PN532_I2C with RSTPD_N and P32 (H_Request) on the given BCM pins, or a
+    SimulatedPN532, which answers the raw commands (card_info.py) too.
+
+    With irq_pin, that pin carries the PN532's IRQ output for IrqCardReader
+    (see pn532_irq.py) and is left to GPIO edge detection, so req_pin is not
+    used; the fake then drives the pin.
+    """
+    if _use_fakes:
+        return fakes.SimulatedPN532(gpio(), irq_pin)
+    import board
+    import busio
+    from digitalio import DigitalInOut
+    from adafruit_pn532.i2c import PN532_I2C
+
+    reset = DigitalInOut(getattr(board, f"D{reset_pin}"))
+    req = DigitalInOut(getattr(board, f"D{req_pin}")) if irq_pin is None else None
+    i2c = busio.I2C(board.SCL, board.SDA)
+    return PN532_I2C(i2c, debug=debug, reset=reset, req=req)
+
+
+def mfrc522():
+    """
+    A SimpleMFRC522, or a FakeMFRC522.
+    """
+    if _use_fakes:
+        return fakes.FakeMFRC522()
+    from mfrc522 import SimpleMFRC522
+    return SimpleMFRC522()
+
+
+def pigpio_pi():
+    """
+    A pigpio.pi connection to the local pigpiod, or a FakePi.
+    """
+    if _use_fakes:
+        return fakes.FakePi()
+    import pigpio
+    return pigpio.pi()
@@ -0,0 +1,122 @@
+"""
+Structured, asynchronous, rotating logging for the reader processes.
+
+setup() puts a QueueHandler on the root logger and starts a QueueListener
+thread that owns the real handlers, so a pigpio callback or the door path
+only pays for putting a record on a queue; formatting, the console and the
+disk all happen on the listener. Every record is one JSON line:
+
+    {"ts": "2024-10-06T18:47:22.614+00:00", "level": "INFO", "logger": "root",
+     "msg": "card_read", "reader": "Indala Wiegand", "card_number": 1234}
+
+log_event() logs an event name with keyword fields, and builds nothing when
+its level is disabled. Plain logging.info(...) calls work too and come out
+with just "msg". The log file rotates at max_bytes, keeping backups old files.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+MAX_BYTES = 1024 * 1024
+BACKUPS = 5
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single JSON line. Fields passed through log_event()
+    or extra= become top-level keys; values JSON cannot encode are str()ed.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                                  .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message with a plain Formatter, which
+    # would bake the traceback into msg; keep it separate for the listener.
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup(path=None, level=logging.INFO, max_bytes=MAX_BYTES, backups=BACKUPS, console=True):
+    """
+    Route the root logger through a queue to a JSON console handler and, with
+    path, a rotating JSON log file. Replaces any handlers already installed.
+    The listener is stopped, after writing out what is queued, at exit.
+    """
+    global _listener
+    shutdown()
+    formatter = JsonFormatter()
+    handlers = []
+    if path is not None:
+        handlers.append(logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                             encoding='utf-8'))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    _listener = listener
+
+
+def shutdown():
+    """
+    Write out the queued records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Registered after logging's own exit hook, so it runs before handlers are closed
+atexit.register(shutdown)
+
+
+def log_event(event, level=logging.INFO, logger=None, **fields):
+    """
+    Log event (a short name such as "card_read") with fields as JSON keys.
+    Field names must not be LogRecord attributes such as name or msg.
+    """
+    logger = logger or logging.getLogger()
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra=fields)
@@ -0,0 +1,297 @@
+"""
+Counters and latency histograms for the tap path, served as Prometheus text.
+
+Each stage of a tap is timed with time.perf_counter_ns() into a Histogram
+of the access_stage_seconds family, labelled with the stage:
+
+    pn532_read        a PN532 read that found a card: in IRQ mode, fetching
+                      the response once IRQ fired; when polling, the whole
+                      read_* call, including waiting for the card
+    wiegand_decode    parity check and decoding of a complete Wiegand frame
+    credential_check  the credential store or access policy lookup
+    verify            VerifyClient.verify(), cache hits included
+    door_grant        Door.grant(), up to the relay pulse being scheduled
+    relay_output      from the relay pulse being scheduled to the GPIO write
+    tap               (access_daemon.py) from a card being read to its decision
+
+Histograms are HDR-style: counts in log-linear buckets, 32 per power of two
+of nanoseconds, so any recorded latency from 1 ns to 18 minutes is kept to
+within about 3% in a fixed 1152-slot list. Recording is a bit_length(), a
+shift and two increments, a fraction of a microsecond. Counters cover
+reads, grants, denies, PN532 bus errors and bad Wiegand frames.
+
+Updates take no lock; a lock would cost more than the update. CPython only
+switches threads at calls and backward jumps, so the read and write of a
+`+=` on a list slot or an attribute are never split by another thread.
+
+serve() starts a local HTTP server whose GET /metrics renders every metric
+in the Prometheus text format. A scrape copies each histogram's counts
+and sums them into cumulative buckets (BUCKETS, in seconds) on the server
+thread; the tap path never waits for it:
+
+    metrics.serve(9108)
+    curl -s http://127.0.0.1:9108/metrics
+"""
+import itertools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BITS = 6  # 2**(SUB_BITS - 1) = 32 buckets per power of two
+MAX_BITS = 40  # Latencies of 2**40 ns (18 minutes) or more share the last bucket
+_HALF = 1 << (SUB_BITS - 1)
+_SLOTS = (MAX_BITS - SUB_BITS + 2) * _HALF
+_LAST = _SLOTS - 1
+
+# Upper bounds, in seconds, of the cumulative buckets a scrape reports
+BUCKETS = tuple(round(base * 10.0 ** exponent, 9) for exponent in range(-6, 1) for base in (1, 2.5, 5)) + (10.0,)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _index(ns):
+    # The bucket for a latency in nanoseconds: exact below 64, then 32 per power of two
+    shift = ns.bit_length() - SUB_BITS
+    if shift <= 0:
+        return ns
+    return min((shift << (SUB_BITS - 1)) + (ns >> shift), _LAST)
+
+
+def _bounds(index):
+    # (lowest, highest + 1) nanoseconds recorded in a bucket
+    if index < 2 * _HALF:
+        return index, index + 1
+    shift = index // _HALF - 1
+    mantissa = index - shift * _HALF
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+# Cumulative bucket i counts every slot up to _LE_SLOTS[i]: latencies below the bound,
+# and the rest of the slot the bound falls in (so within the 3% precision)
+_LE_SLOTS = tuple(_index(round(bound * 1e9) - 1) for bound in BUCKETS)
+
+
+class Counter:
+    """
+    A count that only goes up.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """
+    Latencies in nanoseconds, in log-linear buckets. Either
+
+        start = time.perf_counter_ns()
+        ...
+        histogram.record(time.perf_counter_ns() - start)
+
+    or `with histogram.time(): ...`, which costs about half a microsecond
+    more and suits stages that wait on a bus or the network.
+    """
+
+    def __init__(self):
+        self._counts = [0] * _SLOTS
+        self._sum = 0
+
+    def record(self, ns):
+        shift = ns.bit_length() - SUB_BITS
+        index = ns if shift <= 0 else (shift << (SUB_BITS - 1)) + (ns >> shift)
+        if index > _LAST:
+            index = _LAST
+        self._counts[index] += 1
+        self._sum += ns
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        """
+        (counts per bucket, sum of the latencies in ns). A record() under way
+        on another thread may be in the counts but not yet in the sum.
+        """
+        return self._counts[:], self._sum
+
+    @property
+    def count(self):
+        return sum(self.snapshot()[0])
+
+    def percentile(self, percent):
+        """
+        The latency in seconds below which percent of those recorded fall,
+        to within the bucket precision; None if nothing was recorded.
+        """
+        counts, _ = self.snapshot()
+        total = sum(counts)
+        if not total:
+            return None
+        rank = max(1, -(-total * percent // 100))
+        for index, seen in enumerate(itertools.accumulate(counts)):
+            if seen >= rank:
+                low, high = _bounds(index)
+                return (low + high - 1) / 2 / 1e9
+
+    def clear(self):
+        self._counts = [0] * _SLOTS
+        self._sum = 0
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
+
+
+class Registry:
+    """
+    Metrics by name and labels. Asking again for a metric returns the one
+    already registered, so modules can each ask for what they record.
+    """
+
+    def __init__(self):
+        self._families = {}  # name -> (type, help, {label items: metric})
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, **labels):
+        return self._get(name, 'counter', help, Counter, labels)
+
+    def histogram(self, name, help, **labels):
+        return self._get(name, 'histogram', help, Histogram, labels)
+
+    def _get(self, name, kind, help, cls, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError(f"{name} is already registered as a {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = cls()
+            return metric
+
+    def render(self):
+        """
+        Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            families = [(name, kind, help, list(metrics.items()))
+                        for name, (kind, help, metrics) in sorted(self._families.items())]
+        lines = []
+        for name, kind, help, metrics in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(metrics, key=lambda item: item[0]):
+                labels = ",".join(f'{label}="{_escape(value)}"' for label, value in key)
+                if kind == 'counter':
+                    lines.append(f"{name}{{{labels}}} {metric.value}" if labels else f"{name} {metric.value}")
+                    continue
+                counts, total_ns = metric.snapshot()
+                cumulative = list(itertools.accumulate(counts))
+                prefix = labels + "," if labels else ""
+                for bound, slot in zip(BUCKETS, _LE_SLOTS):
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative[slot]}')
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative[-1]}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {total_ns / 1e9:.9g}")
+                lines.append(f"{name}_count{suffix} {cumulative[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+READS = REGISTRY.counter('access_card_reads_total', "Cards read and passed on for a decision")
+GRANTS = REGISTRY.counter('access_grants_total', "Taps granted")
+DENIES = REGISTRY.counter('access_denies_total', "Taps denied")
+BUS_ERRORS = REGISTRY.counter('pn532_bus_errors_total', "PN532 bus and protocol errors")
+WIEGAND_INCOMPLETE = REGISTRY.counter('wiegand_incomplete_frames_total', "Wiegand frames with too few bits")
+WIEGAND_PARITY_ERRORS = REGISTRY.counter('wiegand_parity_errors_total', "Wiegand frames of a known format with bad parity")
+
+
+def stage(name):
+    """
+    The histogram for one stage of a tap (see the module docstring).
+    """
+    return REGISTRY.histogram('access_stage_seconds', "Time spent in each stage of a tap", stage=name)
+
+
+PN532_READ = stage('pn532_read')
+WIEGAND_DECODE = stage('wiegand_decode')
+CREDENTIAL_CHECK = stage('credential_check')
+VERIFY = stage('verify')
+DOOR_GRANT = stage('door_grant')
+RELAY_OUTPUT = stage('relay_output')
+TAP = stage('tap')
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    Serves registry.render() at GET /metrics from a background thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, port, host="127.0.0.1", registry=REGISTRY):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry
+        self._thread = threading.Thread(target=self.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    Start a MetricsServer on host:port. Returns None, after logging why, if
+    it cannot listen there, so the readers and doors run on without it.
+    """
+    try:
+        server = MetricsServer(port, host, registry)
+    except OSError as e:
+        logging.error(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    logging.info(f"Serving metrics at {server.url}")
+    return server
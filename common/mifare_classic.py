@@ -0,0 +1,126 @@
+"""
+MIFARE Classic 1K memory layout and sector-at-a-time reads through a PN532
+(the adafruit_pn532 API).
+
+A 1K card has 16 sectors of 4 blocks of 16 bytes; the last block of each
+sector is its trailer (Key A, access bits, Key B). Authentication opens a
+whole sector, so blocks are read grouped by sector: one authentication, then
+every requested data block in it. See "PN532/MiFare Classic 1K Block
+Structure.txt".
+"""
+SECTORS = 16
+BLOCKS_PER_SECTOR = 4
+BLOCK_SIZE = 16
+BLOCKS = SECTORS * BLOCKS_PER_SECTOR
+CARD_SIZE = BLOCKS * BLOCK_SIZE
+
+# PN532 InDataExchange commands for Key A / Key B authentication
+AUTH_A = 0x60
+AUTH_B = 0x61
+DEFAULT_KEY = b'\xFF\xFF\xFF\xFF\xFF\xFF'
+
+
+class MifareError(Exception):
+    """
+    The card refused an operation (not a PN532 or bus error).
+    """
+
+
+class AuthenticationError(MifareError):
+    def __init__(self, sector):
+        super().__init__(f"Authentication failed for sector {sector}")
+        self.sector = sector
+
+
+def sector_of(block):
+    return block // BLOCKS_PER_SECTOR
+
+
+def trailer_of(sector):
+    return sector * BLOCKS_PER_SECTOR + BLOCKS_PER_SECTOR - 1
+
+
+def is_trailer(block):
+    return block % BLOCKS_PER_SECTOR == BLOCKS_PER_SECTOR - 1
+
+
+def data_blocks(sector):
+    first = sector * BLOCKS_PER_SECTOR
+    return range(first, first + BLOCKS_PER_SECTOR - 1)
+
+
+def read_blocks(pn532, uid, blocks, key=DEFAULT_KEY, key_type=AUTH_A, keys=None):
+    """
+    Read the given blocks of the selected card, authenticating once per
+    sector. Sector trailers are skipped. Returns {block: 16 bytes}.
+
+    Every sector is opened with key/key_type, unless keys (e.g. a
+    KeyDictionary.for_card(), see mifare_keys.py) finds each sector's key.
+
+    Raises AuthenticationError if key does not open a sector, and MifareError
+    if a block cannot be read once its sector is open.
+    """
+    data = {}
+    for sector, sector_blocks in _by_sector(blocks):
+        _authenticate(pn532, uid, sector, key, key_type, keys)
+        for block in sector_blocks:
+            block_data = pn532.mifare_classic_read_block(block)
+            if block_data is None:
+                raise MifareError(f"Failed to read block {block}")
+            data[block] = bytes(block_data)
+    return data
+
+
+def write_blocks(pn532, uid, blocks, key=DEFAULT_KEY, key_type=AUTH_A, keys=None, verify=True):
+    """
+    Write {block: 16 bytes} to the selected card with one authentication per
+    sector, reading each block back after writing it if verify is set.
+    Sector trailers and the manufacturer block are refused with ValueError,
+    before anything is written.
+
+    Raises AuthenticationError or MifareError like read_blocks(), and
+    MifareError if a block does not read back as written.
+    """
+    for block, block_data in blocks.items():
+        if block == 0 or is_trailer(block) or not 0 <= block < BLOCKS:
+            raise ValueError(f"Block {block} is not a writable data block")
+        if len(block_data) != BLOCK_SIZE:
+            raise ValueError(f"Block {block} data must be {BLOCK_SIZE} bytes, not {len(block_data)}")
+    for sector, sector_blocks in _by_sector(blocks):
+        _authenticate(pn532, uid, sector, key, key_type, keys)
+        for block in sector_blocks:
+            if not pn532.mifare_classic_write_block(block, blocks[block]):
+                raise MifareError(f"Failed to write block {block}")
+            if verify:
+                read_back = pn532.mifare_classic_read_block(block)
+                if read_back is None or bytes(read_back) != bytes(blocks[block]):
+                    raise MifareError(f"Block {block} did not read back as written")
+
+
+def dump(pn532, uid, key=DEFAULT_KEY, key_type=AUTH_A, keys=None):
+    """
+    Read the whole card into a CARD_SIZE image, block n at n * BLOCK_SIZE.
+    Sector trailers are left zeroed: Key A never reads back anyway.
+    """
+    image = bytearray(CARD_SIZE)
+    for block, block_data in read_blocks(pn532, uid, range(BLOCKS), key, key_type, keys).items():
+        image[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE] = block_data
+    return bytes(image)
+
+
+def _by_sector(blocks):
+    # (sector, [blocks]) in block order, trailers dropped
+    by_sector = {}
+    for block in sorted(set(blocks)):
+        if not is_trailer(block):
+            by_sector.setdefault(sector_of(block), []).append(block)
+    return by_sector.items()
+
+
+def _authenticate(pn532, uid, sector, key, key_type, keys):
+    if keys is not None:
+        opened = keys.authenticate(pn532, uid, sector)
+    else:
+        opened = pn532.mifare_classic_authenticate_block(uid, data_blocks(sector)[0], key_type, key)
+    if not opened:
+        raise AuthenticationError(sector)
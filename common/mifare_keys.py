@@ -0,0 +1,189 @@
+"""
+Key dictionary for MIFARE Classic sectors, with a persistent cache of which
+key opened which sector for each card family.
+
+Badges issued by one site share their sector keys, so once a key has opened
+sector 5 of one card of a family it is tried first on sector 5 of the next:
+a known card type costs one authentication per sector instead of a sweep
+through the dictionary. Keys that opened other sectors of the same family are
+tried next, then keys by how often they have worked anywhere, then the rest of
+the dictionary, all as Key A before Key B.
+
+The dictionary is a text file with one 12-hex-digit key per line (# starts a
+comment). The cache is a small JSON file, rewritten atomically by save():
+
+    {"<family>": {"<sector>": ["A" or "B", "<key hex>"]}}
+
+A card's family comes from card_family(): its MIFARE Classic type, unless
+its UID starts with a prefix the site has mapped to a family of its own.
+Site badges and blank cards on transport keys are the same type, so a site
+that reads both maps its badges' UID prefix; otherwise every card of a type
+shares one cache entry per sector, and a mix of the two keeps replacing it.
+
+A failed authentication halts a MIFARE Classic card, so every further
+attempt on the card first selects it again (read_passive_target).
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from common import card_info, mifare_classic
+
+DEFAULT_FAMILY = 'mifare_classic_1k'
+TYPE_FAMILIES = {
+    card_info.MIFARE_CLASSIC_1K: DEFAULT_FAMILY,
+    card_info.MIFARE_CLASSIC_4K: 'mifare_classic_4k',
+    card_info.MIFARE_MINI: 'mifare_mini',
+}
+KEY_TYPES = {'A': mifare_classic.AUTH_A, 'B': mifare_classic.AUTH_B}
+KEY_NAMES = {command: name for name, command in KEY_TYPES.items()}
+
+
+def load_keys(path):
+    """
+    Read a key dictionary file and return its keys as bytes, in file order
+    without duplicates. Raises ValueError for a malformed line.
+    """
+    keys = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                key = bytes.fromhex(line)
+            except ValueError:
+                key = b''
+            if len(key) != 6:
+                raise ValueError(f"{path}:{line_number}: expected a 6-byte hex key, got {line!r}")
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+
+def card_family(card_type, uid, prefixes=None):
+    """
+    The family to cache a card's keys under: the family mapped to the
+    longest hex UID prefix in prefixes that uid starts with, such as
+    {"04A2": "site_badges"}, else the family of its card type.
+    """
+    uid_hex = bytes(uid).hex().upper()
+    matches = [prefix for prefix in prefixes or () if uid_hex.startswith(prefix.upper())]
+    if matches:
+        return prefixes[max(matches, key=len)]
+    return TYPE_FAMILIES.get(card_type, DEFAULT_FAMILY)
+
+
+class KeyDictionary:
+    """
+    Candidate keys plus what has worked per (family, sector). attempts counts
+    every authentication sent, successful or not.
+    """
+
+    def __init__(self, keys=(mifare_classic.DEFAULT_KEY,), cache_path=None):
+        self.keys = list(keys)
+        self.cache_path = cache_path
+        self.attempts = 0
+        self._dirty = False
+        self._known = {}       # (family, sector) -> (key_type, key)
+        self._hits = Counter()  # (key_type, key) -> sectors opened
+        self._lock = threading.Lock()
+        if cache_path is not None and os.path.exists(cache_path):
+            self._load_cache()
+            self._dirty = False
+
+    @classmethod
+    def from_file(cls, path, cache_path=None):
+        return cls(load_keys(path), cache_path)
+
+    def for_card(self, family=DEFAULT_FAMILY):
+        """
+        Keys for one card family, as mifare_classic.read_blocks(keys=...) takes them.
+        """
+        return CardKeys(self, family)
+
+    def candidates(self, family, sector):
+        """
+        (key_type, key) pairs to try on sector of a family card, best first.
+        """
+        with self._lock:
+            ordered = []
+            known = self._known.get((family, sector))
+            if known is not None:
+                ordered.append(known)
+            # Keys that opened other sectors of this family, most sectors first
+            family_keys = Counter(candidate for (known_family, _), candidate in self._known.items()
+                                  if known_family == family)
+            ordered.extend(candidate for candidate, _ in family_keys.most_common())
+            ordered.extend(candidate for candidate, _ in self._hits.most_common())
+            for key_type in (mifare_classic.AUTH_A, mifare_classic.AUTH_B):
+                ordered.extend((key_type, key) for key in self.keys)
+        return list(dict.fromkeys(ordered))
+
+    def authenticate(self, pn532, uid, sector, family=DEFAULT_FAMILY, reselect_timeout=0.1):
+        """
+        Open sector of the selected card, trying candidates() in order.
+        Returns the (key_type, key) that worked, or None.
+        """
+        block = mifare_classic.data_blocks(sector)[0]
+        for n, (key_type, key) in enumerate(self.candidates(family, sector)):
+            # The last failure halted the card; select it again first
+            if n and pn532.read_passive_target(timeout=reselect_timeout) != uid:
+                return None
+            with self._lock:
+                self.attempts += 1
+            if pn532.mifare_classic_authenticate_block(uid, block, key_type, key):
+                self._remember(family, sector, (key_type, key))
+                return key_type, key
+        return None
+
+    def save(self):
+        """
+        Write the (family, sector) cache to cache_path, replacing it
+        atomically, if anything was learned since it was last written.
+        """
+        with self._lock:
+            if self.cache_path is None or not self._dirty:
+                return
+            self._dirty = False
+            cache = {}
+            for (family, sector), (key_type, key) in sorted(self._known.items()):
+                cache.setdefault(family, {})[str(sector)] = [KEY_NAMES[key_type], key.hex().upper()]
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.cache_path)
+
+    def _remember(self, family, sector, candidate):
+        with self._lock:
+            if self._known.get((family, sector)) != candidate:
+                self._known[(family, sector)] = candidate
+                self._hits[candidate] += 1
+                self._dirty = True
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+            for family, sectors in cache.items():
+                for sector, (key_name, key_hex) in sectors.items():
+                    self._remember(family, int(sector), (KEY_TYPES[key_name], bytes.fromhex(key_hex)))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.error(f"Ignoring unreadable key cache {self.cache_path}: {e}")
+
+
+class CardKeys:
+    """
+    A KeyDictionary bound to one card family.
+    """
+
+    def __init__(self, dictionary, family):
+        self.dictionary = dictionary
+        self.family = family
+
+    def authenticate(self, pn532, uid, sector):
+        return self.dictionary.authenticate(pn532, uid, sector, self.family) is not None
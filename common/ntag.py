@@ -0,0 +1,225 @@
+"""
+NDEF messages on NTAG21x / MiFare Ultralight tags through a PN532.
+
+The tag is read with the type 2 READ command, which returns four pages (16
+bytes) at a time; adafruit_pn532 sends it as mifare_classic_read_block().
+The first READ, at page 3, brings the capability container and the start of
+the TLV area. After that only as many READs are sent as the NDEF TLV's length
+needs, never the whole tag.
+
+Records are parsed lazily: iterating an NdefMessage decodes one record
+header at a time, and payloads stay memoryview slices of the bytes read.
+
+    message = ntag.read_ndef(pn532)
+    for record in message:
+        print(record.type, record.text or record.uri or bytes(record.payload))
+"""
+from collections import namedtuple
+
+PAGE_SIZE = 4
+READ_SIZE = 16       # Four pages per READ
+CC_PAGE = 3
+DATA_PAGE = 4
+NDEF_MAGIC = 0xE1
+
+# TLV tags
+TLV_NULL = 0x00
+TLV_NDEF = 0x03
+TLV_TERMINATOR = 0xFE
+
+# Type name formats
+TNF_WELL_KNOWN = 0x01
+
+URI_PREFIXES = (
+    "", "http://www.", "https://www.", "http://", "https://", "tel:", "mailto:",
+    "ftp://anonymous:anonymous@", "ftp://ftp.", "ftps://", "sftp://", "smb://", "nfs://", "ftp://",
+    "dav://", "news:", "telnet://", "imap:", "rtsp://", "urn:", "pop:", "sip:", "sips:", "tftp:",
+    "btspp://", "btl2cap://", "btgoep://", "tcpobex://", "irdaobex://", "file://", "urn:epc:id:",
+    "urn:epc:tag:", "urn:epc:pat:", "urn:epc:raw:", "urn:epc:", "urn:nfc:",
+)
+
+CapabilityContainer = namedtuple('CapabilityContainer', 'version data_size read_access write_access')
+
+
+class NdefError(Exception):
+    """
+    The tag is not NDEF formatted or its TLV area is malformed.
+    """
+
+
+class NdefRecord:
+    """
+    One record; type and id are bytes, payload a memoryview.
+    """
+    __slots__ = ('tnf', 'type', 'id', 'payload')
+
+    def __init__(self, tnf, type, id, payload):
+        self.tnf = tnf
+        self.type = type
+        self.id = id
+        self.payload = payload
+
+    @property
+    def text(self):
+        """
+        The text of a well-known 'T' record, else None.
+        """
+        if self.tnf != TNF_WELL_KNOWN or self.type != b'T' or not self.payload:
+            return None
+        status = self.payload[0]
+        encoding = 'utf-16' if status & 0x80 else 'utf-8'
+        return bytes(self.payload[1 + (status & 0x3F):]).decode(encoding, errors='replace')
+
+    @property
+    def uri(self):
+        """
+        The URI of a well-known 'U' record, else None.
+        """
+        if self.tnf != TNF_WELL_KNOWN or self.type != b'U' or not self.payload:
+            return None
+        prefix = URI_PREFIXES[self.payload[0]] if self.payload[0] < len(URI_PREFIXES) else ""
+        return prefix + bytes(self.payload[1:]).decode('utf-8', errors='replace')
+
+    def __repr__(self):
+        return f"NdefRecord(tnf={self.tnf}, type={self.type!r}, payload={len(self.payload)} bytes)"
+
+
+class NdefMessage:
+    """
+    An NDEF message; records are decoded as they are iterated.
+    """
+
+    def __init__(self, data):
+        self.data = memoryview(bytes(data))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        data = self.data
+        offset = 0
+        while offset < len(data):
+            header = data[offset]
+            short = header & 0x10
+            has_id = header & 0x08
+            try:
+                type_length = data[offset + 1]
+                if short:
+                    payload_length = data[offset + 2]
+                    offset += 3
+                else:
+                    payload_length = int.from_bytes(data[offset + 2:offset + 6], 'big')
+                    offset += 6
+                id_length = data[offset] if has_id else 0
+                offset += 1 if has_id else 0
+            except IndexError:
+                raise NdefError("NDEF record header is truncated") from None
+            end = offset + type_length + id_length + payload_length
+            if end > len(data):
+                raise NdefError("NDEF record runs past the end of the message")
+            record_type = bytes(data[offset:offset + type_length])
+            record_id = bytes(data[offset + type_length:offset + type_length + id_length])
+            yield NdefRecord(header & 0x07, record_type, record_id, data[end - payload_length:end])
+            offset = end
+            if header & 0x40:  # Message end
+                break
+
+    def first(self):
+        return next(iter(self), None)
+
+
+def parse_capability_container(page):
+    if len(page) < PAGE_SIZE or page[0] != NDEF_MAGIC:
+        raise NdefError("Tag is not NDEF formatted (no capability container)")
+    return CapabilityContainer(page[1], page[2] * 8, page[3] >> 4, page[3] & 0x0F)
+
+
+def read_ndef(pn532):
+    """
+    Read the NDEF message of the selected tag. Returns an NdefMessage, or
+    None if the tag holds no NDEF TLV. Raises NdefError if the tag is not
+    NDEF formatted and RuntimeError if a READ fails.
+    """
+    first = _read(pn532, CC_PAGE)
+    cc = parse_capability_container(first)
+    end = cc.data_size  # Bytes of data area, counted from page 4
+    data = bytearray(first[PAGE_SIZE:])
+
+    def ensure(length):
+        # Read on from the next unread page until length bytes are in
+        while len(data) < min(length, end):
+            data.extend(_read(pn532, DATA_PAGE + len(data) // PAGE_SIZE))
+
+    offset = 0
+    while True:
+        ensure(offset + 4)
+        if offset >= min(len(data), end):
+            return None
+        tag = data[offset]
+        if tag == TLV_NULL:
+            offset += 1
+            continue
+        if tag == TLV_TERMINATOR:
+            return None
+        if data[offset + 1] == 0xFF:
+            length = int.from_bytes(data[offset + 2:offset + 4], 'big')
+            value = offset + 4
+        else:
+            length = data[offset + 1]
+            value = offset + 2
+        if tag == TLV_NDEF:
+            if value + length > end:
+                raise NdefError("NDEF TLV is longer than the tag's data area")
+            ensure(value + length)
+            return NdefMessage(data[value:value + length])
+        # Lock and memory control TLVs, or proprietary ones: skip
+        offset = value + length
+
+
+def _read(pn532, page):
+    block = pn532.mifare_classic_read_block(page)
+    if block is None or len(block) < READ_SIZE:
+        raise RuntimeError(f"Failed to read page {page}")
+    return bytes(block)
+
+
+def ndef_tlv(message):
+    """
+    The TLV area for an encoded NDEF message, terminator included.
+    """
+    if len(message) < 0xFF:
+        header = bytes((TLV_NDEF, len(message)))
+    else:
+        header = bytes((TLV_NDEF, 0xFF)) + len(message).to_bytes(2, 'big')
+    return header + bytes(message) + bytes((TLV_TERMINATOR,))
+
+
+def encode_message(records):
+    """
+    Encode (tnf, type, payload) tuples as an NDEF message.
+    """
+    out = bytearray()
+    for n, (tnf, record_type, payload) in enumerate(records):
+        header = tnf & 0x07
+        if n == 0:
+            header |= 0x80  # Message begin
+        if n == len(records) - 1:
+            header |= 0x40  # Message end
+        if len(payload) < 256:
+            header |= 0x10
+            out += bytes((header, len(record_type), len(payload)))
+        else:
+            out += bytes((header, len(record_type))) + len(payload).to_bytes(4, 'big')
+        out += record_type + bytes(payload)
+    return bytes(out)
+
+
+def text_record(text, language='en'):
+    return TNF_WELL_KNOWN, b'T', bytes((len(language),)) + language.encode() + text.encode()
+
+
+def uri_record(uri):
+    for code in range(len(URI_PREFIXES) - 1, 0, -1):
+        if uri.startswith(URI_PREFIXES[code]):
+            return TNF_WELL_KNOWN, b'U', bytes((code,)) + uri[len(URI_PREFIXES[code]):].encode()
+    return TNF_WELL_KNOWN, b'U', b'\x00' + uri.encode()
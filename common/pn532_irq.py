@@ -0,0 +1,134 @@
+"""
+Interrupt-driven card detection for a PN532 on I2C.
+
+read_passive_target(timeout=0.5) in a loop sends InListPassiveTarget, polls
+the PN532's status byte over I2C every 10 ms until a card answers or the
+timeout expires, and starts over, so an idle reader keeps the bus and a core
+busy. IrqCardReader sends the command once and sleeps on the PN532's IRQ
+output instead: the PN532 pulls IRQ low when a frame is ready to be read, so
+the response is only fetched once a card has answered.
+
+InListPassiveTarget waits for a card indefinitely with the default
+MxRtyPassiveActivation (0xFF), which SAM_configuration() leaves alone. The
+command is re-sent after rearm_interval without a card, in case the PN532 was
+reset and dropped it.
+"""
+import logging
+import threading
+import time
+
+from common import card_info, metrics
+
+
+class GPIOIrqLine:
+    """
+    The PN532's active-low IRQ output on a GPIO input (RPi.GPIO API). Falling
+    edges are caught by the GPIO library's edge-detection thread, so waiting
+    costs nothing.
+    """
+
+    def __init__(self, gpio, pin):
+        self.gpio = gpio
+        self.pin = pin
+        self._edge = threading.Event()
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        gpio.add_event_detect(pin, gpio.FALLING, callback=self._on_edge)
+
+    def _on_edge(self, pin):
+        self._edge.set()
+
+    def asserted(self):
+        return self.gpio.input(self.pin) == self.gpio.LOW
+
+    def clear(self):
+        self._edge.clear()
+
+    def wait(self, timeout=None):
+        """
+        Return True once IRQ is asserted, or False after timeout seconds.
+        """
+        if self.asserted():
+            return True
+        return self._edge.wait(timeout) or self.asserted()
+
+    def close(self):
+        self.gpio.remove_event_detect(self.pin)
+
+
+class IrqCardReader:
+    """
+    Drop-in for PN532.read_passive_target() that waits on the IRQ line, for
+    the read loops and PN532Source. The PN532 object is still available as
+    .pn532 for anything else (MIFARE, NDEF) once a card has been read.
+    """
+
+    def __init__(self, pn532, irq, card_baud=0x00, rearm_interval=60, response_timeout=0.1):
+        self.pn532 = pn532
+        self.irq = irq
+        self.card_baud = card_baud
+        self.max_targets = 1
+        self.rearm_interval = rearm_interval
+        self.response_timeout = response_timeout
+        self._armed_at = None
+
+    def read_passive_target(self, card_baud=None, timeout=1):
+        """
+        Return the UID of the next card, or None if none arrives within
+        timeout seconds.
+        """
+        if not self._wait_for_card(card_baud, timeout):
+            return None
+        with metrics.PN532_READ.time():
+            return self.pn532.get_passive_target(timeout=self.response_timeout)
+
+    def read_card_info(self, card_baud=None, timeout=1):
+        """
+        Like read_passive_target(), but returns a CardInfo (see card_info.py).
+        """
+        if not self._wait_for_card(card_baud, timeout):
+            return None
+        with metrics.PN532_READ.time():
+            return card_info.get_card_info(self.pn532, timeout=self.response_timeout)
+
+    def read_targets(self, card_baud=None, timeout=1, max_targets=card_info.MAX_TARGETS):
+        """
+        Like read_card_info(), but a CardInfo for each of up to max_targets
+        cards (see card_info.read_targets()); an empty list on timeout.
+        """
+        if not self._wait_for_card(card_baud, timeout, max_targets):
+            return []
+        with metrics.PN532_READ.time():
+            return card_info.get_targets(self.pn532, timeout=self.response_timeout)
+
+    def disarm(self):
+        """
+        Forget the pending InListPassiveTarget, e.g. after another command or
+        a reset aborted it; the next read sends it again.
+        """
+        self._armed_at = None
+
+    def _wait_for_card(self, card_baud, timeout, max_targets=1):
+        if card_baud is not None and card_baud != self.card_baud:
+            self.card_baud = card_baud
+            self._armed_at = None
+        if max_targets != self.max_targets:
+            self.max_targets = max_targets
+            self._armed_at = None
+        if self._armed_at is None or time.monotonic() - self._armed_at > self.rearm_interval:
+            if not self._arm():
+                time.sleep(timeout)
+                return False
+        if not self.irq.wait(timeout):
+            return False
+        self._armed_at = None
+        return True
+
+    def _arm(self):
+        # The ACK to the command also asserts IRQ; it has been read by the
+        # time listen returns, so only a later edge means a card
+        if not card_info.listen_for_targets(self.pn532, self.max_targets, self.card_baud, self.response_timeout):
+            logging.warning("PN532 did not acknowledge InListPassiveTarget")
+            return False
+        self.irq.clear()
+        self._armed_at = time.monotonic()
+        return True
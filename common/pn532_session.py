@@ -0,0 +1,218 @@
+"""
+One PN532 per process, opened lazily and kept healthy.
+
+The session opens the PN532 on first use, reads the firmware version once and
+keeps it, and runs SAM_configuration(). When an operation fails with a bus or
+protocol error, the next use resynchronizes with a SAM_configuration() on the
+open bus, which takes a few milliseconds; only if the PN532 does not answer
+is it reset through RSTPD_N (PN532.reset(), 200 ms). Attempts are spaced with
+exponential backoff while it stays unreachable. In IRQ mode, where an
+idle reader exchanges nothing, a firmware-version ping every health_interval
+seconds confirms the PN532 is still there.
+
+    session = open_session(irq_pin=12)
+    uid = session.read_passive_target(timeout=0.5)   # None while recovering
+    cards = session.read_targets(timeout=0.5)         # Both of two cards tapped together
+    with session as pn532:                           # Anything else
+        pn532.mifare_classic_read_block(4)
+"""
+import logging
+import time
+
+from common import card_info, hardware, metrics
+from common.pn532_irq import GPIOIrqLine, IrqCardReader
+
+# adafruit_pn532 raises RuntimeError for bad or missing frames; busio raises OSError
+ERRORS = (OSError, RuntimeError)
+
+
+class PN532Unavailable(RuntimeError):
+    """
+    The PN532 is being recovered; retry after retry_in seconds.
+    """
+
+    def __init__(self, retry_in):
+        super().__init__(f"PN532 unavailable, retrying in {retry_in:.2f}s")
+        self.retry_in = retry_in
+
+
+class PN532Session:
+    """
+    open_device() returns a new PN532 object (PN532_I2C or a fake). With
+    irq_line, cards are read through an IrqCardReader on that line.
+    """
+
+    def __init__(self, open_device, irq_line=None, health_interval=30, backoff_initial=0.01,
+                 backoff_max=5.0, clock=time.monotonic):
+        self.open_device = open_device
+        self.irq_line = irq_line
+        self.health_interval = health_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.firmware = None
+        self.failures = 0
+        self.recoveries = 0
+        self.resets = 0
+        self._device = None
+        self._cards = None
+        self._healthy = False
+        self._backoff = backoff_initial
+        self._retry_at = 0.0
+        self._last_ok = 0.0
+
+    @property
+    def healthy(self):
+        return self._healthy
+
+    def connect(self):
+        """
+        Open (or recover) the PN532 now. Returns False if it is unreachable.
+        """
+        return self._ensure() is not None
+
+    def read_passive_target(self, card_baud=None, timeout=1):
+        """
+        Same contract as PN532.read_passive_target(); returns None while the
+        PN532 is being recovered, after waiting out up to timeout seconds.
+        """
+        return self._read_target(lambda cards, **kwargs: cards.read_passive_target(**kwargs), card_baud, timeout)
+
+    def read_card_info(self, card_baud=None, timeout=1):
+        """
+        Like read_passive_target(), but returns a CardInfo (see card_info.py).
+        """
+        if self.irq_line is not None:
+            return self._read_target(lambda cards, **kwargs: cards.read_card_info(**kwargs), card_baud, timeout)
+        return self._read_target(card_info.read_card_info, card_baud, timeout)
+
+    def read_targets(self, card_baud=None, timeout=1, max_targets=card_info.MAX_TARGETS):
+        """
+        A CardInfo for each card in the field, up to max_targets, from one
+        InListPassiveTarget (see card_info.read_targets()); an empty list if
+        there is none or the PN532 is being recovered.
+        """
+        if self.irq_line is not None:
+            read = lambda cards, **kwargs: cards.read_targets(max_targets=max_targets, **kwargs)
+        else:
+            read = lambda cards, **kwargs: card_info.read_targets(cards, max_targets, **kwargs)
+        return self._read_target(read, card_baud, timeout) or []
+
+    def __enter__(self):
+        device = self._ensure()
+        if device is None:
+            raise PN532Unavailable(max(0.0, self._retry_at - self.clock()))
+        return device
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.irq_line is not None:
+            # Any command aborts a pending InListPassiveTarget
+            self._cards.disarm()
+        if exc_type is None:
+            self._last_ok = self.clock()
+        elif issubclass(exc_type, ERRORS):
+            self._failed(exc)
+        return False
+
+    def _read_target(self, read, card_baud, timeout):
+        # read(cards, [card_baud=], timeout=) with cards the PN532 or its IrqCardReader
+        if self._ensure() is None:
+            time.sleep(min(timeout, max(0.0, self._retry_at - self.clock())))
+            return None
+        if self.irq_line is not None and self.clock() - self._last_ok > self.health_interval:
+            if not self._ping():
+                return None
+        start = time.perf_counter_ns()
+        try:
+            if card_baud is None:
+                target = read(self._cards, timeout=timeout)
+            else:
+                target = read(self._cards, card_baud=card_baud, timeout=timeout)
+        except ERRORS as e:
+            self._failed(e)
+            return None
+        # In IRQ mode the reader times the response fetch itself, without the wait for a card
+        if target and self.irq_line is None:
+            metrics.PN532_READ.record(time.perf_counter_ns() - start)
+        # An IRQ-mode timeout exchanged nothing, so it says nothing about health
+        if target or self.irq_line is None:
+            self._last_ok = self.clock()
+        return target
+
+    def _ensure(self):
+        """
+        Return the PN532 ready for use, or None while backing off.
+        """
+        if self._healthy:
+            return self._device
+        if self.clock() < self._retry_at:
+            return None
+        recovering = self._device is not None
+        try:
+            if not recovering:
+                self._device = self.open_device()
+                self._cards = IrqCardReader(self._device, self.irq_line) if self.irq_line else self._device
+            try:
+                self._configure()
+            except ERRORS:
+                if not recovering:
+                    raise
+                # Still not answering: a hard reset, then configure it again
+                self._device.reset()
+                self.resets += 1
+                self._configure()
+        except ERRORS as e:
+            self._failed(e)
+            return None
+        if self.irq_line is not None:
+            self._cards.disarm()
+        if recovering:
+            self.recoveries += 1
+            logging.info("PN532 recovered.")
+        self._healthy = True
+        self._backoff = self.backoff_initial
+        self._last_ok = self.clock()
+        return self._device
+
+    def _configure(self):
+        if self.firmware is None:
+            self.firmware = tuple(self._device.firmware_version)
+            ic, ver, rev, support = self.firmware
+            logging.info(f"Found PN532 with firmware version: {ver}.{rev}")
+        self._device.SAM_configuration()
+
+    def _ping(self):
+        try:
+            firmware = tuple(self._device.firmware_version)
+        except ERRORS as e:
+            self._failed(e)
+            return False
+        self._cards.disarm()
+        if firmware != self.firmware:
+            self._failed(RuntimeError(f"unexpected firmware version {firmware}"))
+            return False
+        self._last_ok = self.clock()
+        return True
+
+    def _failed(self, error):
+        self.failures += 1
+        metrics.BUS_ERRORS.inc()
+        self._healthy = False
+        self._retry_at = self.clock() + self._backoff
+        logging.warning(f"PN532 error: {error}; resetting in {self._backoff:.2f}s")
+        self._backoff = min(self._backoff * 2, self.backoff_max)
+
+
+def open_session(reset_pin=6, req_pin=12, irq_pin=None, **kwargs):
+    """
+    A PN532Session on the I2C bus, with RSTPD_N on reset_pin and either the
+    IRQ line on irq_pin or P32/H_Request on req_pin (see hardware.pn532_i2c).
+    """
+    irq_line = None
+    if irq_pin is not None:
+        gpio = hardware.gpio()
+        gpio.setmode(gpio.BCM)
+        irq_line = GPIOIrqLine(gpio, irq_pin)
+    return PN532Session(
+        lambda: hardware.pn532_i2c(reset_pin=reset_pin, req_pin=req_pin, irq_pin=irq_pin),
+        irq_line=irq_line, **kwargs)
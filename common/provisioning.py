@@ -0,0 +1,178 @@
+"""
+Bulk provisioning of MIFARE Classic badges from a manifest.
+
+The manifest maps each card's UID to the blocks to write on it, as CSV (one
+row per block, header optional) or JSON:
+
+    uid,block,data
+    04A1B2C3,4,00112233445566778899AABBCCDDEEFF
+
+    {"04A1B2C3": {"4": "00112233445566778899AABBCCDDEEFF"}}
+
+One PN532 session stays open for the whole run. Each card presented is looked
+up by UID, written a sector at a time under one authentication, verified by
+reading every block back, and its UID added to the credential store, so the
+operator only has to tap badges one after another.
+
+Written UIDs reach the credential store in batches: every flush_every cards,
+once flush_interval seconds have passed since the first unsaved one, and when
+run() returns. Each flush merges them into the store as it is on disk then,
+so a store changed during the run keeps those changes. A card written but
+not yet flushed when the run dies is written again next run.
+"""
+import csv
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+from common import mifare_classic
+from common.credential_store import read_store, write_store
+from common.mifare_keys import card_family
+from common.pn532_session import ERRORS, PN532Unavailable
+from common.repeat_filter import RepeatFilter
+
+# status is 'written', 'failed', 'unknown' (not in the manifest) or 'done' (already written)
+Result = namedtuple('Result', 'uid status detail')
+
+
+def load_manifest(path):
+    """
+    Read a .json or .csv manifest into {uid bytes: {block: 16 bytes}}.
+    Raises ValueError for a malformed entry or a block that cannot be written.
+    """
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            rows = [(uid, block, data) for uid, blocks in json.load(f).items() for block, data in blocks.items()]
+    else:
+        with open(path, newline='') as f:
+            rows = [row for row in csv.reader(f) if row and not row[0].startswith('#')]
+        if rows and rows[0][0].strip().lower() == 'uid':
+            rows = rows[1:]
+
+    manifest = {}
+    for n, row in enumerate(rows, 1):
+        try:
+            uid, block, data = (str(field).strip() for field in row)
+            uid, block, data = bytes.fromhex(uid), int(block), bytes.fromhex(data)
+        except ValueError:
+            raise ValueError(f"{path}: entry {n} is not uid,block,data: {row}") from None
+        if block == 0 or mifare_classic.is_trailer(block) or not 0 <= block < mifare_classic.BLOCKS:
+            raise ValueError(f"{path}: entry {n}: block {block} is not a writable data block")
+        if len(data) != mifare_classic.BLOCK_SIZE:
+            raise ValueError(f"{path}: entry {n}: data must be {mifare_classic.BLOCK_SIZE} bytes")
+        manifest.setdefault(uid, {})[block] = data
+    return manifest
+
+
+class Provisioner:
+    """
+    Writes manifest cards as they are presented to a PN532Session and
+    records them in the credential store at credentials_path.
+
+    keys is a KeyDictionary (see mifare_keys.py); without one, every sector
+    is opened with the default Key A. Each card's keys are looked up under
+    its own family, from its type and the UID prefixes in prefixes (see
+    mifare_keys.card_family()), so a batch can mix card families. A card left on the reader is handled
+    once; take it away for repeat_window seconds to retry a failed card.
+    """
+
+    def __init__(self, session, manifest, credentials_path, keys=None, prefixes=None,
+                 repeat_window=2.0, verify=True, flush_every=25, flush_interval=5.0):
+        self.session = session
+        self.manifest = manifest
+        self.credentials_path = credentials_path
+        self.keys = keys
+        self.prefixes = prefixes
+        self.verify = verify
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.written = set()
+        self.failures = 0
+        self._repeats = RepeatFilter(repeat_window)
+        self._unsaved = set()
+        self._unsaved_since = None
+
+    @property
+    def remaining(self):
+        return len(self.manifest) - len(self.written)
+
+    def provision_next(self, timeout=0.5):
+        """
+        Wait up to timeout seconds for a card and provision it. Returns a
+        Result, or None if no new card was presented.
+        """
+        if self._unsaved_since is not None and time.monotonic() - self._unsaved_since >= self.flush_interval:
+            self.flush()
+        info = self.session.read_card_info(timeout=timeout)
+        if info is None:
+            return None
+        uid = bytes(info.uid)
+        if self._repeats.is_repeat(uid):
+            return None
+        if uid not in self.manifest:
+            return Result(uid, 'unknown', "not in the manifest")
+        if uid in self.written:
+            return Result(uid, 'done', "already written")
+
+        blocks = self.manifest[uid]
+        keys = None
+        if self.keys is not None:
+            keys = self.keys.for_card(card_family(info.card_type, uid, self.prefixes))
+        try:
+            with self.session as pn532:
+                mifare_classic.write_blocks(pn532, uid, blocks, keys=keys, verify=self.verify)
+        except (mifare_classic.MifareError, PN532Unavailable) as e:
+            self.failures += 1
+            return Result(uid, 'failed', str(e))
+        except ERRORS as e:
+            # A bus error: the session recovers the PN532 before the next read
+            self.failures += 1
+            return Result(uid, 'failed', f"PN532 error: {e}")
+        if self.keys is not None:
+            self.keys.save()
+
+        self.written.add(uid)
+        self._unsaved.add(uid)
+        if self._unsaved_since is None:
+            self._unsaved_since = time.monotonic()
+        if len(self._unsaved) >= self.flush_every:
+            self.flush()
+        return Result(uid, 'written', f"{len(blocks)} blocks{' verified' if self.verify else ''}")
+
+    def flush(self):
+        """
+        Add the written UIDs not yet in the credential store to it, merged
+        with the store as it is on disk now.
+        """
+        if not self._unsaved:
+            return
+        on_disk = read_store(self.credentials_path) if os.path.exists(self.credentials_path) else frozenset()
+        write_store(self.credentials_path, on_disk | self._unsaved)
+        logging.info(f"Added {len(self._unsaved)} cards to {self.credentials_path}")
+        self._unsaved = set()
+        self._unsaved_since = None
+
+    def run(self):
+        """
+        Provision cards until every manifest card is written, logging each
+        result. Returns the number written; the credential store has every
+        one of them when it returns, or raises.
+        """
+        logging.info(f"Provisioning {self.remaining} cards. Present each card to the reader...")
+        try:
+            while self.remaining:
+                result = self.provision_next()
+                if result is None:
+                    continue
+                uid_str = result.uid.hex().upper()
+                if result.status == 'written':
+                    logging.info(f"{uid_str}: {result.detail}; {self.remaining} cards left")
+                elif result.status == 'failed':
+                    logging.error(f"{uid_str}: {result.detail}; remove the card and present it again")
+                else:
+                    logging.warning(f"{uid_str}: {result.detail}")
+        finally:
+            self.flush()
+        return len(self.written)
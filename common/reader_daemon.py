@@ -0,0 +1,246 @@
+"""
+Single-process asyncio service that multiplexes several card readers.
+
+Each reader is an async source that turns card reads into Tap records on one
+shared asyncio.Queue:
+
+    PN532Source    read_passive_target() in a dedicated executor thread
+    MFRC522Source  SimpleMFRC522.read_id_no_block() in a dedicated executor thread
+    WiegandSource  tick-based frames from pigpio callbacks, handed over with call_soon_threadsafe
+    WiegandSocketSource  frames from the C++ capture daemon's Unix socket (wiegand_socket.py)
+
+AccessDaemon runs one dispatcher on the event loop that authorizes each tap
+and grants the reader's door. Doors relock on a shared RelayScheduler (see
+door.py), so nothing on the loop ever sleeps on a relay.
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from common import metrics, wiegand_formats
+from common.wiegand import DEFAULT_FRAME_GAP_US, WiegandAssembler
+from common.wiegand_socket import OVERFLOW, WiegandSocketClient
+
+# credential is the card's identity as bytes; detected_at is time.monotonic()
+Tap = namedtuple('Tap', 'reader credential detected_at')
+
+
+class PN532Source:
+    """
+    Polls a PN532 (or anything with read_passive_target) from its own thread.
+    With max_targets above 1, pn532 must have read_targets (PN532Session),
+    and every card of a multi-card read becomes its own tap.
+    """
+
+    def __init__(self, name, pn532, timeout=0.5, max_targets=1):
+        self.name = name
+        self.pn532 = pn532
+        self.timeout = timeout
+        self.max_targets = max_targets
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"pn532-{name}")
+
+    async def run(self, taps):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                uids = await loop.run_in_executor(self._executor, self._read)
+            except Exception as e:
+                logging.error(f"Error reading PN532 {self.name}: {e}")
+                await asyncio.sleep(1)
+                continue
+            detected_at = time.monotonic()
+            for uid in uids:
+                await taps.put(Tap(self.name, bytes(uid), detected_at))
+
+    def _read(self):
+        if self.max_targets > 1:
+            return [card.uid for card in self.pn532.read_targets(timeout=self.timeout, max_targets=self.max_targets)]
+        uid = self.pn532.read_passive_target(timeout=self.timeout)
+        return [] if uid is None else [uid]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class MFRC522Source:
+    """
+    Polls a SimpleMFRC522 without blocking the loop. The 40-bit card ID is
+    passed on as 5 big-endian bytes.
+    """
+
+    def __init__(self, name, reader, poll_interval=0.1):
+        self.name = name
+        self.reader = reader
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"mfrc522-{name}")
+
+    async def run(self, taps):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                card_id = await loop.run_in_executor(self._executor, self.reader.read_id_no_block)
+            except Exception as e:
+                logging.error(f"Error reading MFRC522 {self.name}: {e}")
+                card_id = None
+            if card_id is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await taps.put(Tap(self.name, card_id.to_bytes(5, 'big'), time.monotonic()))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def frame_credential(name, frame, min_bits):
+    """
+    The credential for a Wiegand frame from reader name: the bit count
+    followed by the bits packed big-endian, so frames of different lengths
+    never collide. None, after counting and logging why, for frames shorter
+    than min_bits and frames of a known format with bad parity.
+    """
+    if frame.bit_count < min_bits:
+        metrics.WIEGAND_INCOMPLETE.inc()
+        logging.warning(f"Incomplete Wiegand data on {name}: {frame.bit_count} bits")
+        return None
+    start = time.perf_counter_ns()
+    if wiegand_formats.formats_for(frame.bit_count) and \
+            wiegand_formats.decode(frame.value, frame.bit_count) is None:
+        metrics.WIEGAND_PARITY_ERRORS.inc()
+        logging.warning(f"Wiegand parity error on {name}: {frame.bit_count} bits")
+        return None
+    credential = bytes((frame.bit_count,)) + frame.value.to_bytes((frame.bit_count + 7) // 8, 'big')
+    metrics.WIEGAND_DECODE.record(time.perf_counter_ns() - start)
+    return credential
+
+
+class WiegandSource:
+    """
+    Assembles Wiegand frames from pigpio edge callbacks (see wiegand.py) and
+    hands each completed frame, not each bit, to the loop. Frames of a known
+    format with bad parity are dropped as misreads.
+
+    The frame is passed on as bytes: the bit count followed by the bits packed
+    big-endian, so frames of different lengths never collide.
+    """
+
+    def __init__(self, name, pi, data0_pin, data1_pin, frame_gap_us=DEFAULT_FRAME_GAP_US, min_bits=26):
+        self.name = name
+        self.pi = pi
+        self.min_bits = min_bits
+        self.assembler = WiegandAssembler(data0_pin, data1_pin, frame_gap_us=frame_gap_us)
+        self._callbacks = []
+
+    async def run(self, taps):
+        loop = asyncio.get_running_loop()
+        frames = asyncio.Queue()
+        self.assembler.on_frame = lambda frame: loop.call_soon_threadsafe(frames.put_nowait, frame)
+        self._callbacks = self.assembler.attach(self.pi)
+        while True:
+            frame = await frames.get()
+            credential = frame_credential(self.name, frame, self.min_bits)
+            if credential is not None:
+                await taps.put(Tap(self.name, credential, time.monotonic()))
+
+    def close(self):
+        if self._callbacks:
+            self.assembler.detach(self.pi, self._callbacks)
+            self._callbacks = []
+
+
+class WiegandSocketSource:
+    """
+    Frames from the C++ capture daemon (Indala/indalaPigpioWiegandReader.cpp)
+    over its Unix socket, checked and passed on like WiegandSource's. A tap's
+    detected_at is when the daemon closed the frame, so the tap latency
+    includes the hop to Python. The daemon is reconnected to every retry
+    seconds while it is down or restarting.
+    """
+
+    def __init__(self, name, path, min_bits=26, retry=1.0):
+        self.name = name
+        self.client = WiegandSocketClient(path)
+        self.min_bits = min_bits
+        self.retry = retry
+
+    async def run(self, taps):
+        while True:
+            try:
+                await self.client.connect()
+                logging.info(f"Reading Wiegand frames for {self.name} from {self.client.path}")
+                async for record in self.client:
+                    if record.flags & OVERFLOW:
+                        logging.warning(f"Wiegand frame over 64 bits on {self.name}: {record.frame.bit_count} bits")
+                        continue
+                    credential = frame_credential(self.name, record.frame, self.min_bits)
+                    if credential is not None:
+                        await taps.put(Tap(self.name, credential, record.completed_ns / 1e9))
+                logging.error(f"Wiegand daemon for {self.name} closed the connection")
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                logging.error(f"Error reading Wiegand daemon for {self.name} at {self.client.path}: {e}")
+            self.client.close()
+            await asyncio.sleep(self.retry)
+
+    def close(self):
+        self.client.close()
+
+
+class AccessDaemon:
+    """
+    Dispatches taps from every source: authorize(tap) decides, and the door
+    mapped to the tap's reader is granted on success.
+
+    doors maps reader name -> Door. on_decision, if given, is called with
+    (tap, granted) after each decision, e.g. to journal it. With a
+    repeat_filter (see repeat_filter.py), repeated reads of a card held at a
+    reader are dropped before authorization; the same card at another reader
+    still goes through. Reads, grants, denies and the time from each card
+    being read to its decision are recorded in metrics.py.
+    """
+
+    def __init__(self, sources, doors, authorize, on_decision=None, repeat_filter=None):
+        self.sources = sources
+        self.doors = doors
+        self.authorize = authorize
+        self.on_decision = on_decision
+        self.repeat_filter = repeat_filter
+        self.taps = None
+
+    async def run(self):
+        self.taps = asyncio.Queue()
+        tasks = [asyncio.create_task(source.run(self.taps), name=f"source-{source.name}")
+                 for source in self.sources]
+        tasks.append(asyncio.create_task(self._dispatch(), name="dispatcher"))
+        logging.info(f"Access daemon running with {len(self.sources)} readers.")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for source in self.sources:
+                source.close()
+
+    async def _dispatch(self):
+        while True:
+            tap = await self.taps.get()
+            if self.repeat_filter is not None and self.repeat_filter.is_repeat((tap.reader, tap.credential)):
+                continue
+            metrics.READS.inc()
+            try:
+                granted = self.authorize(tap)
+                if granted:
+                    metrics.GRANTS.inc()
+                    door = self.doors.get(tap.reader)
+                    if door is None:
+                        logging.error(f"No door configured for reader {tap.reader}")
+                    else:
+                        door.grant()
+                else:
+                    metrics.DENIES.inc()
+                    logging.warning(f"Access denied on {tap.reader} for {tap.credential.hex()}")
+                metrics.TAP.record(int((time.monotonic() - tap.detected_at) * 1e9))
+                if self.on_decision is not None:
+                    self.on_decision(tap, granted)
+            except Exception as e:
+                logging.error(f"Error handling tap on {tap.reader}: {e}")
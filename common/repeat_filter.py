@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RepeatFilter:
+    """
+    Suppresses repeated reads of a card that is held at the reader.
+
+    A credential is a repeat if it was last seen less than window seconds ago.
+    Every sighting refreshes that time, so a card left at the reader (which
+    reads again every second or so) is reported once, while a different card
+    is let through immediately. Take the card away for longer than window and
+    it is reported again.
+
+    Credentials are kept in last-seen order, so expired entries are dropped
+    from the front as new reads come in; max_entries bounds memory regardless.
+    """
+
+    def __init__(self, window=2.0, max_entries=1024, clock=time.monotonic):
+        self.window = window
+        self.max_entries = max_entries
+        self.clock = clock
+        self.suppressed = 0
+        self._last_seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def is_repeat(self, credential):
+        """
+        Record a read of credential (any hashable: UID bytes, a Wiegand value,
+        a (reader, credential) pair) and return True if it should be ignored.
+        """
+        now = self.clock()
+        with self._lock:
+            last_seen = self._last_seen.get(credential)
+            self._last_seen[credential] = now
+            self._last_seen.move_to_end(credential)
+            # Oldest first: stop at the first entry that is still live
+            while self._last_seen:
+                oldest, seen_at = next(iter(self._last_seen.items()))
+                if now - seen_at < self.window and len(self._last_seen) <= self.max_entries:
+                    break
+                del self._last_seen[oldest]
+            if last_seen is not None and now - last_seen < self.window:
+                self.suppressed += 1
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._last_seen.clear()
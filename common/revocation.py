@@ -0,0 +1,315 @@
+"""
+Revoked card IDs, kept on the Pi for deciding taps while the server is down.
+
+A RevocationList answers `card_id in revocations` in microseconds from two
+parts: a Bloom filter in memory, which rules out nearly every card that is
+not revoked, and the exact sorted list of revoked IDs, memory-mapped from
+its file, which is only searched when the filter says maybe. The filter's
+false positives therefore cost a binary search, never a wrong answer, and
+only the pages of the list that are searched are ever read into memory.
+
+Card IDs are unsigned 64-bit integers: the MFRC522's 40-bit ID as is, or a
+UID of up to 8 bytes read big-endian (see card_key()). The list carries the
+server's version number and is changed with deltas from one version to the
+next (apply()), or replaced by a full copy (replace()); see RevocationSync
+in server_client.py. The file is
+
+    header  magic b'RVKL', format version (u16), 2 bytes padding,
+            list version (u64), ID count (u64), filter bits (u64),
+            filter hashes (u32), IDs removed since the filter was built (u32)
+    filter  filter bits / 8 bytes
+    IDs     count x u64, sorted
+
+all little-endian, written to a temporary name and renamed into place.
+The IDs are memory-mapped as they are on little-endian hosts; a big-endian
+host byte-swaps them into memory instead.
+Removing an ID leaves its filter bits set; the filter is rebuilt once such
+stale IDs are a quarter of the list, or when the list outgrows it.
+
+    python3 -m common.revocation info revocations.bin
+    python3 -m common.revocation check revocations.bin 1234567890
+"""
+import argparse
+import bisect
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+MAGIC = b'RVKL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHxxQQQII')
+ID = struct.Struct('<Q')
+
+BITS_PER_KEY = 10  # About 1% false positives with 7 hashes
+MIN_CAPACITY = 1024
+GROWTH = 1.25  # Room for additions when the filter is rebuilt
+
+_MASK64 = (1 << 64) - 1
+_LITTLE_ENDIAN = sys.byteorder == 'little'  # IDs in the file are in host order
+
+
+def card_key(card_id):
+    """
+    The 64-bit key for a card ID (int) or UID (bytes, at most 8).
+    """
+    if isinstance(card_id, int):
+        key = card_id
+    elif len(card_id) <= 8:
+        key = int.from_bytes(card_id, 'big')
+    else:
+        raise ValueError(f"UID of {len(card_id)} bytes is too long for a revocation key")
+    if not 0 <= key <= _MASK64:
+        raise ValueError(f"card ID {card_id} does not fit in 64 bits")
+    return key
+
+
+class BloomFilter:
+    """
+    A Bloom filter of 64-bit keys with hashes bit positions per key, from
+    double hashing a SplitMix64 mix of the key.
+    """
+
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(bits // 8) if data is None else data
+
+    @classmethod
+    def for_capacity(cls, capacity, bits_per_key=BITS_PER_KEY):
+        bits = max(64, -(-int(capacity * bits_per_key) // 64) * 64)
+        return cls(bits, max(1, min(16, round(bits_per_key * math.log(2)))))
+
+    def add(self, key):
+        h = _mix(key)
+        h1, h2 = h & 0xFFFFFFFF, h >> 32 | 1
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        h = _mix(key)
+        h1, h2 = h & 0xFFFFFFFF, h >> 32 | 1
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def copy(self):
+        return BloomFilter(self.bits, self.hashes, bytearray(self.data))
+
+    def false_positive_rate(self, keys):
+        """
+        The expected rate with keys keys in the filter.
+        """
+        return (1 - math.exp(-self.hashes * keys / self.bits)) ** self.hashes
+
+
+class _Snapshot:
+    # One version of the list; replaced as a whole, never changed in place
+    def __init__(self, version, bloom, ids, stale, mapping=None):
+        self.version = version
+        self.bloom = bloom
+        self.ids = ids          # Sorted IDs: a u64 memoryview of the file, or an array('Q')
+        self.stale = stale
+        self.mapping = mapping  # Keeps the memory map open while the snapshot is in use
+
+
+class RevocationList:
+    """
+    The revocation list in path, loaded if the file exists (version 0 and
+    empty if not, or if it cannot be read). Lookups go against an immutable snapshot, so they never
+    wait for, or see half of, an apply() or replace() on another thread.
+    """
+
+    def __init__(self, path, bits_per_key=BITS_PER_KEY):
+        self.path = path
+        self.bits_per_key = bits_per_key
+        self.synced_at = None  # time.monotonic() of the last successful sync, set by RevocationSync
+        self._lock = threading.Lock()  # Serializes writers
+        self._snapshot = _Snapshot(0, BloomFilter.for_capacity(MIN_CAPACITY, bits_per_key), array('Q'), 0)
+        if os.path.exists(path):
+            try:
+                self._snapshot = _load(path)
+            except (OSError, ValueError) as e:
+                # Start empty; the next sync fetches the whole list
+                logging.error(f"Failed to load revocation list {path}: {e}")
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def filter_bytes(self):
+        return len(self._snapshot.bloom.data)
+
+    def __len__(self):
+        return len(self._snapshot.ids)
+
+    def __contains__(self, card_id):
+        snapshot = self._snapshot
+        key = card_key(card_id)
+        if key not in snapshot.bloom:
+            return False
+        ids = snapshot.ids
+        i = bisect.bisect_left(ids, key)
+        return i < len(ids) and ids[i] == key
+
+    def synced_within(self, seconds):
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= seconds
+
+    def apply(self, base_version, version, added=(), removed=()):
+        """
+        Apply the changes that turn base_version into version. Raises
+        ValueError if the list is not at base_version (a full copy is needed).
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if base_version != snapshot.version:
+                raise ValueError(f"delta from version {base_version} does not apply to version {snapshot.version}")
+            ids = snapshot.ids
+            edits = []  # (index, key or None to drop ids[index]), in key order
+            added = sorted(set(map(card_key, added)) - set(map(card_key, removed)))
+            for key in added:
+                i = bisect.bisect_left(ids, key)
+                if i == len(ids) or ids[i] != key:
+                    edits.append((i, key))
+            dropped = 0
+            for key in sorted(set(map(card_key, removed))):
+                i = bisect.bisect_left(ids, key)
+                if i < len(ids) and ids[i] == key:
+                    edits.append((i, None))
+                    dropped += 1
+            edits.sort(key=lambda edit: (edit[0], edit[1] is not None))
+            count = len(ids) + len(edits) - 2 * dropped
+            stale = snapshot.stale + dropped
+            bloom = snapshot.bloom
+            if self._needs_rebuild(bloom, count, stale):
+                bloom, stale = None, 0
+            else:
+                bloom = bloom.copy()
+                for i, key in edits:
+                    if key is not None:
+                        bloom.add(key)
+            self._snapshot = _write(self.path, version, bloom, stale, count, _merged(ids, edits),
+                                    self.bits_per_key)
+
+    def replace(self, version, card_ids):
+        """
+        Replace the whole list with card_ids at version.
+        """
+        keys = sorted(set(map(card_key, card_ids)))
+        with self._lock:
+            self._snapshot = _write(self.path, version, None, 0, len(keys), [array('Q', keys)], self.bits_per_key)
+
+    def _needs_rebuild(self, bloom, count, stale):
+        return count + stale > bloom.bits / self.bits_per_key or stale * 4 > max(count, MIN_CAPACITY)
+
+
+def _mix(key):
+    # SplitMix64 finalizer: spreads sequential card numbers over the filter
+    z = (key + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def _merged(ids, edits):
+    # The sorted IDs after edits, as runs of the old list and new keys
+    runs = []
+    start = 0
+    for i, key in edits:
+        if i > start:
+            runs.append(ids[start:i])
+        if key is None:
+            start = i + 1
+        else:
+            runs.append(array('Q', (key,)))
+            start = max(start, i)
+    if start < len(ids):
+        runs.append(ids[start:])
+    return runs
+
+
+def _write(path, version, bloom, stale, count, runs, bits_per_key):
+    # Write the list to path (bloom None: build it from the IDs) and return it mapped
+    if bloom is None:
+        bloom = BloomFilter.for_capacity(max(MIN_CAPACITY, int(count * GROWTH)), bits_per_key)
+        for run in runs:
+            for key in run:
+                bloom.add(key)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, version, count, bloom.bits, bloom.hashes, stale))
+        f.write(bloom.data)
+        for run in runs:
+            if not _LITTLE_ENDIAN:
+                run = array('Q', run)
+                run.byteswap()
+            f.write(run)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return _load(path, bloom)
+
+
+def _load(path, bloom=None):
+    with open(path, 'rb') as f:
+        data = f.read(HEADER.size)
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a revocation list")
+        magic, format_version, version, count, bits, hashes, stale = HEADER.unpack(data)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} revocation list")
+        size = HEADER.size + bits // 8 + count * ID.size
+        if os.fstat(f.fileno()).st_size != size:
+            raise ValueError(f"{path} should be {size} bytes")
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if bloom is None:
+        bloom = BloomFilter(bits, hashes, bytearray(mapping[HEADER.size:HEADER.size + bits // 8]))
+    start = HEADER.size + bits // 8
+    if _LITTLE_ENDIAN:
+        ids = memoryview(mapping)[start:start + count * ID.size].cast('Q')
+    else:
+        ids = array('Q', mapping[start:start + count * ID.size])
+        ids.byteswap()
+    return _Snapshot(version, bloom, ids, stale, mapping)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m common.revocation",
+                                     description="Inspect a revocation list or look up a card.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help="version, size and expected false positive rate")
+    info.add_argument('path')
+    check = commands.add_parser('check', help="is a card revoked?")
+    check.add_argument('path')
+    check.add_argument('card_id', help="decimal card ID, or a hex UID with 0x")
+    args = parser.parse_args()
+
+    try:
+        revocations = RevocationList(args.path)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    if args.command == 'info':
+        snapshot = revocations._snapshot
+        print(f"Version {revocations.version}: {len(revocations)} revoked IDs, "
+              f"{os.path.getsize(args.path)} bytes on disk, filter {revocations.filter_bytes} bytes "
+              f"({snapshot.bloom.hashes} hashes, {snapshot.stale} stale), "
+              f"expected false positives {snapshot.bloom.false_positive_rate(len(revocations) + snapshot.stale):.2%}")
+        return
+    card_id = int(args.card_id, 0)
+    print("revoked" if card_id in revocations else "not revoked")
+
+
+if __name__ == "__main__":
+    main()
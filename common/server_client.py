@@ -0,0 +1,242 @@
+"""
+HTTP client for the access-control server.
+
+All requests go through a pooled requests.Session, so taps reuse one
+keep-alive TLS connection instead of handshaking every time. Card
+verification answers within a bounded deadline: recent decisions come from a
+local cache, and when the server is slower than the deadline the last known
+decision is used while the request finishes in the background.
+
+Door and access events are not posted inline at all: they go to an
+EventJournal on disk and EventUploader sends them to the server in batches.
+
+RevocationSync keeps a local RevocationList (revocation.py) current with
+deltas from the server. VerifyClient denies revoked cards without asking the
+server, and while the list is fresh, falls back to a card's last known
+decision however old it is when the server cannot be reached.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common import metrics
+from common.decision_cache import DecisionCache
+
+
+def make_session(pool_size=4):
+    """
+    Create a requests.Session that keeps up to pool_size connections alive.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class VerifyClient:
+    """
+    Verifies cards against the server's /verify endpoint with a local
+    decision cache and a per-tap latency bound.
+    """
+
+    def __init__(self, server_url, deadline=1.5, timeout=10, stale_ttl=24 * 3600,
+                 cache=None, workers=2, revocations=None, revocations_max_age=600):
+        self.verify_url = f"{server_url}/verify"
+        self.deadline = deadline
+        self.timeout = timeout
+        self.stale_ttl = stale_ttl
+        self.cache = cache or DecisionCache()
+        self.revocations = revocations
+        self.revocations_max_age = revocations_max_age
+        self.session = make_session(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def verify(self, card_id):
+        """
+        Return the server's decision for card_id (a dict with "authorized"),
+        or None if the server could not be reached in time and there is no
+        earlier decision for this card.
+        """
+        with metrics.VERIFY.time():
+            return self._verify(card_id)
+
+    def _verify(self, card_id):
+        if self.revocations is not None and card_id in self.revocations:
+            return {"authorized": False, "revoked": True}
+        key = str(card_id)
+        decision = self.cache.get(key)
+        if decision is not None:
+            return decision
+
+        with self._lock:
+            # A card held on the reader must not queue up duplicate requests
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, key)
+                self._pending[key] = future
+
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            logging.warning(f"Server missed the {self.deadline}s deadline for card {key}. Using cached decision.")
+        except requests.RequestException as e:
+            logging.error(f"Error communicating with server: {e}")
+        except ValueError as e:
+            logging.error(f"Invalid response from server: {e}")
+        # A revoked card was turned away above, so with a current revocation
+        # list an old allow is as good as a recent one
+        fresh = self.revocations is not None and self.revocations.synced_within(self.revocations_max_age)
+        return self.cache.get(key, max_age=float('inf') if fresh else self.stale_ttl)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _fetch(self, key):
+        try:
+            response = self.session.post(self.verify_url, json={"card_id": key}, timeout=self.timeout)
+            response.raise_for_status()
+            decision = response.json()
+            if not isinstance(decision, dict):
+                raise ValueError(f"expected a JSON object, got {type(decision).__name__}")
+            # Late answers still land in the cache for the next tap
+            self.cache.put(key, decision)
+            return decision
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+class EventUploader:
+    """
+    Drains an EventJournal to the server's /events endpoint from a background
+    thread, one POST per batch of up to batch_size events. A batch is sent once
+    it is full or its oldest event has waited linger seconds. Failed uploads
+    are retried with exponential backoff; the journal cursor only advances once
+    the server has accepted a batch, so an outage delays events but never
+    drops them.
+    """
+
+    def __init__(self, journal, server_url, batch_size=100, linger=1.0, timeout=10, max_backoff=60):
+        self.journal = journal
+        self.events_url = f"{server_url}/events"
+        self.batch_size = batch_size
+        self.linger = linger
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.session = make_session(1)
+        self.batches_sent = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-uploader", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=5):
+        self._stop.set()
+        self._thread.join(timeout)
+        self.session.close()
+
+    def _run(self):
+        backoff = 1
+        waiting_since = None
+        while not self._stop.is_set():
+            events, cursor = self.journal.read_batch(self.batch_size)
+            if not events:
+                self.journal.wait_for_events(self.linger)
+                continue
+
+            # Let a partial batch fill up for a while before sending it
+            if len(events) < self.batch_size:
+                now = time.monotonic()
+                if waiting_since is None:
+                    waiting_since = now
+                if now - waiting_since < self.linger:
+                    self.journal.wait_for_events(self.linger - (now - waiting_since))
+                    continue
+            waiting_since = None
+
+            try:
+                response = self.session.post(self.events_url, json={"events": events}, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                delay = backoff * random.uniform(0.5, 1.5)
+                logging.warning(f"Error uploading {len(events)} events, retrying in {delay:.1f}s: {e}")
+                self._stop.wait(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            self.journal.commit(cursor)
+            self.batches_sent += 1
+            backoff = 1
+
+
+class RevocationSync:
+    """
+    Keeps a RevocationList current from the server's /revocations endpoint,
+    from a background thread. Every interval seconds it asks for the changes
+    since its version:
+
+        GET /revocations?since=41
+        {"from": 41, "version": 43, "added": [1234567890], "removed": []}
+
+    and the server answers with the whole list instead, {"version": 43,
+    "revoked": [...]}, when it has no delta from that version. Failures are
+    retried with exponential backoff; the list keeps its last version.
+    """
+
+    def __init__(self, revocations, server_url, interval=60, timeout=10, max_backoff=300):
+        self.revocations = revocations
+        self.revocations_url = f"{server_url}/revocations"
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.session = make_session(1)
+        self.syncs = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=5):
+        self._stop.set()
+        self._thread.join(timeout)
+        self.session.close()
+
+    def sync(self):
+        """
+        Bring the list up to the server's version once. Raises
+        requests.RequestException, or OSError, KeyError or ValueError for a
+        list that cannot be written or a malformed answer.
+        """
+        response = self.session.get(self.revocations_url, params={"since": self.revocations.version},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        update = response.json()
+        if "revoked" in update:
+            self.revocations.replace(update["version"], update["revoked"])
+        elif update["version"] != self.revocations.version:
+            self.revocations.apply(update["from"], update["version"], update.get("added", ()),
+                                   update.get("removed", ()))
+        self.revocations.synced_at = time.monotonic()
+        self.syncs += 1
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except (OSError, KeyError, ValueError) as e:  # requests.RequestException is an OSError
+                delay = backoff * random.uniform(0.5, 1.5)
+                logging.warning(f"Error syncing revocations, retrying in {delay:.1f}s: {e}")
+                self._stop.wait(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = 1
+            self._stop.wait(self.interval)
@@ -0,0 +1,258 @@
+"""
+Wiegand frame assembly from pigpio edge callbacks.
+
+pigpio passes every callback a microsecond tick taken when the edge happened.
+WiegandAssembler uses those ticks rather than wall-clock reads: a frame ends
+when the gap since the last bit exceeds frame_gap_us. The gap is noticed either
+by the first bit of the next frame or by a pigpio watchdog timeout (level 2)
+on the data lines, so no thread has to poll.
+
+Completed frames are handed to on_frame (by default put on self.frames, a
+queue.Queue), with the bits packed into an int. pigpio delivers all callbacks
+for one pi connection on a single thread, so the assembler needs no locking.
+
+Where edges can arrive on more than one thread (gpiozero runs a watch thread
+per pin with some pin factories), WiegandCapture puts them on an EdgeRing
+instead: callbacks only claim a slot and store the bit, and one consumer
+thread feeds the assembler in the order the slots were claimed.
+"""
+import itertools
+import queue
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+# pigpio levels passed to callbacks
+FALLING = 0
+TIMEOUT = 2
+
+# value holds the bits MSB-first (first bit received is the most significant)
+WiegandFrame = namedtuple('WiegandFrame', 'value bit_count first_tick last_tick')
+
+# Readers send a bit every 1-2.5 ms; anything well past that ends the frame
+DEFAULT_FRAME_GAP_US = 8000
+
+
+def tick_diff(start, end):
+    """
+    Microseconds from start to end, allowing for the 32-bit tick wrapping
+    roughly every 72 minutes (same as pigpio.tickDiff).
+    """
+    return (end - start) & 0xFFFFFFFF
+
+
+class WiegandAssembler:
+    def __init__(self, data0_pin, data1_pin, frame_gap_us=DEFAULT_FRAME_GAP_US, on_frame=None):
+        self.data0_pin = data0_pin
+        self.data1_pin = data1_pin
+        self.frame_gap_us = frame_gap_us
+        self.frames = queue.Queue()
+        self.on_frame = on_frame or self.frames.put
+        self._value = 0
+        self._count = 0
+        self._first_tick = 0
+        self._last_tick = 0
+
+    @property
+    def watchdog_ms(self):
+        """
+        Watchdog timeout to set on both data lines with pi.set_watchdog().
+        """
+        return max(1, self.frame_gap_us // 2000)
+
+    def attach(self, pi):
+        """
+        Register falling-edge callbacks and watchdogs on both data lines.
+        Returns the callback handles; cancel them with detach().
+        """
+        callbacks = []
+        for pin in (self.data0_pin, self.data1_pin):
+            callbacks.append(pi.callback(pin, 1, self.edge))  # 1 == pigpio.FALLING_EDGE
+            pi.set_watchdog(pin, self.watchdog_ms)
+        return callbacks
+
+    def detach(self, pi, callbacks):
+        for pin in (self.data0_pin, self.data1_pin):
+            pi.set_watchdog(pin, 0)
+        for cb in callbacks:
+            cb.cancel()
+
+    def edge(self, gpio, level, tick):
+        """
+        pigpio callback for both data lines.
+        """
+        if level == FALLING:
+            self.bit(gpio == self.data1_pin, tick)
+        elif level == TIMEOUT:
+            self.idle(tick)
+
+    def bit(self, bit, tick):
+        """
+        Add one data bit (0 for DATA0, 1 for DATA1) received at tick.
+        """
+        if self._count and tick_diff(self._last_tick, tick) > self.frame_gap_us:
+            self._emit()
+        if not self._count:
+            self._first_tick = tick
+        self._value = (self._value << 1) | bit
+        self._count += 1
+        self._last_tick = tick
+
+    def idle(self, tick):
+        """
+        Close the current frame if no bit has arrived for frame_gap_us by tick.
+        """
+        if self._count and tick_diff(self._last_tick, tick) >= self.frame_gap_us:
+            self._emit()
+
+    def _emit(self):
+        frame = WiegandFrame(self._value, self._count, self._first_tick, self._last_tick)
+        self._value = 0
+        self._count = 0
+        self.on_frame(frame)
+
+
+def local_tick():
+    """
+    A pigpio-style 32-bit microsecond tick from the monotonic clock, for edge
+    sources that do not timestamp their callbacks.
+    """
+    return (time.monotonic_ns() // 1000) & 0xFFFFFFFF
+
+
+class EdgeRing:
+    """
+    Preallocated multi-producer, single-consumer ring of Wiegand edges.
+
+    push() may be called from any number of threads without a lock: the slot
+    is claimed with itertools.count (atomic under the GIL), the bit and tick
+    are stored in preallocated arrays, and the slot is published last by
+    writing its sequence number. drain() hands edges to the consumer strictly
+    in claim order, stopping at the first slot that is claimed but not yet
+    published, so no edge is skipped or reordered.
+
+    A producer that laps the consumer yields until its slot is free, so a slow
+    consumer applies backpressure instead of losing bits; full counts how
+    often that happened.
+    """
+
+    def __init__(self, capacity=4096):
+        if capacity < 2 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.capacity = capacity
+        self.full = 0
+        self._mask = capacity - 1
+        self._claim = itertools.count().__next__
+        self._bits = bytearray(capacity)
+        self._ticks = array('I', bytes(4 * capacity))
+        self._published = array('q', [-1]) * capacity
+        self._tail = 0
+
+    def push(self, bit, tick):
+        """
+        Store one edge: bit is 0 or 1 for a data bit, or TIMEOUT for an idle
+        line. tick is the 32-bit microsecond tick of the edge.
+        """
+        seq = self._claim()
+        if seq - self._tail >= self.capacity:
+            self.full += 1
+            while seq - self._tail >= self.capacity:
+                time.sleep(0)
+        slot = seq & self._mask
+        self._bits[slot] = bit
+        self._ticks[slot] = tick
+        self._published[slot] = seq
+
+    def drain(self, assembler):
+        """
+        Feed every published edge to assembler (bit() / idle()) and free
+        their slots. Only one thread may drain. Returns the number of edges.
+        """
+        tail = start = self._tail
+        mask = self._mask
+        published, bits, ticks = self._published, self._bits, self._ticks
+        add_bit, idle = assembler.bit, assembler.idle
+        while published[tail & mask] == tail:
+            slot = tail & mask
+            bit = bits[slot]
+            if bit == TIMEOUT:
+                idle(ticks[slot])
+            else:
+                add_bit(bit, ticks[slot])
+            tail += 1
+            self._tail = tail
+        return tail - start
+
+
+class WiegandCapture:
+    """
+    Captures edges from any callback thread onto an EdgeRing and assembles
+    frames on one consumer thread. Frames go to on_frame, by default
+    self.frames (a queue.Queue).
+
+    Use edge() as a pigpio callback (also set watchdogs of watchdog_ms on both
+    lines so idle lines are reported), or data0() / data1() as argument-less
+    callbacks such as gpiozero's when_pressed, which are stamped with
+    local_tick(). The consumer also checks for idle lines against local_tick()
+    when clock is left as local_tick; pass clock=None when ticks come from
+    pigpio and only its watchdog should close frames.
+    """
+
+    def __init__(self, data0_pin, data1_pin, frame_gap_us=DEFAULT_FRAME_GAP_US, on_frame=None,
+                 capacity=4096, clock=local_tick):
+        self.data1_pin = data1_pin
+        self.ring = EdgeRing(capacity)
+        self.assembler = WiegandAssembler(data0_pin, data1_pin, frame_gap_us, on_frame)
+        self.frames = self.assembler.frames
+        self.watchdog_ms = self.assembler.watchdog_ms
+        self.clock = clock
+        self._stop = threading.Event()
+        self._thread = None
+
+    def edge(self, gpio, level, tick):
+        """
+        pigpio callback for both data lines.
+        """
+        if level == FALLING:
+            self.ring.push(gpio == self.data1_pin, tick)
+        elif level == TIMEOUT:
+            self.ring.push(TIMEOUT, tick)
+
+    def data0(self):
+        self.ring.push(0, local_tick())
+
+    def data1(self):
+        self.ring.push(1, local_tick())
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="wiegand-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the consumer after assembling any edges still on the ring.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # Half the frame gap, like the watchdog, so frames close within 1.5 gaps
+        poll = self.assembler.frame_gap_us / 2e6
+        ring, assembler = self.ring, self.assembler
+        while not self._stop.is_set():
+            ring.drain(assembler)
+            if self.clock is not None:
+                assembler.idle(self.clock())
+            time.sleep(poll)
+        ring.drain(assembler)
+
+
+def frame_bits(frame):
+    """
+    Return the frame as a string of '0'/'1' characters, first bit first.
+    """
+    return format(frame.value, f'0{frame.bit_count}b')
@@ -0,0 +1,150 @@
+"""
+Wiegand card formats with parity validation.
+
+Frames are decoded from the packed int produced by WiegandAssembler (first
+bit received = most significant bit) using masks and shifts, never strings.
+Bit positions below count from 0 at the first bit of the frame.
+
+decode(value, bit_count) tries every registered format with that bit count
+and returns the first whose parity bits check out. Register site-specific
+formats with register(); later registrations are tried first. H10302 has the
+same length and parity bits as H10304, so it is only used once registered.
+"""
+from collections import namedtuple
+
+WiegandCredential = namedtuple('WiegandCredential', 'format facility_code card_number')
+
+
+def _parity_ones(value):
+    return bin(value).count('1')
+
+
+class WiegandFormat:
+    """
+    A fixed-length Wiegand format.
+
+    fields maps 'facility_code' / 'card_number' to (start, length).
+    parity is a list of (position, kind, covered_positions) with kind 'even'
+    or 'odd', checked in order.
+    """
+
+    def __init__(self, name, bit_count, fields, parity):
+        self.name = name
+        self.bit_count = bit_count
+        self._fields = {}
+        for field, (start, length) in fields.items():
+            shift = bit_count - start - length
+            self._fields[field] = (shift, (1 << length) - 1)
+        self._parity = []
+        for position, kind, covered in parity:
+            mask = 0
+            for p in covered:
+                mask |= 1 << (bit_count - 1 - p)
+            # Including the parity bit itself: even means an even total count
+            mask |= 1 << (bit_count - 1 - position)
+            self._parity.append((position, 0 if kind == 'even' else 1, mask))
+
+    def __repr__(self):
+        return f"WiegandFormat({self.name!r}, {self.bit_count})"
+
+    def parity_ok(self, value):
+        for _, expected, mask in self._parity:
+            if _parity_ones(value & mask) & 1 != expected:
+                return False
+        return True
+
+    def fields(self, value):
+        """
+        Extract the facility code and card number without checking parity.
+        """
+        values = {field: (value >> shift) & mask for field, (shift, mask) in self._fields.items()}
+        return WiegandCredential(self.name, values.get('facility_code'), values.get('card_number'))
+
+    def decode(self, value):
+        """
+        Return a WiegandCredential, or None if a parity bit is wrong.
+        """
+        if not self.parity_ok(value):
+            return None
+        return self.fields(value)
+
+    def encode(self, facility_code=0, card_number=0):
+        """
+        Build a frame with the given fields and correct parity bits.
+        """
+        value = 0
+        for field, number in (('facility_code', facility_code), ('card_number', card_number)):
+            if field in self._fields:
+                shift, mask = self._fields[field]
+                if number > mask:
+                    raise ValueError(f"{field} {number} does not fit in {self.name}")
+                value |= number << shift
+        for position, expected, mask in self._parity:
+            bit = 1 << (self.bit_count - 1 - position)
+            if _parity_ones(value & mask & ~bit) & 1 != expected:
+                value |= bit
+        return value
+
+
+def _every_other_pair(start, stop):
+    # Corporate 1000 parity covers bits in pairs, skipping every third bit
+    return [p for p in range(start, stop) if (p - start) % 3 != 2]
+
+
+H10301 = WiegandFormat(
+    "H10301", 26,
+    {'facility_code': (1, 8), 'card_number': (9, 16)},
+    [(0, 'even', range(1, 13)), (25, 'odd', range(13, 25))])
+
+H10306 = WiegandFormat(
+    "H10306", 34,
+    {'facility_code': (1, 16), 'card_number': (17, 16)},
+    [(0, 'even', range(1, 17)), (33, 'odd', range(17, 33))])
+
+CORPORATE_1000 = WiegandFormat(
+    "Corporate 1000", 35,
+    {'facility_code': (2, 12), 'card_number': (14, 20)},
+    [(1, 'even', _every_other_pair(2, 34)),
+     (34, 'odd', _every_other_pair(1, 34)),
+     (0, 'odd', range(1, 35))])
+
+H10304 = WiegandFormat(
+    "H10304", 37,
+    {'facility_code': (1, 16), 'card_number': (17, 19)},
+    [(0, 'even', range(1, 19)), (36, 'odd', range(18, 36))])
+
+H10302 = WiegandFormat(
+    "H10302", 37,
+    {'card_number': (1, 35)},
+    [(0, 'even', range(1, 19)), (36, 'odd', range(18, 36))])
+
+# bit count -> formats, most preferred first
+_registry = {}
+
+
+def register(fmt):
+    """
+    Add a format; it is tried before earlier formats of the same length.
+    """
+    _registry.setdefault(fmt.bit_count, []).insert(0, fmt)
+
+
+for _fmt in (H10301, H10306, CORPORATE_1000, H10304):
+    register(_fmt)
+
+
+def formats_for(bit_count):
+    return list(_registry.get(bit_count, ()))
+
+
+def decode(value, bit_count):
+    """
+    Decode a frame with the first registered format of this length whose
+    parity checks out. Returns a WiegandCredential, or None if there is no
+    format for bit_count or every candidate fails parity.
+    """
+    for fmt in _registry.get(bit_count, ()):
+        credential = fmt.decode(value)
+        if credential is not None:
+            return credential
+    return None
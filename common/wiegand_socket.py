@@ -0,0 +1,90 @@
+"""
+Client for the frames published by the C++ Wiegand capture daemon
+(Indala/indalaPigpioWiegandReader.cpp).
+
+The daemon assembles frames in its pigpio callback and streams them over a
+Unix domain socket: an 8-byte header (HEADER) once, then a 32-byte record
+(RECORD) per frame, little-endian. Every connected client gets every frame
+from the moment it connects. A gap in the record sequence numbers means the
+daemon dropped frames, counted here in `dropped`.
+
+    client = WiegandSocketClient("/run/indala_wiegand.sock")
+    await client.connect()
+    async for record in client:
+        print(record.frame.value, record.frame.bit_count)
+"""
+import asyncio
+import struct
+from collections import namedtuple
+
+from common.wiegand import WiegandFrame
+
+MAGIC = b'WGFR'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')        # magic, version, record size
+RECORD = struct.Struct('<QIIQHHI')     # value, first tick, last tick, completed_ns, bit count, flags, seq
+
+OVERFLOW = 0x1  # More than 64 bits: frame.value holds the first 64
+
+# completed_ns is CLOCK_MONOTONIC (time.monotonic_ns()) when the daemon closed the frame
+FrameRecord = namedtuple('FrameRecord', 'frame seq completed_ns flags')
+
+
+class WiegandSocketClient:
+    """
+    Reads frame records from the daemon's socket on the event loop. Records
+    are read in bulk and unpacked a buffer at a time, so a burst of frames
+    costs one read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dropped = 0
+        self._reader = None
+        self._writer = None
+        self._pending = []
+        self._seq = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        magic, version, record_size = HEADER.unpack(await self._reader.readexactly(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{self.path} is not a Wiegand frame stream this client reads "
+                             f"({magic!r}, version {version}, {record_size}-byte records)")
+        self._pending = []
+        self._seq = None
+
+    async def read(self):
+        """
+        The next FrameRecord. Raises asyncio.IncompleteReadError when the
+        daemon closes the connection.
+        """
+        if not self._pending:
+            data = await self._reader.read(64 * RECORD.size)
+            short = len(data) % RECORD.size
+            if short:
+                data += await self._reader.readexactly(RECORD.size - short)
+            if not data:
+                raise asyncio.IncompleteReadError(b'', RECORD.size)
+            self._pending = list(RECORD.iter_unpack(data))
+            self._pending.reverse()
+        value, first_tick, last_tick, completed_ns, bit_count, flags, seq = self._pending.pop()
+        if self._seq is not None:
+            self.dropped += (seq - self._seq - 1) & 0xFFFFFFFF
+        self._seq = seq
+        return FrameRecord(WiegandFrame(value, bit_count, first_tick, last_tick), seq, completed_ns, flags)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.read()
+        except asyncio.IncompleteReadError:
+            raise StopAsyncIteration
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None